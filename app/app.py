@@ -1,12 +1,153 @@
 """Main application file."""
+import asyncio
+
 from fastapi import FastAPI
 from fastapi.responses import RedirectResponse
 
+import app.archive as archive
+import app.partitions as partitions
 import app.views as views
+from app.block_index import block_index
+from app.bloom import identifier_filter
+from app.changes import change_listener
+from app.config import settings
+from app.db import AsyncSessionLocal
+from app.dictionaries import dictionaries
+from app.jobs import report_jobs
 
 app = FastAPI()
 
 
+@app.on_event("startup")
+async def start_change_listener():
+    """Listens to the change feed, before any cache is loaded."""
+    if not settings.change_listener_enabled:
+        return
+    await change_listener.connect(
+        settings.sql_alchemy_database_url, AsyncSessionLocal,
+    )
+    app.state.change_listener = asyncio.create_task(
+        change_listener.run(
+            settings.sql_alchemy_database_url, AsyncSessionLocal,
+        ),
+    )
+
+
+@app.on_event("startup")
+async def load_block_index():
+    """Warms up the in-memory block index."""
+    if settings.block_index_enabled:
+        async with AsyncSessionLocal() as session:
+            await block_index.ensure_loaded(session)
+
+
+@app.on_event("startup")
+async def load_identifier_filter():
+    """Builds the identifier Bloom filter and schedules its rebuilds."""
+    if not settings.bloom_filter_enabled:
+        return
+    async with AsyncSessionLocal() as session:
+        await identifier_filter.ensure_loaded(session)
+    if settings.bloom_filter_rebuild_interval > 0:
+        app.state.bloom_rebuilder = asyncio.create_task(
+            identifier_filter.watch(
+                AsyncSessionLocal, settings.bloom_filter_rebuild_interval,
+            ),
+        )
+
+
+@app.on_event("startup")
+async def load_dictionaries():
+    """Preloads the dictionary snapshot and starts watching dict_version."""
+    async with AsyncSessionLocal() as session:
+        await dictionaries.reload(session)
+    if settings.dict_refresh_interval > 0:
+        app.state.dict_watcher = asyncio.create_task(
+            dictionaries.watch(
+                AsyncSessionLocal, settings.dict_refresh_interval,
+            ),
+        )
+
+
+@app.on_event("startup")
+async def maintain_partitions():
+    """Creates upcoming request partitions now and then periodically."""
+    if settings.partition_months_ahead <= 0:
+        return
+    await partitions.maintain(
+        AsyncSessionLocal, settings.partition_months_ahead,
+    )
+    if settings.partition_maintenance_interval > 0:
+        app.state.partition_maintainer = asyncio.create_task(
+            partitions.watch(
+                AsyncSessionLocal,
+                settings.partition_months_ahead,
+                settings.partition_maintenance_interval,
+            ),
+        )
+
+
+@app.on_event("startup")
+async def schedule_archival():
+    """Periodically archives expired and superseded requests."""
+    if settings.archive_interval > 0:
+        app.state.archiver = asyncio.create_task(
+            archive.watch(
+                AsyncSessionLocal,
+                settings.archive_retention_days,
+                settings.archive_batch_size,
+                settings.archive_interval,
+            ),
+        )
+
+
+@app.on_event("shutdown")
+async def stop_change_listener():
+    """Stops the change feed listener."""
+    listener = getattr(app.state, "change_listener", None)
+    if listener is not None:
+        listener.cancel()
+        await change_listener.close()
+
+
+@app.on_event("shutdown")
+async def stop_dictionary_watcher():
+    """Stops the dict_version watcher."""
+    watcher = getattr(app.state, "dict_watcher", None)
+    if watcher is not None:
+        watcher.cancel()
+
+
+@app.on_event("shutdown")
+async def stop_identifier_filter_rebuilder():
+    """Stops the periodic Bloom filter rebuild."""
+    rebuilder = getattr(app.state, "bloom_rebuilder", None)
+    if rebuilder is not None:
+        rebuilder.cancel()
+
+
+@app.on_event("shutdown")
+async def stop_partition_maintainer():
+    """Stops the periodic partition maintenance."""
+    maintainer = getattr(app.state, "partition_maintainer", None)
+    if maintainer is not None:
+        maintainer.cancel()
+
+
+@app.on_event("shutdown")
+async def stop_archival():
+    """Stops the periodic request archival."""
+    archiver = getattr(app.state, "archiver", None)
+    if archiver is not None:
+        archiver.cancel()
+
+
+@app.on_event("shutdown")
+def stop_report_jobs():
+    """Stops the report job worker processes."""
+    report_jobs.shutdown()
+
+
 @app.get("/", include_in_schema=False)
 def root():
     """Redirects to the docs page."""
@@ -0,0 +1,128 @@
+"""Archival of expired and superseded requests, a batch at a time.
+
+Requests that ended before a cutoff, or are superseded by a later request
+of the same counterparty, are moved with their details from request and
+request_detail to request_archive and request_detail_archive. Checks for a
+moment before archived_before also read the archive, so the cutoff is
+recorded there before any request is moved.
+"""
+import asyncio
+import logging
+from datetime import datetime, timedelta
+
+from sqlalchemy import text
+
+import app.partitions as partitions
+import app.queries as q
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 1_000
+# Lower than any request id, tests use negative ones.
+FIRST_ID = -(2**63)
+
+
+def _move_query(session):
+    """Move the batch of requests and their details in one statement."""
+    request_columns = partitions.table_columns(session, "request")
+    detail_columns = partitions.table_columns(session, "request_detail")
+    return text(
+        f"""
+        WITH batch AS (
+            SELECT * FROM unnest(
+                CAST(:ids AS bigint[]), CAST(:end_ats AS timestamp[])
+            ) AS b(batch_id, batch_end_at)
+        ), details AS (
+            DELETE FROM request_detail rd USING batch b
+            WHERE rd.request_id = b.batch_id
+            AND rd.request_end_at = b.batch_end_at
+            RETURNING {detail_columns}
+        ), archived_details AS (
+            INSERT INTO request_detail_archive ({detail_columns})
+            SELECT {detail_columns} FROM details
+        ), requests AS (
+            DELETE FROM request r USING batch b
+            WHERE r.id = b.batch_id AND r.end_at = b.batch_end_at
+            RETURNING {request_columns}
+        )
+        INSERT INTO request_archive ({request_columns})
+        SELECT {request_columns} FROM requests
+        """,
+    )
+
+
+def archive_batch(session, before, after, batch_size=BATCH_SIZE):
+    """Archive the requests due among the batch_size ones after an id.
+
+    Returns the last id looked at, None past the last request, and the
+    number of archived requests. The caller holds the partition lock and
+    commits.
+    """
+    rows = session.execute(
+        q.ARCHIVE_SCAN_QUERY,
+        {"before": before, "after": after, "batch_size": batch_size},
+    ).all()
+    if not rows:
+        return None, 0
+    # Requests in the default partition have no archive partition yet.
+    due = [
+        row for row in rows
+        if row.archive and not row.partition.endswith("_p_default")
+    ]
+    if not due:
+        return rows[-1].id, 0
+    partitions.ensure_archive_partitions(
+        session, sorted({row.partition for row in due}),
+    )
+    result = session.execute(
+        _move_query(session),
+        {
+            "ids": [row.id for row in due],
+            "end_ats": [row.end_at for row in due],
+        },
+    )
+    return rows[-1].id, result.rowcount
+
+
+def archive_requests(session, before, batch_size=BATCH_SIZE):
+    """Archive requests ended before a date or superseded.
+
+    Every batch is committed on its own, so rows are locked only while
+    they are moved, and waits for locks end after partitions.LOCK_TIMEOUT.
+    Stops early if partition maintenance takes the lock in between.
+    Returns the number of archived requests.
+    """
+    session.execute(q.ADVANCE_ARCHIVED_BEFORE_QUERY, {"before": before})
+    session.commit()
+    total = 0
+    after = FIRST_ID
+    while after is not None:
+        if not partitions.lock(session):
+            logger.info("Partition maintenance is running, archival stopped")
+            break
+        after, archived = archive_batch(session, before, after, batch_size)
+        session.commit()
+        total += archived
+    return total
+
+
+async def maintain(session_factory, retention_days, batch_size):
+    """Archive requests ended retention_days ago, logging failures."""
+    before = datetime.now() - timedelta(days=retention_days)
+    try:
+        async with session_factory() as session:
+            archived = await session.run_sync(
+                archive_requests, before, batch_size,
+            )
+    except Exception:
+        logger.exception("Request archival failed")
+        return
+    if archived:
+        logger.info("Archived %s requests", archived)
+
+
+async def watch(session_factory, retention_days, batch_size, interval):
+    """Archive requests forever, every interval seconds."""
+    while True:
+        await asyncio.sleep(interval)
+        await maintain(session_factory, retention_days, batch_size)
@@ -0,0 +1,288 @@
+"""In-memory index of blocks used to answer checks without the database."""
+import asyncio
+import heapq
+import threading
+from bisect import bisect_right, insort
+from datetime import datetime, timedelta
+from typing import Dict, FrozenSet, List, NamedTuple, Optional, Tuple
+
+import app.queries as q
+import app.rules as rules
+
+IDENTIFIERS = ("inn", "ogrn", "sap_num")
+LOAD_BATCH_SIZE = 10_000
+
+# BETWEEN is inclusive, so a block stops covering one tick after end_at.
+_TICK = timedelta(microseconds=1)
+
+
+class Block(NamedTuple):
+    """Block row as seen by the index."""
+
+    start_at: datetime
+    end_at: datetime
+    created_at: datetime
+    request_id: int
+    blocking: bool
+    rules: FrozenSet[tuple]
+    max_sum: Optional[int]
+    doc_names: FrozenSet[str]
+
+
+class KeyState:
+    """Blocks of one identifier and the effective timelines derived from them.
+
+    There is one timeline per rule key (see app.rules): a list of
+    breakpoints and, for every segment starting at a breakpoint, the block
+    with the latest created_at covering it. A point-in-time lookup is a
+    dict lookup and a single bisect over the breakpoints.
+    """
+
+    __slots__ = ("blocks", "timelines", "doc_names")
+
+    def __init__(self, blocks: List[Block]):
+        self.blocks = blocks
+        by_rule: Dict[tuple, List[Block]] = {}
+        for block in blocks:
+            for rule in block.rules:
+                by_rule.setdefault(rule, []).append(block)
+        self.timelines = {
+            rule: build_timeline(rule_blocks)
+            for rule, rule_blocks in by_rule.items()
+        }
+        self.doc_names = frozenset().union(
+            *(block.doc_names for block in blocks)
+        )
+
+    def effective(
+        self, check_for_dt: datetime, rule: tuple = rules.FULL,
+    ) -> Optional[Block]:
+        """Return the block deciding rule at check_for_dt, if any."""
+        timeline = self.timelines.get(rule)
+        if timeline is None:
+            return None
+        points, winners = timeline
+        idx = bisect_right(points, check_for_dt) - 1
+        if idx < 0:
+            return None
+        return winners[idx]
+
+
+def build_timeline(
+    blocks: List[Block],
+) -> Tuple[List[datetime], List[Optional[Block]]]:
+    """Sweep blocks into "latest created_at wins" segments."""
+    points = sorted(
+        {block.start_at for block in blocks}
+        | {_after(block.end_at) for block in blocks}
+    )
+    by_start = sorted(blocks, key=lambda block: block.start_at)
+    active = []
+    winners = []
+    pos = 0
+    for point in points:
+        while pos < len(by_start) and by_start[pos].start_at <= point:
+            block = by_start[pos]
+            heapq.heappush(
+                active,
+                (datetime.max - block.created_at, -block.request_id, block),
+            )
+            pos += 1
+        while active and active[0][2].end_at < point:
+            heapq.heappop(active)
+        winners.append(active[0][2] if active else None)
+    return points, winners
+
+
+class BlockIndex:
+    """Blocks keyed by (identifier, value), e.g. ("inn", "7701234567").
+
+    The index is loaded once from the database and then kept current by the
+    write path. It only sees writes made by this process. Archived requests
+    only contribute DOC exemptions, so it does not cover moments before
+    archived_before.
+    """
+
+    def __init__(self):
+        self.loaded = False
+        self.archived_before: Optional[datetime] = None
+        self._keys: Dict[Tuple[str, str], KeyState] = {}
+        self._pending: List[Tuple[Tuple[str, str], Block]] = []
+        # Bumped by invalidate(), so that a load started before it is not
+        # installed over writes it did not see.
+        self._generation = 0
+        self._lock = threading.Lock()
+        self._load_lock = asyncio.Lock()
+
+    def load(self, session):
+        """Build the index from the request/request_detail tables.
+
+        Run through ensure_loaded(), which takes the load lock.
+        """
+        with self._lock:
+            generation = self._generation
+        grouped: Dict[Tuple[str, str], List[Block]] = {}
+        rows = session.execute(
+            q.BLOCK_INDEX_QUERY.execution_options(
+                yield_per=LOAD_BATCH_SIZE,
+            ),
+        )
+        for row in rows:
+            block = make_block(row, row.details)
+            if block is None:
+                continue
+            for key in _keys_of(row):
+                grouped.setdefault(key, []).append(block)
+        # Read after the rows: requests archived in between are in them.
+        archived_before = session.scalar(q.ARCHIVED_BEFORE_QUERY)
+
+        with self._lock:
+            if generation != self._generation:
+                return
+            for key, block in self._pending:
+                blocks = grouped.setdefault(key, [])
+                if block.request_id not in {b.request_id for b in blocks}:
+                    blocks.append(block)
+            self._pending = []
+            self._keys = {
+                key: KeyState(sorted(blocks))
+                for key, blocks in grouped.items()
+            }
+            self.archived_before = archived_before
+            self.loaded = True
+
+    async def ensure_loaded(self, session):
+        """Load the index unless it is loaded, one load at a time."""
+        async with self._load_lock:
+            if not self.loaded:
+                await session.run_sync(self.load)
+
+    def invalidate(self):
+        """Drop the index so that it is reloaded on next use."""
+        with self._lock:
+            self._generation += 1
+            self.loaded = False
+            self.archived_before = None
+            self._keys = {}
+            self._pending = []
+
+    def add(self, request, details):
+        """Register a committed request and its details."""
+        block = make_block(request, details)
+        if block is None:
+            return
+        with self._lock:
+            for key in _keys_of(request):
+                if not self.loaded:
+                    self._pending.append((key, block))
+                    continue
+                state = self._keys.get(key)
+                blocks = list(state.blocks) if state else []
+                # The change feed may replay a request this process added.
+                if any(b.request_id == block.request_id for b in blocks):
+                    continue
+                insort(blocks, block)
+                self._keys[key] = KeyState(blocks)
+
+    def covers(self, moment):
+        """True if checks for the moment can be answered by the index."""
+        return (
+            moment is None
+            or self.archived_before is None
+            or moment >= self.archived_before
+        )
+
+    def is_blocking(
+        self, inn, ogrn, sap_num, contract, check_for_dt, **attributes,
+    ):
+        """Answer a check; attributes are those of rules.evaluate."""
+        keys = self._keys
+        states = [
+            keys[key]
+            for key in (("inn", inn), ("ogrn", ogrn), ("sap_num", sap_num))
+            if key[1] and key in keys
+        ]
+        return rules.evaluate(states, contract, check_for_dt, **attributes)
+
+    def timeline(
+        self, inn, ogrn, sap_num, contract, date_from, date_to, **attributes,
+    ):
+        """Answer a check for every moment between date_from and date_to."""
+        keys = self._keys
+        states = [
+            keys[key]
+            for key in (("inn", inn), ("ogrn", ogrn), ("sap_num", sap_num))
+            if key[1] and key in keys
+        ]
+        return timeline(states, contract, date_from, date_to, **attributes)
+
+
+def states_from_rows(rows) -> List[KeyState]:
+    """Build throwaway KeyStates from BLOCK_INDEX_QUERY shaped rows."""
+    blocks = [
+        block
+        for block in (make_block(row, row.details) for row in rows)
+        if block is not None
+    ]
+    return [KeyState(sorted(blocks))] if blocks else []
+
+
+def timeline(
+    states, contract, date_from, date_to, **attributes,
+) -> List[Tuple[datetime, datetime, bool]]:
+    """Merged (start_at, end_at, blocking) intervals from date_from to date_to.
+
+    The rule timelines are constant between their breakpoints, so evaluating
+    the check once per breakpoint gives what /check would answer for any
+    moment of the resulting interval. Bounds are inclusive, like BETWEEN.
+    """
+    points = sorted(
+        {
+            point
+            for state in states
+            for points, _ in state.timelines.values()
+            for point in points
+            if date_from < point <= date_to
+        }
+    )
+    starts = []
+    blocking = []
+    for point in [date_from] + points:
+        status = rules.evaluate(states, contract, point, **attributes)
+        if not blocking or blocking[-1] != status:
+            starts.append(point)
+            blocking.append(status)
+    ends = [start - _TICK for start in starts[1:]] + [date_to]
+    return list(zip(starts, ends, blocking))
+
+
+def make_block(request, details) -> Optional[Block]:
+    """Compile a request and its details, None if nothing to index."""
+    compiled = rules.compile_details(details)
+    if not compiled.keys and not compiled.doc_names:
+        return None
+    return Block(
+        start_at=request.start_at,
+        end_at=request.end_at,
+        created_at=request.created_at,
+        request_id=request.id,
+        blocking=request.blocking,
+        rules=compiled.keys,
+        max_sum=compiled.max_sum,
+        doc_names=compiled.doc_names,
+    )
+
+
+def _after(moment: datetime) -> datetime:
+    return moment + _TICK if moment < datetime.max else moment
+
+
+def _keys_of(row):
+    return [
+        (name, getattr(row, name))
+        for name in IDENTIFIERS
+        if getattr(row, name)
+    ]
+
+
+block_index = BlockIndex()
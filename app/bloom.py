@@ -0,0 +1,183 @@
+"""Bloom filter of every identifier that appears in request."""
+import asyncio
+import hashlib
+import logging
+import math
+import threading
+
+import app.queries as q
+from app.block_index import IDENTIFIERS
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+LOAD_BATCH_SIZE = 10_000
+# Room for identifiers written between two rebuilds.
+GROWTH = 2
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter using double hashing over one blake2b digest."""
+
+    def __init__(self, capacity, fp_rate):
+        capacity = max(capacity, 1)
+        self.size = max(
+            8, math.ceil(-capacity * math.log(fp_rate) / math.log(2) ** 2),
+        )
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.items = 0
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item):
+        digest = hashlib.blake2b(item.encode("utf-8"), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        return [
+            (first + i * second) % self.size for i in range(self.hashes)
+        ]
+
+    def add(self, item):
+        """Add an item."""
+        for position in self._positions(item):
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self.items += 1
+
+    def __contains__(self, item):
+        return all(
+            self._bits[position >> 3] & 1 << (position & 7)
+            for position in self._positions(item)
+        )
+
+    def estimated_fp_rate(self):
+        """False-positive rate expected for the items added so far."""
+        return (
+            1 - math.exp(-self.hashes * self.items / self.size)
+        ) ** self.hashes
+
+
+class IdentifierFilter:
+    """Answers "was this counterparty ever written?" without the database.
+
+    A miss is definite, so /check can return blocking=false right away. It
+    only sees writes made by this process; periodic rebuilds also drop
+    stale entries and resize the filter.
+    """
+
+    def __init__(self, fp_rate):
+        self.fp_rate = fp_rate
+        self.loaded = False
+        self.checks = 0
+        self.definite_misses = 0
+        self._filter = None
+        self._pending = None
+        # Bumped by invalidate(), so that a load started before it is not
+        # installed over writes it did not see.
+        self._generation = 0
+        self._lock = threading.Lock()
+        self._load_lock = asyncio.Lock()
+
+    def load(self, session):
+        """Build a new filter from the request table and swap it in.
+
+        Run through ensure_loaded() or rebuild(), which take the load lock.
+        """
+        with self._lock:
+            self._pending = []
+            generation = self._generation
+        count = session.scalar(q.BLOOM_COUNT_QUERY)
+        bloom = BloomFilter(
+            max(count * 3 * GROWTH, settings.bloom_filter_min_capacity),
+            self.fp_rate,
+        )
+        rows = session.execute(
+            q.BLOOM_IDENTIFIERS_QUERY.execution_options(
+                yield_per=LOAD_BATCH_SIZE,
+            ),
+        )
+        for row in rows:
+            for item in _items(*row):
+                bloom.add(item)
+        with self._lock:
+            pending, self._pending = self._pending, None
+            if generation != self._generation:
+                return
+            for item in pending:
+                bloom.add(item)
+            self._filter = bloom
+            self.loaded = True
+
+    async def ensure_loaded(self, session):
+        """Build the filter unless it is loaded, one load at a time."""
+        async with self._load_lock:
+            if not self.loaded:
+                await session.run_sync(self.load)
+
+    async def rebuild(self, session):
+        """Build a new filter even if one is loaded."""
+        async with self._load_lock:
+            await session.run_sync(self.load)
+
+    async def watch(self, session_factory, interval):
+        """Rebuild the filter forever, every interval seconds."""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                async with session_factory() as session:
+                    await self.rebuild(session)
+            except Exception:
+                logger.exception("Identifier filter rebuild failed")
+
+    def invalidate(self):
+        """Drop the filter so that it is rebuilt on next use."""
+        with self._lock:
+            self._generation += 1
+            self.loaded = False
+            self._filter = None
+
+    def add(self, inn, ogrn, sap_num):
+        """Register the identifiers of a committed request."""
+        items = _items(inn, ogrn, sap_num)
+        with self._lock:
+            if self._pending is not None:
+                self._pending.extend(items)
+            if self._filter is not None:
+                for item in items:
+                    self._filter.add(item)
+
+    def is_definite_miss(self, inn, ogrn, sap_num):
+        """True if none of the identifiers was ever written."""
+        bloom = self._filter
+        if bloom is None:
+            return False
+        self.checks += 1
+        if any(item in bloom for item in _items(inn, ogrn, sap_num)):
+            return False
+        self.definite_misses += 1
+        return True
+
+    def stats(self):
+        """Counters for monitoring."""
+        bloom = self._filter
+        return {
+            "loaded": self.loaded,
+            "fp_rate": self.fp_rate,
+            "estimated_fp_rate": bloom.estimated_fp_rate() if bloom else None,
+            "items": bloom.items if bloom else 0,
+            "size_bytes": len(bloom._bits) if bloom else 0,
+            "checks": self.checks,
+            "definite_misses": self.definite_misses,
+            "fast_path_rate": (
+                self.definite_misses / self.checks if self.checks else 0.0
+            ),
+        }
+
+
+def _items(inn, ogrn, sap_num):
+    return [
+        f"{name}:{value}"
+        for name, value in zip(IDENTIFIERS, (inn, ogrn, sap_num))
+        if value
+    ]
+
+
+identifier_filter = IdentifierFilter(settings.bloom_filter_fp_rate)
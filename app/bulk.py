@@ -0,0 +1,297 @@
+"""Bulk import of block requests through PostgreSQL COPY."""
+import csv
+import json
+from collections import deque
+from datetime import datetime
+
+from pydantic import ValidationError
+from sqlalchemy import text
+
+import app.changes as changes
+import app.counterparties as counterparties
+import app.schemas as s
+from app.dictionaries import dictionaries, validate_block_request
+
+CHUNK_SIZE = 5_000
+FORMATS = ("ndjson", "csv")
+
+REQUEST_COLUMNS = [
+    "id",
+    "is_resident",
+    "inn",
+    "ogrn",
+    "in_sap",
+    "sap_num",
+    "mdm_id",
+    "blocking",
+    "from_system",
+    "created_at",
+    "created_by",
+    "approved_at",
+    "approved_by",
+    "start_at",
+    "end_at",
+    "description",
+    "counterparty_id",
+]
+DETAIL_COLUMNS = ["request_id", "request_end_at", "workflow_code", "params"]
+
+# Chunks are staged in temporary tables and moved at the end, so that the
+# change feed is locked for the final INSERT only, not for every COPY.
+STAGE_QUERIES = [
+    text(
+        f"CREATE TEMP TABLE {stage} ON COMMIT DROP AS "
+        f"SELECT {', '.join(columns)} FROM {table} WITH NO DATA",
+    )
+    for stage, table, columns in (
+        ("bulk_request", "request", REQUEST_COLUMNS),
+        ("bulk_request_detail", "request_detail", DETAIL_COLUMNS),
+    )
+]
+
+MOVE_STAGED_REQUESTS_QUERY = text(
+    f"INSERT INTO request ({', '.join(REQUEST_COLUMNS)}, change_seq) "
+    f"SELECT {', '.join(REQUEST_COLUMNS)}, CAST(:seq AS bigint) "
+    f"FROM bulk_request",
+)
+
+MOVE_STAGED_DETAILS_QUERY = text(
+    f"INSERT INTO request_detail ({', '.join(DETAIL_COLUMNS)}) "
+    f"SELECT {', '.join(DETAIL_COLUMNS)} FROM bulk_request_detail",
+)
+
+DROP_STAGE_QUERY = text("DROP TABLE bulk_request, bulk_request_detail")
+
+RESERVE_IDS_QUERY = text(
+    """
+    SELECT nextval(pg_get_serial_sequence('request', 'id'))
+    FROM generate_series(1, :count)
+    """,
+)
+
+
+async def iter_lines(chunks):
+    """Split an async stream of bytes into text lines."""
+    buffer = b""
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            yield line.decode("utf-8")
+    if buffer:
+        yield buffer.decode("utf-8")
+
+
+async def iter_file_lines(file):
+    """Expose the lines of a text file as an async iterator."""
+    for line in file:
+        yield line
+
+
+class _LineFeed:
+    """Lines handed to a csv.reader as they arrive."""
+
+    def __init__(self):
+        self.lines = deque()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if not self.lines:
+            raise StopIteration
+        return self.lines.popleft()
+
+
+async def _iter_csv_records(lines):
+    """Yield the cells of each CSV record, quoted newlines included.
+
+    One csv.reader parses the whole stream. It is handed a record once all
+    of its quoted fields are closed, so it never runs out of input halfway.
+    """
+    feed = _LineFeed()
+    reader = csv.reader(feed)
+    quotes = 0
+    async for line in lines:
+        if not quotes and not line.strip():
+            continue
+        feed.lines.append(line if line.endswith("\n") else line + "\n")
+        quotes += line.count('"')
+        if quotes % 2 == 0:
+            quotes = 0
+            yield next(reader)
+    if feed.lines:
+        yield next(reader)
+
+
+async def iter_rows(lines, fmt):
+    """Yield (row number, raw row) pairs from NDJSON or CSV lines.
+
+    CSV input needs a header row with BlockRequest field names; the details
+    column holds the JSON array of details. Empty CSV cells become None and
+    boolean cells are parsed before the root validators see them.
+    """
+    if fmt == "csv":
+        async for row_num, row in _iter_csv_rows(lines):
+            yield row_num, row
+        return
+    row_num = 0
+    async for line in lines:
+        if not line.strip():
+            continue
+        row_num += 1
+        try:
+            row = json.loads(line)
+        except ValueError as exc:
+            yield row_num, exc
+            continue
+        yield row_num, row
+
+
+async def _iter_csv_rows(lines):
+    """Yield (row number, raw row) pairs from CSV lines after the header."""
+    header = None
+    row_num = 0
+    async for values in _iter_csv_records(lines):
+        if header is None:
+            header = values
+            continue
+        row_num += 1
+        try:
+            row = {
+                name: _csv_value(name, value)
+                for name, value in zip(header, values)
+            }
+            if row.get("details"):
+                row["details"] = json.loads(row["details"])
+        except ValueError as exc:
+            yield row_num, exc
+            continue
+        yield row_num, row
+
+
+def _csv_value(name, value):
+    """Convert a CSV cell to what BlockRequest validators expect."""
+    if not value:
+        return None
+    field = s.BlockRequest.__fields__.get(name)
+    if field is not None and field.type_ is bool:
+        flag = value.strip().lower()
+        if flag in ("1", "true", "t", "yes", "y"):
+            return True
+        if flag in ("0", "false", "f", "no", "n"):
+            return False
+        raise ValueError(f"{name} is not a boolean: {value!r}")
+    return value
+
+
+def validate_row(row, snapshot=None):
+    """Validate a raw row as a BlockRequest, returning (request, errors).
+
+    With a dictionary snapshot, unknown codes are rejected as well.
+    """
+    if isinstance(row, Exception):
+        return None, [f"malformed row: {row}"]
+    try:
+        request = s.BlockRequest.parse_obj(row)
+    except ValidationError as exc:
+        return None, [
+            _format_error(error["loc"], error["msg"])
+            for error in exc.errors()
+        ]
+    if snapshot is not None:
+        errors = validate_block_request(snapshot, request)
+        if errors:
+            return None, [_format_error(loc, msg) for loc, msg in errors]
+    return request, []
+
+
+def _format_error(loc, msg):
+    return "{}: {}".format(".".join(map(str, loc)), msg)
+
+
+async def _copy_chunk(session, driver_connection, chunk, blocking, now):
+    """COPY one chunk of validated requests and their details to staging."""
+    ids = (
+        await session.scalars(RESERVE_IDS_QUERY, {"count": len(chunk)})
+    ).all()
+    counterparty_ids = await counterparties.upsert(
+        session, [(r.inn, r.ogrn, r.sap_num) for r in chunk],
+    )
+    request_records = []
+    detail_records = []
+    for request_id, request in zip(ids, chunk):
+        data = request.dict()
+        details = data.pop("details")
+        data.update(
+            id=request_id,
+            blocking=blocking,
+            created_at=now,
+            counterparty_id=counterparty_ids[
+                (request.inn, request.ogrn, request.sap_num)
+            ],
+        )
+        request_records.append(tuple(data[c] for c in REQUEST_COLUMNS))
+        detail_records.extend(
+            (
+                request_id,
+                data["end_at"],
+                detail["workflow_code"],
+                json.dumps(detail["params"]),
+            )
+            for detail in details
+        )
+    await driver_connection.copy_records_to_table(
+        "bulk_request", records=request_records, columns=REQUEST_COLUMNS,
+    )
+    if detail_records:
+        await driver_connection.copy_records_to_table(
+            "bulk_request_detail",
+            records=detail_records,
+            columns=DETAIL_COLUMNS,
+        )
+
+
+async def import_blocks(session, lines, fmt="ndjson", blocking=True):
+    """Validate rows in chunks and COPY them in a single transaction.
+
+    Only one chunk is held in memory at a time. Rejected rows are reported
+    and skipped; the caller commits.
+    """
+    connection = await session.connection()
+    raw_connection = await connection.get_raw_connection()
+    driver_connection = raw_connection.driver_connection
+    now = datetime.now()
+    snapshot = await dictionaries.get(session)
+
+    imported = 0
+    errors = []
+    chunk = []
+    for query in STAGE_QUERIES:
+        await session.execute(query)
+    async for row_num, row in iter_rows(lines, fmt):
+        request, row_errors = validate_row(row, snapshot)
+        if row_errors:
+            errors.append(s.BulkImportError(row=row_num, errors=row_errors))
+            continue
+        chunk.append(request)
+        if len(chunk) >= CHUNK_SIZE:
+            await _copy_chunk(session, driver_connection, chunk, blocking, now)
+            imported += len(chunk)
+            chunk = []
+    if chunk:
+        await _copy_chunk(session, driver_connection, chunk, blocking, now)
+        imported += len(chunk)
+    if imported:
+        # One sequence number for the whole import, taken last.
+        seq = await changes.next_seq(session)
+        await session.execute(MOVE_STAGED_REQUESTS_QUERY, {"seq": seq})
+        await session.execute(MOVE_STAGED_DETAILS_QUERY)
+        await changes.publish_resync(session, seq)
+    await session.execute(DROP_STAGE_QUERY)
+
+    return s.BulkImportReport(
+        imported=imported,
+        rejected=len(errors),
+        errors=errors,
+    )
@@ -0,0 +1,157 @@
+"""Read-through cache of /check results."""
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import NamedTuple, Optional
+
+from app.config import settings
+
+EPOCH = datetime(1970, 1, 1)
+
+
+class CacheEntry(NamedTuple):
+    """Cached check result and the range of check_for_dt it holds for."""
+
+    blocking: bool
+    valid_from: Optional[datetime]
+    valid_until: Optional[datetime]
+    expires_at: float
+
+
+class CheckCache:
+    """TTL + LRU cache keyed by identifiers, contract and check_for_dt bucket.
+
+    An entry is only served for check_for_dt inside [valid_from, valid_until),
+    the span between the surrounding start_at/end_at transitions of the
+    counterparty's blocks, so a bucket never hides a transition. Writes
+    evict every entry that mentions one of the written identifiers.
+    """
+
+    def __init__(self, max_entries, ttl, bucket_seconds):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.bucket_seconds = bucket_seconds
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.version = 0
+        self._entries = OrderedDict()
+        self._by_identifier = {}
+        self._lock = threading.Lock()
+
+    def key(self, request):
+        """Cache key of a check request."""
+        bucket = None
+        if request.check_for_dt is not None:
+            seconds = (request.check_for_dt - EPOCH).total_seconds()
+            bucket = int(seconds // self.bucket_seconds)
+        return (
+            request.inn or None,
+            request.ogrn or None,
+            request.sap_num or None,
+            request.contract,
+            bucket,
+        )
+
+    def get(self, request):
+        """Return the cached blocking status or None on a miss."""
+        key = self.key(request)
+        dt = request.check_for_dt
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires_at <= time.monotonic():
+                self._remove(key)
+                entry = None
+            if entry is None or not _covers(entry, dt):
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry.blocking
+
+    def put(
+        self, request, blocking, valid_from=None, valid_until=None,
+        version=None,
+    ):
+        """Store a check result.
+
+        Pass the version read before computing the result: if a write was
+        invalidated in the meantime the result may be stale and is dropped.
+        """
+        key = self.key(request)
+        entry = CacheEntry(
+            blocking, valid_from, valid_until, time.monotonic() + self.ttl,
+        )
+        with self._lock:
+            if version is not None and version != self.version:
+                return
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = entry
+            for identifier in _identifiers(key):
+                self._by_identifier.setdefault(identifier, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate(self, inn=None, ogrn=None, sap_num=None):
+        """Evict every entry that touches one of the identifiers."""
+        with self._lock:
+            self.version += 1
+            for identifier in _identifiers((inn, ogrn, sap_num)):
+                for key in list(self._by_identifier.get(identifier, ())):
+                    self._remove(key)
+
+    def clear(self):
+        """Drop all entries."""
+        with self._lock:
+            self.version += 1
+            self._entries.clear()
+            self._by_identifier.clear()
+
+    def stats(self):
+        """Counters for monitoring."""
+        total = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+    def _remove(self, key):
+        self._entries.pop(key, None)
+        for identifier in _identifiers(key):
+            keys = self._by_identifier.get(identifier)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_identifier[identifier]
+
+
+def _covers(entry, check_for_dt):
+    if check_for_dt is None:
+        return True
+    if entry.valid_from is not None and check_for_dt < entry.valid_from:
+        return False
+    if entry.valid_until is not None and check_for_dt >= entry.valid_until:
+        return False
+    return True
+
+
+def _identifiers(key):
+    return [
+        (name, value)
+        for name, value in zip(("inn", "ogrn", "sap_num"), key[:3])
+        if value
+    ]
+
+
+check_cache = CheckCache(
+    settings.check_cache_size,
+    settings.check_cache_ttl,
+    settings.check_cache_bucket,
+)
@@ -0,0 +1,271 @@
+"""Change feed over Postgres LISTEN/NOTIFY keeping per-process caches fresh.
+
+Every write takes the next change_feed sequence number, stores it in
+request.change_seq and sends a NOTIFY in the same transaction, so events
+are delivered only after commit and in sequence order. Each worker listens
+and applies the events of the others to its block index, Bloom filter,
+check cache and dictionary snapshot. A gap in the sequence (a dropped
+connection, a lost event) triggers a full resync.
+"""
+import asyncio
+import base64
+import gzip
+import json
+import logging
+import uuid
+from datetime import datetime
+
+import asyncpg
+
+import app.queries as q
+from app.block_index import block_index
+from app.bloom import identifier_filter
+from app.cache import check_cache
+from app.config import settings
+from app.dictionaries import dictionaries
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "request_changes"
+DICT_CHANNEL = "dict_changes"
+RECONNECT_DELAY = 5
+# Long-polling falls back to polling the database without a listener.
+POLL_INTERVAL = 0.5
+MAX_PAGE_SIZE = 10_000
+MAX_WAIT = 60
+GZIP_MIN_SIZE = 1_000
+
+# Identifies the events of this process, which are already applied.
+ORIGIN = uuid.uuid4().hex[:12]
+
+
+async def next_seq(session):
+    """Take the next sequence number, locking the feed until commit."""
+    return await session.scalar(q.NEXT_CHANGE_SEQ_QUERY)
+
+
+async def _notify(session, seq, event):
+    await session.execute(
+        q.NOTIFY_QUERY,
+        {
+            "channel": CHANNEL,
+            "payload": json.dumps(
+                {"seq": seq, "origin": ORIGIN, **event},
+                separators=(",", ":"),
+            ),
+        },
+    )
+
+
+async def publish(session, seq, request):
+    """Announce a request before its transaction commits."""
+    await _notify(
+        session,
+        seq,
+        {
+            "id": request.id,
+            "inn": request.inn,
+            "ogrn": request.ogrn,
+            "sap_num": request.sap_num,
+        },
+    )
+
+
+async def publish_resync(session, seq):
+    """Ask every worker to rebuild its caches, e.g. after a bulk import."""
+    await _notify(session, seq, {"resync": True})
+
+
+def encode_cursor(seq, request_id):
+    """Opaque position in the feed after the given request."""
+    raw = f"{seq}:{request_id}".encode("ascii")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor):
+    """Return (seq, request_id); None starts from the beginning."""
+    if not cursor:
+        return -1, 0
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        seq, request_id = raw.decode("ascii").split(":")
+        return int(seq), int(request_id)
+    except (ValueError, UnicodeDecodeError) as exc:
+        raise ValueError("Invalid cursor") from exc
+
+
+async def fetch_changes(session, cursor, limit, wait=0):
+    """Requests committed after cursor, long-polling up to wait seconds."""
+    seq, request_id = decode_cursor(cursor)
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + wait
+    while True:
+        changed = change_listener.watch()
+        rows = (
+            await session.execute(
+                q.CHANGES_QUERY,
+                {"seq": seq, "id": request_id, "limit": limit},
+            )
+        ).all()
+        remaining = deadline - loop.time()
+        if rows or remaining <= 0:
+            break
+        # Let the next query see rows committed meanwhile.
+        await session.rollback()
+        await change_listener.wait_for_change(changed, remaining)
+    if rows:
+        cursor = encode_cursor(rows[-1].change_seq, rows[-1].id)
+    return {
+        "cursor": cursor or encode_cursor(seq, request_id),
+        "changes": [dict(row._mapping) for row in rows],
+    }
+
+
+def encode_page(page, accept_encoding=""):
+    """Serialize a page, gzipped when the client accepts it."""
+    body = json.dumps(
+        page, default=_json_default, ensure_ascii=False, separators=(",", ":"),
+    ).encode("utf-8")
+    if len(body) >= GZIP_MIN_SIZE and "gzip" in accept_encoding:
+        return gzip.compress(body), "gzip"
+    return body, None
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+class ChangeListener:
+    """Applies change feed events to the caches of this process."""
+
+    def __init__(self):
+        self.last_seq = None
+        self.applied = 0
+        self.resyncs = 0
+        self._connection = None
+        self._queue = asyncio.Queue()
+        self._changed = asyncio.Event()
+
+    async def connect(self, dsn, session_factory):
+        """LISTEN and note the current sequence number.
+
+        Call it before the caches are loaded so that no commit made in
+        between is missed. On a reconnect, missed events force a resync.
+        """
+        self._queue = asyncio.Queue()
+        connection = await asyncpg.connect(dsn)
+        try:
+            for channel in (CHANNEL, DICT_CHANNEL):
+                await connection.add_listener(channel, self._on_notify)
+            connection.add_termination_listener(self._on_terminate)
+            async with session_factory() as session:
+                seq = await session.scalar(q.CHANGE_SEQ_QUERY)
+                if self.last_seq is not None and seq != self.last_seq:
+                    await self.resync(session)
+        except BaseException:
+            await connection.close()
+            raise
+        self.last_seq = seq
+        self._connection = connection
+
+    async def run(self, dsn, session_factory):
+        """Apply events forever, reconnecting when the connection drops."""
+        while True:
+            try:
+                if self._connection is None:
+                    await self.connect(dsn, session_factory)
+                while True:
+                    channel, payload = await self._queue.get()
+                    if channel is None:
+                        raise ConnectionError("Change feed connection lost")
+                    async with session_factory() as session:
+                        await self.handle(session, channel, payload)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Change feed listener failed")
+                await self.close()
+                await asyncio.sleep(RECONNECT_DELAY)
+
+    async def close(self):
+        """Stop listening."""
+        connection, self._connection = self._connection, None
+        if connection is not None and not connection.is_closed():
+            await connection.close()
+
+    async def handle(self, session, channel, payload):
+        """Apply one notification."""
+        if channel == DICT_CHANNEL:
+            await dictionaries.refresh_if_changed(session)
+            return
+        event = json.loads(payload)
+        seq = event["seq"]
+        if self.last_seq is not None and seq <= self.last_seq:
+            return
+        if self.last_seq is not None and seq != self.last_seq + 1:
+            logger.warning(
+                "Change feed gap after %s, got %s: resyncing",
+                self.last_seq,
+                seq,
+            )
+            self.last_seq = seq
+            await self.resync(session)
+            return
+        self.last_seq = seq
+        if event["origin"] == ORIGIN:
+            return
+        if event.get("resync"):
+            await self.resync(session)
+            return
+
+        result = await session.execute(
+            q.CHANGED_REQUEST_QUERY, {"id": event["id"]},
+        )
+        row = result.first()
+        if row is not None:
+            if settings.block_index_enabled:
+                block_index.add(row, row.details)
+            if settings.bloom_filter_enabled:
+                identifier_filter.add(row.inn, row.ogrn, row.sap_num)
+        if settings.check_cache_enabled:
+            check_cache.invalidate(
+                event["inn"], event["ogrn"], event["sap_num"],
+            )
+        self.applied += 1
+
+    async def resync(self, session):
+        """Drop every cache so that it is rebuilt from the database."""
+        self.resyncs += 1
+        block_index.invalidate()
+        identifier_filter.invalidate()
+        check_cache.clear()
+        await dictionaries.reload(session)
+
+    def watch(self):
+        """Event set by the next request change, None without a listener."""
+        return self._changed if self._connection is not None else None
+
+    async def wait_for_change(self, changed, timeout):
+        """Wait for the event from watch() or until timeout expires."""
+        if changed is None:
+            await asyncio.sleep(min(timeout, POLL_INTERVAL))
+            return
+        try:
+            await asyncio.wait_for(changed.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    def _on_notify(self, connection, pid, channel, payload):
+        self._queue.put_nowait((channel, payload))
+        if channel == CHANNEL:
+            # Wake current waiters; later ones wait for the next event.
+            self._changed.set()
+            self._changed = asyncio.Event()
+
+    def _on_terminate(self, connection):
+        self._queue.put_nowait((None, None))
+
+
+change_listener = ChangeListener()
@@ -0,0 +1,145 @@
+"""Command line entry point for maintenance tasks."""
+import argparse
+import asyncio
+from datetime import datetime, timedelta
+
+import app.archive as archive
+import app.bulk as bulk
+import app.export as export
+import app.partitions as partitions
+import app.queries as q
+from app.config import settings
+from app.db import AsyncSessionLocal, SessionLocal
+
+
+def rebuild_block_state(session):
+    """Recompute counterparty_block_state from the request history."""
+    session.execute(q.REBUILD_BLOCK_STATE_QUERY)
+
+
+def rebuild_rollups(session):
+    """Recompute request_rollup_daily from the request history."""
+    session.execute(q.REBUILD_ROLLUP_DAILY_QUERY)
+
+
+async def import_blocks(path, fmt):
+    """Bulk import block requests from a file and print the report."""
+    async with AsyncSessionLocal() as session:
+        with open(path, encoding="utf-8") as file:
+            report = await bulk.import_blocks(
+                session, bulk.iter_file_lines(file), fmt,
+            )
+        await session.commit()
+    print(report.json(indent=2))
+
+
+def export_history(session, directory, fmt, batch_size):
+    """Append newly created requests to a columnar export."""
+    exported, files = export.export_history(
+        session, directory, fmt, batch_size,
+    )
+    print(f"exported {exported} rows to {len(files)} files")
+
+
+def create_partitions(session, months_ahead):
+    """Create the monthly request partitions up to months_ahead."""
+    created = partitions.ensure_partitions(session, months_ahead)
+    print(f"created {len(created)} partitions: {', '.join(created)}")
+
+
+def archive_partitions(session, before):
+    """Move request partitions expired before a date to the archive."""
+    archived = partitions.archive_partitions(session, before)
+    print(f"archived {len(archived)} partitions: {', '.join(archived)}")
+
+
+def archive_requests(session, before, batch_size):
+    """Move requests expired before a date or superseded to the archive."""
+    archived = archive.archive_requests(session, before, batch_size)
+    print(f"archived {archived} requests")
+
+
+def main(argv=None):
+    """Parse arguments and run the requested command."""
+    parser = argparse.ArgumentParser(prog="python -m app.cli")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser(
+        "rebuild-block-state",
+        help="recompute counterparty_block_state from request history",
+    )
+    commands.add_parser(
+        "rebuild-rollups",
+        help="recompute request_rollup_daily from request history",
+    )
+    import_parser = commands.add_parser(
+        "import-blocks",
+        help="bulk create block requests from an NDJSON or CSV file",
+    )
+    import_parser.add_argument("path")
+    import_parser.add_argument(
+        "--format", choices=bulk.FORMATS, default="ndjson",
+    )
+    export_parser = commands.add_parser(
+        "export-history",
+        help="append new requests to partitioned Parquet or Arrow files",
+    )
+    export_parser.add_argument("directory")
+    export_parser.add_argument(
+        "--format", choices=export.FORMATS, default="parquet",
+    )
+    export_parser.add_argument(
+        "--batch-size", type=int, default=export.BATCH_SIZE,
+    )
+    create_parser = commands.add_parser(
+        "create-partitions",
+        help="create the monthly request partitions ahead of time",
+    )
+    create_parser.add_argument(
+        "--months-ahead", type=int, default=settings.partition_months_ahead,
+    )
+    archive_parser = commands.add_parser(
+        "archive-partitions",
+        help="move request partitions expired before a date to the archive",
+    )
+    archive_parser.add_argument(
+        "--before", type=datetime.fromisoformat, required=True,
+    )
+    requests_parser = commands.add_parser(
+        "archive-requests",
+        help="move expired and superseded requests to the archive",
+    )
+    requests_parser.add_argument(
+        "--before",
+        type=datetime.fromisoformat,
+        default=datetime.now()
+        - timedelta(days=settings.archive_retention_days),
+    )
+    requests_parser.add_argument(
+        "--batch-size", type=int, default=settings.archive_batch_size,
+    )
+    args = parser.parse_args(argv)
+
+    if args.command == "import-blocks":
+        asyncio.run(import_blocks(args.path, args.format))
+        return
+
+    with SessionLocal() as session:
+        if args.command == "rebuild-block-state":
+            rebuild_block_state(session)
+        elif args.command == "rebuild-rollups":
+            rebuild_rollups(session)
+        elif args.command == "export-history":
+            export_history(
+                session, args.directory, args.format, args.batch_size,
+            )
+        elif args.command == "create-partitions":
+            create_partitions(session, args.months_ahead)
+        elif args.command == "archive-partitions":
+            archive_partitions(session, args.before)
+        elif args.command == "archive-requests":
+            archive_requests(session, args.before, args.batch_size)
+        session.commit()
+
+
+if __name__ == "__main__":
+    main()
@@ -17,6 +17,33 @@ class Settings(BaseSettings):
 
     alembic_test_config: str
 
+    block_index_enabled: bool = True
+
+    check_cache_enabled: bool = True
+    check_cache_size: int = 100_000
+    check_cache_ttl: int = 60
+    check_cache_bucket: int = 60
+
+    bloom_filter_enabled: bool = True
+    bloom_filter_fp_rate: float = 0.01
+    bloom_filter_min_capacity: int = 100_000
+    bloom_filter_rebuild_interval: int = 3600
+
+    dict_refresh_interval: int = 30
+
+    change_listener_enabled: bool = True
+
+    partition_months_ahead: int = 12
+    partition_maintenance_interval: int = 86400
+
+    archive_retention_days: int = 30
+    archive_batch_size: int = 1000
+    archive_interval: int = 86400
+
+    report_jobs_dir: str = "reports"
+    report_jobs_workers: int = 2
+    report_jobs_stale_after: int = 3600
+
     class Config:
         env_file = ".env"
         env_file_encoding = "utf-8"
@@ -25,9 +52,17 @@ class Settings(BaseSettings):
     def sql_alchemy_database_url(self):
         return f"postgresql://{self.db_user}:{self.db_pass}@{self.db_host}:{self.db_port}/{self.db_name}"
 
+    @property
+    def async_database_url(self):
+        return f"postgresql+asyncpg://{self.db_user}:{self.db_pass}@{self.db_host}:{self.db_port}/{self.db_name}"
+
     @property
     def database_url_test(self):
         return f"postgresql://{self.db_user_test}:{self.db_pass_test}@{self.db_host_test}:{self.db_port_test}/{self.db_name_test}"
 
+    @property
+    def async_database_url_test(self):
+        return f"postgresql+asyncpg://{self.db_user_test}:{self.db_pass_test}@{self.db_host_test}:{self.db_port_test}/{self.db_name_test}"
+
 
 settings = Settings()
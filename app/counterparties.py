@@ -0,0 +1,30 @@
+"""Resolution of identifier triples to counterparty surrogate keys."""
+import app.queries as q
+
+
+def identifiers(inn, ogrn, sap_num):
+    """The triple as stored in counterparty, '' for a missing identifier."""
+    return inn or "", ogrn or "", sap_num or ""
+
+
+async def upsert(session, triples):
+    """Map identifier triples to counterparty ids, adding new ones."""
+    unique = sorted({identifiers(*triple) for triple in triples})
+    if not unique:
+        return {}
+    inns, ogrns, sap_nums = zip(*unique)
+    rows = await session.execute(
+        q.UPSERT_COUNTERPARTIES_QUERY,
+        {"inns": list(inns), "ogrns": list(ogrns), "sap_nums": list(sap_nums)},
+    )
+    ids = {(row.inn, row.ogrn, row.sap_num): row.id for row in rows}
+    return {triple: ids[identifiers(*triple)] for triple in triples}
+
+
+async def resolve(session, inn, ogrn, sap_num):
+    """Ids of every counterparty sharing any of the given identifiers."""
+    rows = await session.scalars(
+        q.RESOLVE_COUNTERPARTY_QUERY,
+        {"inn": inn, "ogrn": ogrn, "sap_num": sap_num},
+    )
+    return rows.all()
@@ -1,5 +1,6 @@
 """Database connection and session management."""
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import declarative_base, sessionmaker
 
 from app.config import settings
@@ -7,6 +8,11 @@ from app.config import settings
 engine = create_engine(settings.sql_alchemy_database_url)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+async_engine = create_async_engine(settings.async_database_url)
+AsyncSessionLocal = async_sessionmaker(
+    async_engine, autoflush=False, expire_on_commit=False,
+)
+
 Base = declarative_base()
 
 
@@ -14,3 +20,9 @@ def get_db():
     """Database session context manager."""
     with SessionLocal() as db:
         yield db
+
+
+async def get_async_db():
+    """Async database session context manager."""
+    async with AsyncSessionLocal() as db:
+        yield db
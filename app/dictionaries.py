@@ -0,0 +1,247 @@
+"""Immutable in-memory snapshot of the dictionary tables."""
+import asyncio
+import hashlib
+import json
+import logging
+from types import MappingProxyType
+from typing import FrozenSet, Mapping, NamedTuple, Optional, Tuple
+
+from sqlalchemy import select
+
+import app.models as models
+
+logger = logging.getLogger(__name__)
+
+
+class Payload(NamedTuple):
+    """Pre-serialized response body with its strong ETag."""
+
+    body: bytes
+    etag: str
+
+
+class DictionarySnapshot(NamedTuple):
+    """Dictionary rows and the /dict_* responses rendered from them."""
+
+    version: int
+    systems: Tuple[models.DictSystem, ...]
+    workflows: Tuple[models.DictWorkflow, ...]
+    doc_types: Tuple[models.DictDocType, ...]
+    actions: Tuple[models.DictAction, ...]
+    type_valid_actions: Tuple[Tuple[int, int], ...]
+    operations: Tuple[models.DictOperation, ...]
+    payloads: Mapping[Tuple[str, Optional[int]], Payload]
+    system_codes: FrozenSet[int]
+    workflow_codes: FrozenSet[str]
+    operation_codes: FrozenSet[str]
+    doc_type_systems: Mapping[int, int]
+    valid_actions: Mapping[int, int]
+
+    def payload(self, name, param=None):
+        """Return the payload of an endpoint, an empty list if unknown."""
+        return self.payloads.get((name, param)) or EMPTY_PAYLOAD
+
+    def is_valid_action(self, doc_type_code, action_code):
+        """Check a (doc_type, action) pair against the valid action bitset."""
+        if action_code is None or action_code < 0:
+            return False
+        mask = self.valid_actions.get(doc_type_code, 0)
+        return bool(mask >> action_code & 1)
+
+
+def render(data):
+    """Serialize data the way FastAPI's JSONResponse does, plus an ETag."""
+    body = json.dumps(
+        data, ensure_ascii=False, separators=(",", ":"),
+    ).encode("utf-8")
+    return Payload(body, '"{}"'.format(hashlib.sha256(body).hexdigest()[:32]))
+
+
+EMPTY_PAYLOAD = render([])
+
+
+def build_snapshot(
+    version, systems, workflows, doc_types, actions, type_valid_actions,
+    operations,
+):
+    """Render every /dict_* response from the dictionary rows."""
+    systems = tuple(sorted(systems, key=lambda row: row.code))
+    workflows = tuple(sorted(workflows, key=lambda row: row.code))
+    doc_types = tuple(sorted(doc_types, key=lambda row: row.code))
+    actions = tuple(sorted(actions, key=lambda row: row.code))
+    operations = tuple(sorted(operations, key=lambda row: row.sap_code))
+    type_valid_actions = tuple(sorted(type_valid_actions))
+
+    source_systems = {row.code for row in systems if row.source_doc}
+    action_names = {row.code: row.name for row in actions}
+    payloads = {
+        ("dict_operation", None): render(
+            [
+                {"sap_code": op.sap_code, "sap_name": op.sap_name,
+                 "name": op.name}
+                for op in operations
+                if op.blocking
+            ],
+        ),
+        ("dict_system", None): render(
+            [
+                {"code": row.code, "name": row.name}
+                for row in systems
+                if row.source_doc
+            ],
+        ),
+    }
+    for system_code in source_systems:
+        payloads[("dict_doc_type", system_code)] = render(
+            [
+                {"code": row.code, "name": row.name,
+                 "fullname": row.fullname}
+                for row in doc_types
+                if row.system_code == system_code
+            ],
+        )
+    for doc_type in doc_types:
+        payloads[("dict_action", doc_type.code)] = render(
+            [
+                {"code": action_code, "name": action_names[action_code]}
+                for doc_type_code, action_code in type_valid_actions
+                if doc_type_code == doc_type.code
+            ],
+        )
+
+    valid_actions = {}
+    for doc_type_code, action_code in type_valid_actions:
+        valid_actions[doc_type_code] = (
+            valid_actions.get(doc_type_code, 0) | 1 << action_code
+        )
+
+    return DictionarySnapshot(
+        version=version,
+        systems=systems,
+        workflows=workflows,
+        doc_types=doc_types,
+        actions=actions,
+        type_valid_actions=type_valid_actions,
+        operations=operations,
+        payloads=MappingProxyType(payloads),
+        system_codes=frozenset(row.code for row in systems),
+        workflow_codes=frozenset(row.code for row in workflows),
+        operation_codes=frozenset(row.sap_code for row in operations),
+        doc_type_systems=MappingProxyType(
+            {row.code: row.system_code for row in doc_types},
+        ),
+        valid_actions=MappingProxyType(valid_actions),
+    )
+
+
+def validate_block_request(snapshot, request):
+    """Check dictionary codes of a BlockRequest without the database.
+
+    Returns a list of (loc, message) pairs, empty if every code is known.
+    DOC and OPER params are only checked for their own workflows.
+    """
+    errors = []
+    if request.from_system not in snapshot.system_codes:
+        errors.append((("from_system",), "unknown from_system code"))
+    for num, detail in enumerate(request.details):
+        loc = ("details", num)
+        params = detail.params
+        if detail.workflow_code not in snapshot.workflow_codes:
+            errors.append((loc + ("workflow_code",), "unknown workflow_code"))
+        elif detail.workflow_code == "DOC":
+            errors.extend(
+                (loc + ("params", field), message)
+                for field, message in _doc_errors(snapshot, params)
+            )
+        elif detail.workflow_code == "OPER":
+            for code in params.operation_sap_code or ():
+                if code not in snapshot.operation_codes:
+                    errors.append(
+                        (
+                            loc + ("params", "operation_sap_code"),
+                            f"unknown operation_sap_code {code}",
+                        ),
+                    )
+    return errors
+
+
+def _doc_errors(snapshot, params):
+    system_code = params.system_code
+    if system_code is not None and system_code not in snapshot.system_codes:
+        yield "system_code", "unknown system_code"
+    doc_system = snapshot.doc_type_systems.get(params.doc_type_code)
+    if doc_system is None:
+        yield "doc_type_code", "unknown doc_type_code"
+        return
+    if system_code is not None and doc_system != system_code:
+        yield "doc_type_code", "doc_type_code does not belong to system_code"
+    if not snapshot.is_valid_action(params.doc_type_code, params.action_code):
+        yield "action_code", "action_code is not valid for doc_type_code"
+
+
+async def load_snapshot(session):
+    """Read all dictionary tables into a new snapshot."""
+    version = await session.scalar(select(models.DictVersion.version))
+    rows = {}
+    for name, model in (
+        ("systems", models.DictSystem),
+        ("workflows", models.DictWorkflow),
+        ("doc_types", models.DictDocType),
+        ("actions", models.DictAction),
+        ("operations", models.DictOperation),
+    ):
+        rows[name] = (await session.scalars(select(model))).all()
+    type_valid_actions = (
+        await session.execute(
+            select(
+                models.DictTypeValidAction.doc_type_code,
+                models.DictTypeValidAction.action_code,
+            ),
+        )
+    ).all()
+    return build_snapshot(
+        version or 0,
+        type_valid_actions=[tuple(row) for row in type_valid_actions],
+        **rows,
+    )
+
+
+class Dictionaries:
+    """Holder of the current snapshot; swapping it is atomic."""
+
+    def __init__(self):
+        self.snapshot: Optional[DictionarySnapshot] = None
+        self._lock = asyncio.Lock()
+
+    async def get(self, session):
+        """Return the snapshot, loading it on first use."""
+        if self.snapshot is None:
+            async with self._lock:
+                if self.snapshot is None:
+                    self.snapshot = await load_snapshot(session)
+        return self.snapshot
+
+    async def reload(self, session):
+        """Replace the snapshot with a fresh one from the database."""
+        async with self._lock:
+            self.snapshot = await load_snapshot(session)
+        return self.snapshot
+
+    async def refresh_if_changed(self, session):
+        """Reload when dict_version moved past the snapshot version."""
+        version = await session.scalar(select(models.DictVersion.version))
+        if self.snapshot is None or version != self.snapshot.version:
+            await self.reload(session)
+
+    async def watch(self, session_factory, interval):
+        """Poll dict_version forever and reload on a bump."""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                async with session_factory() as session:
+                    await self.refresh_if_changed(session)
+            except Exception:
+                logger.exception("Dictionary snapshot refresh failed")
+
+
+dictionaries = Dictionaries()
@@ -0,0 +1,268 @@
+"""Incremental columnar export of the request history.
+
+Needs the optional pyarrow dependency (``poetry install -E export``).
+"""
+import json
+import os
+
+from sqlalchemy import select, tuple_, union_all
+
+import app.models as models
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - optional dependency
+    pa = pc = pq = None
+
+FORMATS = ("parquet", "arrow")
+BATCH_SIZE = 50_000
+STATE_FILE = "_export_state.json"
+# Requests written before the change feed have change_seq 0.
+FIRST_CURSOR = (-1, 0, 0)
+
+REQUEST_FIELDS = (
+    "is_resident",
+    "inn",
+    "ogrn",
+    "in_sap",
+    "sap_num",
+    "mdm_id",
+    "blocking",
+    "from_system",
+    "created_at",
+    "created_by",
+    "approved_at",
+    "approved_by",
+    "start_at",
+    "end_at",
+    "description",
+)
+PARAM_FIELDS = (
+    "max_sum",
+    "operation_sap_code",
+    "balance_unit",
+    "system_code",
+    "doc_type_code",
+    "action_code",
+    "doc_num",
+    "name_object",
+    "contract",
+    "debit",
+    "account",
+)
+
+
+def arrow_schema():
+    """Arrow schema of an exported request x request_detail row."""
+    _require_pyarrow()
+    timestamp = pa.timestamp("us")
+    return pa.schema(
+        [
+            ("request_id", pa.int64()),
+            ("detail_id", pa.int64()),
+            ("is_resident", pa.bool_()),
+            ("inn", pa.string()),
+            ("ogrn", pa.string()),
+            ("in_sap", pa.bool_()),
+            ("sap_num", pa.string()),
+            ("mdm_id", pa.string()),
+            ("blocking", pa.bool_()),
+            ("from_system", pa.int16()),
+            ("created_at", timestamp),
+            ("created_by", pa.string()),
+            ("approved_at", timestamp),
+            ("approved_by", pa.string()),
+            ("start_at", timestamp),
+            ("end_at", timestamp),
+            ("description", pa.string()),
+            ("workflow_code", pa.string()),
+            ("max_sum", pa.int64()),
+            ("operation_sap_code", pa.list_(pa.string())),
+            ("balance_unit", pa.string()),
+            ("system_code", pa.int64()),
+            ("doc_type_code", pa.int64()),
+            ("action_code", pa.int64()),
+            ("doc_num", pa.string()),
+            ("name_object", pa.string()),
+            ("contract", pa.string()),
+            ("debit", pa.bool_()),
+            ("account", pa.string()),
+        ],
+    )
+
+
+def _require_pyarrow():
+    if pa is None:
+        raise RuntimeError(
+            "Columnar export needs pyarrow: poetry install -E export",
+        )
+
+
+def _export_rows(request, detail, after):
+    """Select rows of a request table and its detail table after a cursor."""
+    change_seq, request_id, detail_id = after
+    return (
+        select(
+            request.change_seq,
+            request.id.label("request_id"),
+            detail.id.label("detail_id"),
+            *(getattr(request, name) for name in REQUEST_FIELDS),
+            detail.workflow_code,
+            detail.params,
+        )
+        .join(
+            detail,
+            (detail.request_id == request.id)
+            & (detail.request_end_at == request.end_at),
+        )
+        .where(
+            # The first condition is the one the change_seq index serves.
+            tuple_(request.change_seq, request.id)
+            >= tuple_(change_seq, request_id),
+            tuple_(request.change_seq, request.id, detail.id)
+            > tuple_(change_seq, request_id, detail_id),
+        )
+    )
+
+
+def build_export_query(after):
+    """Select rows after a (change_seq, request id, detail id) cursor.
+
+    change_seq is taken under a lock held until commit, so rows commit in
+    its order and none can turn up behind the cursor later. Archived
+    requests are read too, since superseded ones may be archived before
+    they are exported.
+    """
+    rows = union_all(
+        _export_rows(models.Request, models.RequestDetail, after),
+        _export_rows(
+            models.RequestArchive, models.RequestDetailArchive, after,
+        ),
+    ).subquery()
+    return select(rows).order_by(
+        rows.c.change_seq, rows.c.request_id, rows.c.detail_id,
+    )
+
+
+def to_record_batch(rows, schema):
+    """Flatten rows, JSONB params included, into an Arrow record batch."""
+    columns = {name: [] for name in schema.names}
+    for _, request_id, detail_id, *values, workflow_code, params in rows:
+        columns["request_id"].append(request_id)
+        columns["detail_id"].append(detail_id)
+        for name, value in zip(REQUEST_FIELDS, values):
+            columns[name].append(value)
+        columns["workflow_code"].append(workflow_code)
+        params = params or {}
+        for name in PARAM_FIELDS:
+            columns[name].append(params.get(name))
+    return pa.RecordBatch.from_pydict(columns, schema=schema)
+
+
+def read_state(directory):
+    """Last exported (change_seq, request id, detail id) cursor."""
+    try:
+        with open(os.path.join(directory, STATE_FILE)) as file:
+            state = json.load(file)
+    except FileNotFoundError:
+        return FIRST_CURSOR
+    return state["change_seq"], state["last_id"], state["last_detail_id"]
+
+
+def _write_state(directory, cursor):
+    path = os.path.join(directory, STATE_FILE)
+    change_seq, last_id, last_detail_id = cursor
+    with open(f"{path}.tmp", "w") as file:
+        json.dump(
+            {
+                "change_seq": change_seq,
+                "last_id": last_id,
+                "last_detail_id": last_detail_id,
+            },
+            file,
+        )
+    os.replace(f"{path}.tmp", path)
+
+
+class _PartitionWriters:
+    """Parquet writers per created_at month, or one Arrow IPC stream."""
+
+    def __init__(self, directory, fmt, schema, run_id):
+        self.directory = directory
+        self.fmt = fmt
+        self.schema = schema
+        self.run_id = run_id
+        self.writers = {}
+
+    def write(self, batch):
+        if self.fmt == "arrow":
+            self._writer(None).write_batch(batch)
+            return
+        months = pc.strftime(batch["created_at"], format="%Y-%m")
+        for month in months.unique().to_pylist():
+            part = batch.filter(pc.equal(months, month))
+            self._writer(month).write_table(pa.Table.from_batches([part]))
+
+    def close(self):
+        """Close every writer and move finished files into place."""
+        for path, writer in self.writers.values():
+            writer.close()
+            os.replace(f"{path}.tmp", path)
+        return [path for path, _ in self.writers.values()]
+
+    def abort(self):
+        for path, writer in self.writers.values():
+            writer.close()
+            os.remove(f"{path}.tmp")
+
+    def _writer(self, month):
+        if month not in self.writers:
+            if self.fmt == "arrow":
+                path = os.path.join(
+                    self.directory, f"part-{self.run_id}.arrows",
+                )
+                writer = pa.ipc.new_stream(f"{path}.tmp", self.schema)
+            else:
+                partition = os.path.join(
+                    self.directory, f"created_month={month}",
+                )
+                os.makedirs(partition, exist_ok=True)
+                path = os.path.join(partition, f"part-{self.run_id}.parquet")
+                writer = pq.ParquetWriter(f"{path}.tmp", self.schema)
+            self.writers[month] = (path, writer)
+        return self.writers[month][1]
+
+
+def export_history(session, directory, fmt="parquet", batch_size=BATCH_SIZE):
+    """Append requests committed after the stored cursor to directory.
+
+    Rows are read through a server-side cursor and written batch by batch,
+    so memory is bounded by batch_size. Returns (exported rows, written
+    files).
+    """
+    _require_pyarrow()
+    os.makedirs(directory, exist_ok=True)
+    cursor = read_state(directory)
+    schema = arrow_schema()
+    writers = _PartitionWriters(directory, fmt, schema, cursor[0] + 1)
+
+    exported = 0
+    try:
+        result = session.execute(
+            build_export_query(cursor).execution_options(
+                yield_per=batch_size,
+            ),
+        )
+        for rows in result.partitions():
+            batch = to_record_batch(rows, schema)
+            writers.write(batch)
+            exported += batch.num_rows
+            cursor = tuple(rows[-1][:3])
+    except BaseException:
+        writers.abort()
+        raise
+    files = writers.close()
+    _write_state(directory, cursor)
+    return exported, files
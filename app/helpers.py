@@ -1,3 +1,6 @@
+from datetime import timezone
+
+
 def validate_fields(values):
     """Root validation for cross validation."""
     inn = values.get("inn")
@@ -123,3 +126,21 @@ def validate_params(params, values):
                 raise ValueError("account is required for ACC workflow")
 
     return params
+
+
+def validate_naive_datetime(value):
+    """Convert aware datetimes to naive UTC, as stored in the database."""
+    if value is not None and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def validate_period_to(period_to, values):
+    """Validate period_to field."""
+    period_from = values.get("period_from")
+    if period_to is not None and period_from is not None:
+        if period_to < period_from:
+            raise ValueError(
+                "period_to must be greater than or equal to period_from",
+            )
+    return period_to
@@ -0,0 +1,248 @@
+"""Background report jobs written to compressed files on local disk."""
+import gzip
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from sqlalchemy import create_engine
+
+import app.reports as reports
+import app.schemas as s
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+JOB_ID_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+CHUNK_SIZE = 64 * 1024
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+def job_id(filters, fmt, watermark):
+    """Identify a report by its parameters and the data it covers.
+
+    The watermark is the newest request id in the reported period, so the
+    id, and the cached result with it, changes once new rows land there.
+    """
+    key = json.dumps(
+        [filters.dict(), fmt, watermark], default=str, sort_keys=True,
+    )
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:32]
+
+
+def _write_status(path, **status):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as file:
+        json.dump(status, file)
+    os.replace(tmp_path, path)
+
+
+def generate_report(database_url, status_path, result_path, filters, fmt):
+    """Write a gzip-compressed report; runs in a worker process."""
+    filters = s.ReportRequest.parse_obj(filters)
+    render = reports.format_csv if fmt == "csv" else reports.format_ndjson
+    engine = create_engine(database_url)
+    tmp_path = f"{result_path}.tmp"
+    rows = 0
+    try:
+        _write_status(status_path, status=RUNNING, rows=rows)
+        with engine.connect() as connection, gzip.open(tmp_path, "wt") as out:
+            if fmt == "csv":
+                out.write(reports.format_csv((), header=True))
+            result = connection.execution_options(
+                yield_per=reports.BATCH_SIZE,
+            ).execute(reports.build_report_query(filters))
+            for batch in result.partitions():
+                out.write(render(batch))
+                rows += len(batch)
+                _write_status(status_path, status=RUNNING, rows=rows)
+        os.replace(tmp_path, result_path)
+        _write_status(
+            status_path,
+            status=DONE,
+            rows=rows,
+            size=os.path.getsize(result_path),
+        )
+    except Exception as exc:
+        _write_status(status_path, status=FAILED, rows=rows, error=str(exc))
+        raise
+    finally:
+        engine.dispose()
+
+
+class ReportJobs:
+    """Queue of report jobs run in a process pool.
+
+    Job state lives next to the result in a small JSON status file, so
+    finished reports survive restarts and are shared between app workers.
+    A lock file claims a job for one app worker until it finishes; a claim
+    that has not moved for stale_after seconds, left behind by a crash or
+    a restart, is taken over.
+    """
+
+    def __init__(self, directory, workers, stale_after):
+        self.directory = directory
+        self.workers = workers
+        self.stale_after = stale_after
+        self._pool = None
+        self._futures = {}
+
+    def _path(self, job, suffix):
+        return os.path.join(self.directory, f"{job}.{suffix}")
+
+    def result_path(self, job):
+        """Path of the compressed result of a finished job."""
+        status = self.status(job)
+        if status is None or status["status"] != DONE:
+            return None
+        return self._path(job, f"{status['format']}.gz")
+
+    def status(self, job):
+        """Job status, or None for an unknown job id."""
+        if not JOB_ID_PATTERN.match(job):
+            return None
+        try:
+            with open(self._path(job, "json"), encoding="utf-8") as file:
+                status = json.load(file)
+        except FileNotFoundError:
+            return None
+        with open(self._path(job, "params.json"), encoding="utf-8") as file:
+            params = json.load(file)
+        return {"job_id": job, **params, **status}
+
+    def submit(self, database_url, filters, fmt, watermark):
+        """Enqueue a report unless an identical one is done or claimed."""
+        job = job_id(filters, fmt, watermark)
+        status = self.status(job)
+        if status is not None and status["status"] == DONE:
+            return job
+        os.makedirs(self.directory, exist_ok=True)
+        if not self._claim(job):
+            return job
+
+        with open(
+            self._path(job, "params.json"), "w", encoding="utf-8",
+        ) as file:
+            json.dump(
+                {"format": fmt, "filters": json.loads(filters.json())}, file,
+            )
+        _write_status(self._path(job, "json"), status=QUEUED, rows=0)
+        future = self._get_pool().submit(
+            generate_report,
+            database_url,
+            self._path(job, "json"),
+            self._path(job, f"{fmt}.gz"),
+            json.loads(filters.json()),
+            fmt,
+        )
+        self._futures[job] = future
+        future.add_done_callback(lambda done: self._finished(job, done))
+        return job
+
+    def shutdown(self):
+        """Stop the worker processes."""
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def _get_pool(self):
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._pool
+
+    def _claim(self, job):
+        """Atomically claim a job, taking over a stale claim once."""
+        lock_path = self._path(job, "lock")
+        for _ in range(2):
+            try:
+                os.close(os.open(lock_path, os.O_CREAT | os.O_EXCL))
+                return True
+            except FileExistsError:
+                pass
+            if not self._is_stale(job):
+                return False
+            logger.warning("Taking over stale report job %s", job)
+            try:
+                os.remove(lock_path)
+            except FileNotFoundError:
+                pass
+        return False
+
+    def _is_stale(self, job):
+        # The worker rewrites the status file after every batch.
+        try:
+            touched = max(
+                os.path.getmtime(self._path(job, "lock")),
+                os.path.getmtime(self._path(job, "json")),
+            )
+        except FileNotFoundError:
+            return False
+        return time.time() - touched > self.stale_after
+
+    def _finished(self, job, future):
+        self._futures.pop(job, None)
+        try:
+            os.remove(self._path(job, "lock"))
+        except FileNotFoundError:
+            pass
+        if not future.cancelled() and future.exception() is not None:
+            logger.error(
+                "Report job %s failed", job, exc_info=future.exception(),
+            )
+
+
+def iter_file_range(path, start, end):
+    """Yield the bytes of path in [start, end] in chunks."""
+    with open(path, "rb") as file:
+        file.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = file.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def parse_range(header, size):
+    """Parse a single bytes Range header into inclusive (start, end).
+
+    Returns None when the header is absent and raises ValueError when it is
+    malformed or unsatisfiable.
+    """
+    if not header:
+        return None
+    unit, _, spec = header.partition("=")
+    if unit.strip() != "bytes" or "," in spec:
+        raise ValueError("Only a single bytes range is supported")
+    first, _, last = spec.strip().partition("-")
+    if first:
+        start = int(first)
+        end = int(last) if last else size - 1
+    elif last:
+        start = max(size - int(last), 0)
+        end = size - 1
+    else:
+        raise ValueError("Empty range")
+    end = min(end, size - 1)
+    if start > end:
+        raise ValueError("Unsatisfiable range")
+    return start, end
+
+
+report_jobs = ReportJobs(
+    settings.report_jobs_dir,
+    settings.report_jobs_workers,
+    settings.report_jobs_stale_after,
+)
@@ -2,24 +2,76 @@
 import json
 from datetime import datetime
 
-from sqlalchemy import (TIMESTAMP, BigInteger, Boolean, Column, ForeignKey,
-                        SmallInteger, String, Text)
-from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy import (TIMESTAMP, BigInteger, Boolean, Column, Computed,
+                        Date, ForeignKey, ForeignKeyConstraint, Identity,
+                        Index, Numeric, SmallInteger, String, Text,
+                        UniqueConstraint, text)
+from sqlalchemy.dialects.postgresql import JSONB, TSRANGE
 from sqlalchemy.orm import relationship
 
 from app.db import Base
 
 
+class Counterparty(Base):
+    """Deduplicated identifier triple, missing identifiers stored as ''."""
+
+    __tablename__ = "counterparty"
+    __table_args__ = (
+        UniqueConstraint(
+            "inn", "ogrn", "sap_num", name="uq_counterparty_identifiers",
+        ),
+        Index("ix_counterparty_ogrn", "ogrn"),
+        Index("ix_counterparty_sap_num", "sap_num"),
+    )
+
+    id = Column(
+        BigInteger,
+        Identity(),
+        primary_key=True,
+        nullable=False,
+    )
+    inn = Column(
+        String(60),
+        server_default="",
+        nullable=False,
+    )
+    ogrn = Column(
+        String(60),
+        server_default="",
+        nullable=False,
+    )
+    sap_num = Column(
+        String(20),
+        server_default="",
+        nullable=False,
+    )
+
+
 class Request(Base):
-    """Request model."""
+    """Request model, partitioned by month of end_at."""
 
     __tablename__ = "request"
+    __table_args__ = (
+        Index(
+            "ix_request_counterparty_validity",
+            "counterparty_id", "start_at", "end_at",
+        ),
+        # Needs btree_gist; without it the migrations skip this index and
+        # the btree one above serves the range.
+        Index(
+            "ix_request_counterparty_validity_gist",
+            "counterparty_id", "validity",
+            postgresql_using="gist",
+        ),
+        Index("ix_request_created_at", "created_at"),
+        Index("ix_request_change_seq", "change_seq", "id"),
+        {"postgresql_partition_by": "RANGE (end_at)"},
+    )
 
     id = Column(
         BigInteger,
         primary_key=True,
-        index=True,
-        unique=True,
+        autoincrement=True,
         nullable=False,
     )
     is_resident = Column(
@@ -44,6 +96,12 @@ class Request(Base):
         nullable=True,
         default=None,
     )
+    # Filled by a trigger when the writer did not resolve it.
+    counterparty_id = Column(
+        BigInteger,
+        ForeignKey("counterparty.id"),
+        nullable=False,
+    )
     mdm_id = Column(
         String(20),
         nullable=True,
@@ -78,18 +136,77 @@ class Request(Base):
         default=datetime(1990, 1, 1, 0, 0, 0),
         nullable=False,
     )
+    # The partition key is part of every unique constraint.
     end_at = Column(
         TIMESTAMP,
         default=datetime(9999, 12, 31, 23, 59, 59),
+        primary_key=True,
+        nullable=False,
+    )
+    validity = Column(
+        TSRANGE,
+        Computed("tsrange(start_at, end_at, '[]')", persisted=True),
         nullable=False,
     )
     description = Column(
         Text,
         nullable=True,
     )
+    change_seq = Column(
+        BigInteger,
+        server_default=text("0"),
+        nullable=False,
+    )
 
     details = relationship("RequestDetail", back_populates="request")
     system = relationship("DictSystem")
+    counterparty = relationship("Counterparty")
+
+
+class CounterpartyBlockState(Base):
+    """Currently effective FULL request per counterparty identifier model."""
+
+    __tablename__ = "counterparty_block_state"
+
+    id_type = Column(
+        String(7),
+        primary_key=True,
+        nullable=False,
+    )
+    id_value = Column(
+        String(60),
+        primary_key=True,
+        nullable=False,
+    )
+    # No foreign key, so that expired request partitions can be detached.
+    request_id = Column(
+        BigInteger,
+        nullable=False,
+    )
+    blocking = Column(
+        Boolean,
+        nullable=False,
+    )
+    created_at = Column(
+        TIMESTAMP,
+        nullable=False,
+    )
+    start_at = Column(
+        TIMESTAMP,
+        nullable=False,
+    )
+    end_at = Column(
+        TIMESTAMP,
+        nullable=False,
+    )
+
+    request = relationship(
+        "Request",
+        primaryjoin="and_(foreign(CounterpartyBlockState.request_id) "
+        "== Request.id, foreign(CounterpartyBlockState.end_at) "
+        "== Request.end_at)",
+        viewonly=True,
+    )
 
 
 class DictAction(Base):
@@ -212,6 +329,38 @@ class DictTypeValidAction(Base):
     action = relationship("DictAction")
 
 
+class ChangeFeed(Base):
+    """Sequence number of the last change published to the feed."""
+
+    __tablename__ = "change_feed"
+
+    id = Column(
+        SmallInteger,
+        primary_key=True,
+        nullable=False,
+    )
+    seq = Column(
+        BigInteger,
+        nullable=False,
+    )
+
+
+class DictVersion(Base):
+    """Counter bumped by triggers on every change to a dictionary table."""
+
+    __tablename__ = "dict_version"
+
+    id = Column(
+        SmallInteger,
+        primary_key=True,
+        nullable=False,
+    )
+    version = Column(
+        BigInteger,
+        nullable=False,
+    )
+
+
 class DictWorkflow(Base):
     """Dictionary of workflows model."""
 
@@ -231,20 +380,53 @@ class DictWorkflow(Base):
 
 
 class RequestDetail(Base):
-    """Request detail model."""
+    """Request detail model, partitioned along with its request."""
 
     __tablename__ = "request_detail"
+    __table_args__ = (
+        ForeignKeyConstraint(
+            ["request_id", "request_end_at"],
+            ["request.id", "request.end_at"],
+            name="request_detail_request_id_fkey",
+        ),
+        Index(
+            "ix_request_detail_request_id_full_doc",
+            "request_id",
+            postgresql_where=text("workflow_code IN ('FULL', 'DOC')"),
+        ),
+        *(
+            Index(
+                f"ix_request_detail_{column}",
+                column,
+                postgresql_where=text(f"workflow_code = '{workflow_code}'"),
+            )
+            for column, workflow_code in (
+                ("name_object", "DOC"),
+                ("contract", "DOC"),
+                ("doc_num", "DOC"),
+                ("max_sum", "SUM"),
+                ("balance_unit", "UNIT"),
+                ("account", "ACC"),
+            )
+        ),
+        {"postgresql_partition_by": "RANGE (request_end_at)"},
+    )
 
     id = Column(
         BigInteger,
         primary_key=True,
-        index=True,
-        unique=True,
+        autoincrement=True,
         nullable=False,
     )
     request_id = Column(
         BigInteger,
-        ForeignKey("request.id"),
+        nullable=False,
+    )
+    # end_at of the request, which is also the partition key here.
+    request_end_at = Column(
+        TIMESTAMP,
+        default=datetime(9999, 12, 31, 23, 59, 59),
+        primary_key=True,
         nullable=False,
     )
     workflow_code = Column(
@@ -256,6 +438,237 @@ class RequestDetail(Base):
         JSONB,
         nullable=True,
     )
+    name_object = Column(
+        Text,
+        Computed("params ->> 'name_object'", persisted=True),
+    )
+    contract = Column(
+        Text,
+        Computed("params ->> 'contract'", persisted=True),
+    )
+    doc_num = Column(
+        Text,
+        Computed("params ->> 'doc_num'", persisted=True),
+    )
+    max_sum = Column(
+        Numeric,
+        Computed("(params ->> 'max_sum')::numeric", persisted=True),
+    )
+    balance_unit = Column(
+        Text,
+        Computed("params ->> 'balance_unit'", persisted=True),
+    )
+    account = Column(
+        Text,
+        Computed("params ->> 'account'", persisted=True),
+    )
 
     request = relationship("Request", back_populates="details")
     workflow = relationship("DictWorkflow")
+
+
+class RequestArchive(Base):
+    """Archived request model, expired request partitions attached here."""
+
+    __tablename__ = "request_archive"
+    __table_args__ = (
+        Index(
+            "ix_request_archive_counterparty_validity",
+            "counterparty_id", "start_at", "end_at",
+        ),
+        Index("ix_request_archive_change_seq", "change_seq", "id"),
+        {"postgresql_partition_by": "RANGE (end_at)"},
+    )
+
+    id = Column(
+        BigInteger,
+        primary_key=True,
+        nullable=False,
+    )
+    is_resident = Column(
+        Boolean,
+        nullable=False,
+    )
+    inn = Column(
+        String(60),
+        nullable=True,
+    )
+    ogrn = Column(
+        String(60),
+        nullable=True,
+    )
+    in_sap = Column(
+        Boolean,
+        nullable=False,
+    )
+    sap_num = Column(
+        String(20),
+        nullable=True,
+    )
+    counterparty_id = Column(
+        BigInteger,
+        nullable=False,
+    )
+    mdm_id = Column(
+        String(20),
+        nullable=True,
+    )
+    blocking = Column(
+        Boolean,
+        nullable=False,
+    )
+    from_system = Column(
+        SmallInteger,
+        nullable=False,
+    )
+    created_at = Column(
+        TIMESTAMP,
+        nullable=False,
+    )
+    created_by = Column(
+        String(30),
+        nullable=False,
+    )
+    approved_at = Column(
+        TIMESTAMP,
+        nullable=True,
+    )
+    approved_by = Column(
+        String(30),
+        nullable=True,
+    )
+    start_at = Column(
+        TIMESTAMP,
+        nullable=False,
+    )
+    end_at = Column(
+        TIMESTAMP,
+        primary_key=True,
+        nullable=False,
+    )
+    validity = Column(
+        TSRANGE,
+        Computed("tsrange(start_at, end_at, '[]')", persisted=True),
+        nullable=False,
+    )
+    description = Column(
+        Text,
+        nullable=True,
+    )
+    change_seq = Column(
+        BigInteger,
+        server_default=text("0"),
+        nullable=False,
+    )
+
+
+class RequestDetailArchive(Base):
+    """Archived request detail model, partitioned along with its request."""
+
+    __tablename__ = "request_detail_archive"
+    __table_args__ = (
+        Index(
+            "ix_request_detail_archive_request_id_full_doc",
+            "request_id",
+            postgresql_where=text("workflow_code IN ('FULL', 'DOC')"),
+        ),
+        {"postgresql_partition_by": "RANGE (request_end_at)"},
+    )
+
+    id = Column(
+        BigInteger,
+        primary_key=True,
+        nullable=False,
+    )
+    request_id = Column(
+        BigInteger,
+        nullable=False,
+    )
+    request_end_at = Column(
+        TIMESTAMP,
+        primary_key=True,
+        nullable=False,
+    )
+    workflow_code = Column(
+        String,
+        nullable=False,
+    )
+    params = Column(
+        JSONB,
+        nullable=True,
+    )
+    name_object = Column(
+        Text,
+        Computed("params ->> 'name_object'", persisted=True),
+    )
+    contract = Column(
+        Text,
+        Computed("params ->> 'contract'", persisted=True),
+    )
+    doc_num = Column(
+        Text,
+        Computed("params ->> 'doc_num'", persisted=True),
+    )
+    max_sum = Column(
+        Numeric,
+        Computed("(params ->> 'max_sum')::numeric", persisted=True),
+    )
+    balance_unit = Column(
+        Text,
+        Computed("params ->> 'balance_unit'", persisted=True),
+    )
+    account = Column(
+        Text,
+        Computed("params ->> 'account'", persisted=True),
+    )
+
+
+class RequestArchiveState(Base):
+    """Moment before which /check also has to read the archive."""
+
+    __tablename__ = "request_archive_state"
+
+    id = Column(
+        SmallInteger,
+        primary_key=True,
+        nullable=False,
+    )
+    archived_before = Column(
+        TIMESTAMP,
+        nullable=True,
+    )
+
+
+class RequestRollupDaily(Base):
+    """Request detail counts per day, system, workflow and residency."""
+
+    __tablename__ = "request_rollup_daily"
+
+    day = Column(
+        Date,
+        primary_key=True,
+        nullable=False,
+    )
+    from_system = Column(
+        SmallInteger,
+        primary_key=True,
+        nullable=False,
+    )
+    workflow_code = Column(
+        String,
+        primary_key=True,
+        nullable=False,
+    )
+    is_resident = Column(
+        Boolean,
+        primary_key=True,
+        nullable=False,
+    )
+    blocks = Column(
+        BigInteger,
+        nullable=False,
+    )
+    unblocks = Column(
+        BigInteger,
+        nullable=False,
+    )
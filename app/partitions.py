@@ -0,0 +1,257 @@
+"""Monthly partitions of request and request_detail by end_at.
+
+request_detail is partitioned by request_end_at, a copy of the end_at of its
+request, with the same bounds, so a month of both tables is created and
+archived together. Next to the monthly partitions each table has a
+_p_history partition for requests expired before partitioning, _p_open for
+requests that never expire and a _p_default catch-all.
+"""
+import asyncio
+import logging
+import re
+from datetime import date, datetime
+
+from sqlalchemy import text
+
+import app.queries as q
+
+logger = logging.getLogger(__name__)
+
+# Parent tables first: request_detail references request.
+TABLES = (
+    ("request", "end_at", "request_archive"),
+    ("request_detail", "request_end_at", "request_detail_archive"),
+)
+LOCK_TIMEOUT = "5s"
+
+_RANGE = re.compile(r"FROM \((.+)\) TO \((.+)\)")
+
+
+def add_months(month, months):
+    """First day of the month a number of months after the given one."""
+    index = month.month - 1 + months
+    return month.replace(year=month.year + index // 12, month=index % 12 + 1)
+
+
+def _bound(value):
+    if value in ("MINVALUE", "MAXVALUE"):
+        return None
+    return datetime.fromisoformat(value.strip("'"))
+
+
+def partitions(session, table):
+    """(name, bound, lower, upper) of the range partitions of a table.
+
+    Unbounded ends are None; the default partition is left out.
+    """
+    result = []
+    for name, bound in session.execute(q.PARTITIONS_QUERY, {"table": table}):
+        match = _RANGE.search(bound)
+        if match is not None:
+            result.append(
+                (name, bound, _bound(match[1]), _bound(match[2])),
+            )
+    return result
+
+
+def _names(session, table):
+    return {name for name, _, _, _ in partitions(session, table)}
+
+
+def _overlaps(partition, lower, upper):
+    _, _, partition_lower, partition_upper = partition
+    return (partition_lower is None or partition_lower < upper) and (
+        partition_upper is None or lower < partition_upper
+    )
+
+
+def lock(session):
+    """Serialize maintenance and fail fast instead of queueing DDL."""
+    if not session.scalar(q.PARTITION_LOCK_QUERY):
+        return False
+    session.execute(q.LOCK_TIMEOUT_QUERY, {"timeout": LOCK_TIMEOUT})
+    return True
+
+
+def table_columns(session, table):
+    """Comma separated columns of a table, but for generated ones."""
+    return ", ".join(session.scalars(q.TABLE_COLUMNS_QUERY, {"table": table}))
+
+
+def _create_month(session, lower, upper):
+    """Create and attach the partitions of one month of both tables.
+
+    Rows of that month already routed to the default partitions are moved
+    first in a single statement, since attaching is refused while the
+    default one holds any.
+    The partitions are built detached and attached afterwards, which only
+    takes a SHARE UPDATE EXCLUSIVE lock on the parent tables.
+    """
+    suffix = f"p{lower:%Y%m}"
+    moves = []
+    for table, key, _ in reversed(TABLES):
+        columns = table_columns(session, table)
+        session.execute(
+            text(
+                f"CREATE TABLE {table}_{suffix} "
+                f"(LIKE {table} INCLUDING GENERATED)",
+            ),
+        )
+        moves.append(
+            f"{table}_moved AS ("
+            f"DELETE FROM {table}_p_default "
+            f"WHERE {key} >= :lower AND {key} < :upper "
+            f"RETURNING {columns}), "
+            f"{table}_inserted AS ("
+            f"INSERT INTO {table}_{suffix} ({columns}) "
+            f"SELECT {columns} FROM {table}_moved)",
+        )
+    # One statement, so that no row committed in between is left behind.
+    session.execute(
+        text(f"WITH {', '.join(moves)} SELECT 1"),
+        {"lower": lower, "upper": upper},
+    )
+    for table, _, _ in TABLES:
+        session.execute(
+            text(
+                f"ALTER TABLE {table} ATTACH PARTITION {table}_{suffix} "
+                f"FOR VALUES FROM ('{lower}') TO ('{upper}')",
+            ),
+        )
+
+
+def ensure_partitions(session, months_ahead, today=None):
+    """Create the monthly partitions up to months_ahead from today.
+
+    Returns the names of the created request partitions, none if another
+    session is already creating them. The caller commits.
+    """
+    if not lock(session):
+        return []
+    today = today or date.today()
+    first = datetime(today.year, today.month, 1)
+    existing = partitions(session, "request")
+    created = []
+    for months in range(months_ahead + 1):
+        lower = add_months(first, months)
+        upper = add_months(lower, 1)
+        if any(_overlaps(partition, lower, upper) for partition in existing):
+            continue
+        _create_month(session, lower, upper)
+        created.append(f"request_p{lower:%Y%m}")
+    return created
+
+
+def ensure_archive_partitions(session, names):
+    """Create the archive partitions matching the given request partitions.
+
+    Requests archived one at a time go to the archive partition with the
+    bounds of the one they left, which archive_partitions later completes.
+    The caller holds the lock and commits.
+    """
+    existing = _names(session, "request_archive")
+    bounds = {
+        name: bound for name, bound, _, _ in partitions(session, "request")
+    }
+    for name in names:
+        suffix = name[len("request_"):]
+        if f"request_archive_{suffix}" in existing:
+            continue
+        for _, _, archive in TABLES:
+            session.execute(
+                text(
+                    f"CREATE TABLE {archive}_{suffix} "
+                    f"(LIKE {archive} INCLUDING GENERATED)",
+                ),
+            )
+            session.execute(
+                text(
+                    f"ALTER TABLE {archive} "
+                    f"ATTACH PARTITION {archive}_{suffix} {bounds[name]}",
+                ),
+            )
+
+
+def archive_partitions(session, before):
+    """Archive the partitions of requests that all expired before a date.
+
+    The partitions are detached from request and request_detail and
+    attached to request_archive and request_detail_archive as they are,
+    without copying rows, unless requests of theirs were already archived
+    one at a time: the rest is then copied next to them. Detaching takes an
+    ACCESS EXCLUSIVE lock on the parent tables, held at most LOCK_TIMEOUT
+    while waiting. Returns the names of the archived request partitions;
+    the caller commits.
+    """
+    if not lock(session):
+        raise RuntimeError("Partition maintenance is already running")
+    existing = _names(session, "request_archive")
+    archived = []
+    uppers = []
+    for name, bound, _, upper in partitions(session, "request"):
+        if upper is None or upper > before:
+            continue
+        suffix = name[len("request_"):]
+        for table, _, _ in reversed(TABLES):
+            session.execute(
+                text(
+                    f"ALTER TABLE {table} DETACH PARTITION {table}_{suffix}",
+                ),
+            )
+        # The archive has no foreign key from details to requests.
+        session.execute(
+            text(
+                f"ALTER TABLE request_detail_{suffix} "
+                "DROP CONSTRAINT request_detail_request_id_fkey",
+            ),
+        )
+        for table, _, archive in TABLES:
+            if f"request_archive_{suffix}" in existing:
+                columns = table_columns(session, table)
+                session.execute(
+                    text(
+                        f"INSERT INTO {archive}_{suffix} ({columns}) "
+                        f"SELECT {columns} FROM {table}_{suffix}",
+                    ),
+                )
+                session.execute(text(f"DROP TABLE {table}_{suffix}"))
+                continue
+            session.execute(
+                text(
+                    f"ALTER TABLE {table}_{suffix} "
+                    f"RENAME TO {archive}_{suffix}",
+                ),
+            )
+            session.execute(
+                text(
+                    f"ALTER TABLE {archive} "
+                    f"ATTACH PARTITION {archive}_{suffix} {bound}",
+                ),
+            )
+        archived.append(name)
+        uppers.append(upper)
+    if uppers:
+        session.execute(
+            q.ADVANCE_ARCHIVED_BEFORE_QUERY, {"before": max(uppers)},
+        )
+    return archived
+
+
+async def maintain(session_factory, months_ahead):
+    """Create upcoming partitions, logging instead of raising on failure."""
+    try:
+        async with session_factory() as session:
+            created = await session.run_sync(ensure_partitions, months_ahead)
+            await session.commit()
+    except Exception:
+        logger.exception("Partition maintenance failed")
+        return
+    if created:
+        logger.info("Created partitions %s", ", ".join(created))
+
+
+async def watch(session_factory, months_ahead, interval):
+    """Create upcoming partitions forever, every interval seconds."""
+    while True:
+        await asyncio.sleep(interval)
+        await maintain(session_factory, months_ahead)
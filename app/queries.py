@@ -0,0 +1,581 @@
+"""Raw SQL queries used by the views."""
+from sqlalchemy import text
+from sqlalchemy.dialects.postgresql import JSONB
+
+# Requests joined to their details, hot and archived. Archived rows are only
+# read for DOC exemptions, which hold at any date, and when {since}, the
+# earliest moment looked up, is before archived_before: requests archived as
+# expired all ended before it, and those archived as superseded never decide
+# a check.
+REQUEST_DETAILS = """
+    SELECT
+        r.id, r.is_resident, r.inn, r.ogrn, r.sap_num, r.counterparty_id,
+        r.blocking, r.from_system, r.created_at, r.start_at, r.end_at,
+        r.validity, rd.id AS detail_id, rd.workflow_code, rd.params,
+        rd.name_object
+    FROM "request" r
+    INNER JOIN "request_detail" rd
+        ON r.id = rd.request_id AND r.end_at = rd.request_end_at
+    UNION ALL
+    SELECT
+        r.id, r.is_resident, r.inn, r.ogrn, r.sap_num, r.counterparty_id,
+        r.blocking, r.from_system, r.created_at, r.start_at, r.end_at,
+        r.validity, rd.id AS detail_id, rd.workflow_code, rd.params,
+        rd.name_object
+    FROM "request_archive" r
+    INNER JOIN "request_detail_archive" rd
+        ON r.id = rd.request_id AND r.end_at = rd.request_end_at
+    WHERE rd.workflow_code = 'DOC'
+    OR {since} < (SELECT archived_before FROM "request_archive_state")
+"""
+
+# Ids of every counterparty sharing any of the given identifiers, resolved
+# in the same round trip as the check that reads them.
+RESOLVED = """
+    resolved AS (
+        SELECT cp.id FROM "counterparty" cp
+        WHERE (cp.inn = :inn AND :inn != '')
+        OR (cp.ogrn = :ogrn AND :ogrn != '')
+        OR (cp.sap_num = :sap_num AND :sap_num != '')
+    )
+"""
+
+# The start_at and end_at bounds repeat the validity condition, so that
+# expired partitions are pruned and, without btree_gist, the btree
+# (counterparty_id, start_at, end_at) index bounds the range. history is
+# materialized so that the latest row is not searched for by walking the
+# created_at indexes of all partitions backwards, which empty partitions,
+# estimated at one row each, make look cheap. The archive is skipped as a
+# whole for check_for_dt after archived_before.
+CHECK = """
+    WITH {resolved}, state AS (
+        SELECT s.blocking, s.start_at, s.end_at
+        FROM "counterparty_block_state" s
+        WHERE (s.id_type = 'inn' AND s.id_value = :inn)
+        OR (s.id_type = 'ogrn' AND s.id_value = :ogrn)
+        OR (s.id_type = 'sap_num' AND s.id_value = :sap_num)
+        ORDER BY s.created_at DESC, s.request_id DESC
+        LIMIT 1
+    ), history AS MATERIALIZED (
+        SELECT r.blocking, r.created_at FROM "request" r
+        INNER JOIN "request_detail" rd
+            ON r.id = rd.request_id AND r.end_at = rd.request_end_at
+        WHERE r.counterparty_id = ANY(ARRAY(SELECT id FROM resolved))
+        AND rd.workflow_code = 'FULL'
+        AND r.validity @> CAST(:check_for_dt AS timestamp)
+        AND r.start_at <= CAST(:check_for_dt AS timestamp)
+        AND r.end_at >= CAST(:check_for_dt AS timestamp)
+        AND rd.request_end_at >= CAST(:check_for_dt AS timestamp)
+        UNION ALL
+        SELECT r.blocking, r.created_at FROM "request_archive" r
+        INNER JOIN "request_detail_archive" rd
+            ON r.id = rd.request_id AND r.end_at = rd.request_end_at
+        WHERE CAST(:check_for_dt AS timestamp) < (
+            SELECT archived_before FROM "request_archive_state"
+        )
+        AND r.counterparty_id = ANY(ARRAY(SELECT id FROM resolved))
+        AND rd.workflow_code = 'FULL'
+        AND r.validity @> CAST(:check_for_dt AS timestamp)
+        AND r.start_at <= CAST(:check_for_dt AS timestamp)
+        AND r.end_at >= CAST(:check_for_dt AS timestamp)
+        AND rd.request_end_at >= CAST(:check_for_dt AS timestamp)
+    ), latest AS (
+        SELECT state.blocking FROM state
+        WHERE :check_for_dt BETWEEN state.start_at AND state.end_at
+        UNION ALL
+        (
+            SELECT history.blocking FROM history
+            WHERE EXISTS (
+                SELECT 1 FROM state
+                WHERE NOT :check_for_dt BETWEEN state.start_at AND state.end_at
+            )
+            ORDER BY history.created_at DESC
+            LIMIT 1
+        )
+        LIMIT 1
+    )
+    SELECT
+        latest.blocking,
+        CASE WHEN latest.blocking THEN EXISTS (
+            SELECT 1 FROM ({request_details}) rd
+            WHERE rd.counterparty_id = ANY(ARRAY(SELECT id FROM resolved))
+            AND rd.workflow_code = 'DOC'
+            AND rd.name_object = :contract
+        ) ELSE false END AS doc_exempt
+    FROM latest
+""".format(
+    resolved=RESOLVED,
+    request_details=REQUEST_DETAILS.format(
+        since="CAST(:check_for_dt AS timestamp)",
+    ),
+)
+
+CHECK_QUERY = text(CHECK)
+
+# archived_before bounds the result too, since archived requests are only
+# read on one side of it.
+CHECK_BOUNDS = """
+    WITH {resolved}
+    SELECT
+        max(b.at) FILTER (WHERE b.at <= :check_for_dt) AS valid_from,
+        min(b.at) FILTER (WHERE b.at > :check_for_dt) AS valid_until
+    FROM (
+        SELECT b.at FROM ({request_details}) r
+        CROSS JOIN LATERAL (
+            VALUES (r.start_at), (r.end_at + interval '1 microsecond')
+        ) AS b(at)
+        WHERE r.counterparty_id = ANY(ARRAY(SELECT id FROM resolved))
+        AND r.workflow_code = 'FULL'
+        UNION ALL
+        SELECT archived_before FROM "request_archive_state"
+    ) b
+""".format(
+    resolved=RESOLVED,
+    request_details=REQUEST_DETAILS.format(
+        since="CAST(:check_for_dt AS timestamp)",
+    ),
+)
+
+# The check and its cache bounds in one round trip. The bounds row always
+# exists, so the check columns are NULL when no request applies.
+CHECK_WITH_BOUNDS_QUERY = text(
+    """
+    SELECT c.blocking, c.doc_exempt, b.valid_from, b.valid_until
+    FROM ({bounds}) b
+    LEFT JOIN ({check}) c ON true
+    """.format(bounds=CHECK_BOUNDS, check=CHECK),
+)
+
+# As in CHECK_QUERY, end_at bounds prune expired partitions, and OFFSET 0
+# keeps the planner from walking the created_at indexes for the latest row.
+CHECK_BATCH_QUERY = text(
+    """
+    WITH checks AS (
+        SELECT * FROM unnest(
+            CAST(:inns AS text[]),
+            CAST(:ogrns AS text[]),
+            CAST(:sap_nums AS text[]),
+            CAST(:contracts AS text[]),
+            CAST(:check_for_dts AS timestamp[])
+        ) WITH ORDINALITY AS c(inn, ogrn, sap_num, contract, check_for_dt, idx)
+    ), resolved AS (
+        SELECT c.*, k.counterparty_ids FROM checks c
+        CROSS JOIN LATERAL (
+            SELECT array_agg(cp.id) AS counterparty_ids
+            FROM "counterparty" cp
+            WHERE (cp.inn = c.inn AND c.inn != '')
+            OR (cp.ogrn = c.ogrn AND c.ogrn != '')
+            OR (cp.sap_num = c.sap_num AND c.sap_num != '')
+        ) k
+    )
+    SELECT
+        c.idx,
+        latest.blocking,
+        CASE WHEN latest.blocking THEN EXISTS (
+            SELECT 1 FROM ({request_details}) rd
+            WHERE rd.counterparty_id = ANY(c.counterparty_ids)
+            AND rd.workflow_code = 'DOC'
+            AND rd.name_object = c.contract
+        ) ELSE false END AS doc_exempt
+    FROM resolved c
+    LEFT JOIN LATERAL (
+        SELECT h.blocking FROM (
+            SELECT r.blocking, r.created_at FROM "request" r
+            INNER JOIN "request_detail" rd
+                ON r.id = rd.request_id AND r.end_at = rd.request_end_at
+            WHERE r.counterparty_id = ANY(c.counterparty_ids)
+            AND rd.workflow_code = 'FULL'
+            AND r.validity @> c.check_for_dt
+            AND r.start_at <= c.check_for_dt
+            AND r.end_at >= c.check_for_dt
+            AND rd.request_end_at >= c.check_for_dt
+            UNION ALL
+            SELECT r.blocking, r.created_at FROM "request_archive" r
+            INNER JOIN "request_detail_archive" rd
+                ON r.id = rd.request_id AND r.end_at = rd.request_end_at
+            WHERE c.check_for_dt < (
+                SELECT archived_before FROM "request_archive_state"
+            )
+            AND r.counterparty_id = ANY(c.counterparty_ids)
+            AND rd.workflow_code = 'FULL'
+            AND r.validity @> c.check_for_dt
+            AND r.start_at <= c.check_for_dt
+            AND r.end_at >= c.check_for_dt
+            AND rd.request_end_at >= c.check_for_dt
+            OFFSET 0
+        ) h
+        ORDER BY h.created_at DESC
+        LIMIT 1
+    ) latest ON true
+    ORDER BY c.idx
+    """.format(
+        request_details=REQUEST_DETAILS.format(since="c.check_for_dt"),
+    ),
+)
+
+# Archived requests only add their DOC exemptions: the index answers checks
+# from archived_before on, read after these rows.
+BLOCK_INDEX_QUERY = text(
+    """
+    SELECT
+        r.id, r.inn, r.ogrn, r.sap_num, r.blocking,
+        r.start_at, r.end_at, r.created_at,
+        jsonb_agg(
+            jsonb_build_object(
+                'workflow_code', r.workflow_code, 'params', r.params
+            )
+            ORDER BY r.detail_id
+        ) AS details
+    FROM ({request_details}) r
+    GROUP BY
+        r.id, r.inn, r.ogrn, r.sap_num, r.blocking,
+        r.start_at, r.end_at, r.created_at
+    """.format(
+        request_details=REQUEST_DETAILS.format(
+            since="CAST('infinity' AS timestamp)",
+        ),
+    ),
+).columns(details=JSONB)
+
+CHANGED_REQUEST_QUERY = text(
+    """
+    SELECT
+        r.id, r.inn, r.ogrn, r.sap_num, r.blocking,
+        r.start_at, r.end_at, r.created_at,
+        jsonb_agg(
+            jsonb_build_object(
+                'workflow_code', rd.workflow_code, 'params', rd.params
+            )
+            ORDER BY rd.id
+        ) AS details
+    FROM "request" r
+    INNER JOIN "request_detail" rd
+        ON r.id = rd.request_id AND r.end_at = rd.request_end_at
+    WHERE r.id = :id
+    GROUP BY r.id, r.end_at
+    """,
+).columns(details=JSONB)
+
+CHANGES = """
+    SELECT
+        r.change_seq, r.id, r.is_resident, r.inn, r.ogrn, r.in_sap,
+        r.sap_num, r.mdm_id, r.blocking, r.from_system, r.created_at,
+        r.created_by, r.approved_at, r.approved_by, r.start_at, r.end_at,
+        r.description,
+        COALESCE(
+            (
+                SELECT jsonb_agg(
+                    jsonb_build_object(
+                        'id', rd.id,
+                        'workflow_code', rd.workflow_code,
+                        'params', rd.params
+                    )
+                    ORDER BY rd.id
+                )
+                FROM "{detail}" rd
+                WHERE rd.request_id = r.id AND rd.request_end_at = r.end_at
+            ),
+            '[]'
+        ) AS details
+    FROM "{request}" r
+    WHERE (r.change_seq, r.id) > (:seq, :id)
+    ORDER BY r.change_seq, r.id
+    LIMIT :limit
+"""
+
+# Archived requests keep their change_seq and are read too: superseded ones
+# are archived as soon as a later request covers them.
+CHANGES_QUERY = text(
+    """
+    SELECT * FROM (
+        ({hot})
+        UNION ALL
+        ({archive})
+    ) c
+    ORDER BY c.change_seq, c.id
+    LIMIT :limit
+    """.format(
+        hot=CHANGES.format(request="request", detail="request_detail"),
+        archive=CHANGES.format(
+            request="request_archive", detail="request_detail_archive",
+        ),
+    ),
+).columns(details=JSONB)
+
+# The row lock is held until commit, so sequence numbers are gap-free and
+# follow commit order. Writers take it last, after the counterparty rows,
+# so that both are always locked in the same order.
+NEXT_CHANGE_SEQ_QUERY = text(
+    'UPDATE "change_feed" SET seq = seq + 1 WHERE id = 1 RETURNING seq',
+)
+
+CHANGE_SEQ_QUERY = text('SELECT seq FROM "change_feed" WHERE id = 1')
+
+NOTIFY_QUERY = text("SELECT pg_notify(:channel, :payload)")
+
+PARTITIONS_QUERY = text(
+    """
+    SELECT c.relname, pg_get_expr(c.relpartbound, c.oid)
+    FROM pg_inherits i
+    JOIN pg_class c ON c.oid = i.inhrelid
+    WHERE i.inhparent = CAST(:table AS regclass)
+    ORDER BY c.relname
+    """,
+)
+
+# Generated columns cannot be copied between partitions.
+TABLE_COLUMNS_QUERY = text(
+    """
+    SELECT attname FROM pg_attribute
+    WHERE attrelid = CAST(:table AS regclass)
+    AND attnum > 0 AND NOT attisdropped AND attgenerated = ''
+    ORDER BY attnum
+    """,
+)
+
+PARTITION_LOCK_QUERY = text(
+    "SELECT pg_try_advisory_xact_lock(hashtext('request_partitions'))",
+)
+
+LOCK_TIMEOUT_QUERY = text("SELECT set_config('lock_timeout', :timeout, true)")
+
+ARCHIVED_BEFORE_QUERY = text(
+    'SELECT archived_before FROM "request_archive_state" WHERE id = 1',
+)
+
+# greatest ignores NULL, the value before anything was archived.
+ADVANCE_ARCHIVED_BEFORE_QUERY = text(
+    """
+    UPDATE "request_archive_state"
+    SET archived_before = greatest(archived_before, :before)
+    WHERE id = 1
+    """,
+)
+
+# A request is superseded when every detail of it is repeated by a later
+# request of the same counterparty valid over its whole validity: the later
+# one then decides every check the earlier one could.
+ARCHIVE_SCAN_QUERY = text(
+    """
+    SELECT
+        r.id, r.end_at, r.tableoid::regclass::text AS partition,
+        r.end_at < :before OR NOT EXISTS (
+            SELECT 1 FROM "request_detail" rd
+            WHERE rd.request_id = r.id AND rd.request_end_at = r.end_at
+            AND NOT EXISTS (
+                SELECT 1 FROM "request" n
+                INNER JOIN "request_detail" nd
+                    ON n.id = nd.request_id AND n.end_at = nd.request_end_at
+                WHERE n.counterparty_id = r.counterparty_id
+                AND n.created_at > r.created_at
+                AND n.validity @> r.validity
+                AND n.start_at <= r.start_at
+                AND n.end_at >= r.end_at
+                AND nd.request_end_at >= r.end_at
+                AND nd.workflow_code = rd.workflow_code
+                AND (nd.workflow_code = 'FULL' OR nd.params = rd.params)
+            )
+        ) AS archive
+    FROM (
+        SELECT r.*, r.tableoid FROM "request" r
+        WHERE r.id > :after
+        ORDER BY r.id
+        LIMIT :batch_size
+    ) r
+    ORDER BY r.id
+    """,
+)
+
+BLOOM_COUNT_QUERY = text('SELECT count(*) FROM "counterparty"')
+
+BLOOM_IDENTIFIERS_QUERY = text(
+    'SELECT inn, ogrn, sap_num FROM "counterparty"',
+)
+
+RESOLVE_COUNTERPARTY_QUERY = text(
+    """
+    SELECT id FROM "counterparty"
+    WHERE (inn = :inn AND :inn != '')
+    OR (ogrn = :ogrn AND :ogrn != '')
+    OR (sap_num = :sap_num AND :sap_num != '')
+    """,
+)
+
+# DO UPDATE, unlike DO NOTHING, returns the id of an existing row too.
+UPSERT_COUNTERPARTIES_QUERY = text(
+    """
+    INSERT INTO "counterparty" (inn, ogrn, sap_num)
+    SELECT * FROM unnest(
+        CAST(:inns AS text[]),
+        CAST(:ogrns AS text[]),
+        CAST(:sap_nums AS text[])
+    )
+    ON CONFLICT (inn, ogrn, sap_num) DO UPDATE SET inn = EXCLUDED.inn
+    RETURNING id, inn, ogrn, sap_num
+    """,
+)
+
+CHECK_RULES_QUERY = text(
+    """
+    WITH {resolved}
+    SELECT
+        r.id, r.inn, r.ogrn, r.sap_num, r.blocking,
+        r.start_at, r.end_at, r.created_at,
+        jsonb_agg(
+            jsonb_build_object(
+                'workflow_code', r.workflow_code, 'params', r.params
+            )
+            ORDER BY r.detail_id
+        ) AS details
+    FROM ({request_details}) r
+    WHERE r.counterparty_id = ANY(ARRAY(SELECT id FROM resolved))
+    AND (
+        r.workflow_code = 'DOC'
+        OR r.validity @> CAST(:check_for_dt AS timestamp)
+    )
+    GROUP BY
+        r.id, r.inn, r.ogrn, r.sap_num, r.blocking,
+        r.start_at, r.end_at, r.created_at
+    """.format(
+        resolved=RESOLVED,
+        request_details=REQUEST_DETAILS.format(
+            since="CAST(:check_for_dt AS timestamp)",
+        ),
+    ),
+).columns(details=JSONB)
+
+# CHECK_RULES_QUERY for many checks at once, rows tagged with the 1-based
+# position of their check.
+CHECK_RULES_BATCH_QUERY = text(
+    """
+    WITH checks AS (
+        SELECT * FROM unnest(
+            CAST(:inns AS text[]),
+            CAST(:ogrns AS text[]),
+            CAST(:sap_nums AS text[]),
+            CAST(:check_for_dts AS timestamp[])
+        ) WITH ORDINALITY AS c(inn, ogrn, sap_num, check_for_dt, idx)
+    ), resolved AS (
+        SELECT c.*, k.counterparty_ids FROM checks c
+        CROSS JOIN LATERAL (
+            SELECT array_agg(cp.id) AS counterparty_ids
+            FROM "counterparty" cp
+            WHERE (cp.inn = c.inn AND c.inn != '')
+            OR (cp.ogrn = c.ogrn AND c.ogrn != '')
+            OR (cp.sap_num = c.sap_num AND c.sap_num != '')
+        ) k
+    )
+    SELECT
+        c.idx, r.id, r.inn, r.ogrn, r.sap_num, r.blocking,
+        r.start_at, r.end_at, r.created_at,
+        jsonb_agg(
+            jsonb_build_object(
+                'workflow_code', r.workflow_code, 'params', r.params
+            )
+            ORDER BY r.detail_id
+        ) AS details
+    FROM resolved c
+    CROSS JOIN LATERAL (
+        SELECT * FROM ({request_details}) r
+        WHERE r.counterparty_id = ANY(c.counterparty_ids)
+        AND (r.workflow_code = 'DOC' OR r.validity @> c.check_for_dt)
+    ) r
+    GROUP BY
+        c.idx, r.id, r.inn, r.ogrn, r.sap_num, r.blocking,
+        r.start_at, r.end_at, r.created_at
+    ORDER BY c.idx
+    """.format(
+        request_details=REQUEST_DETAILS.format(since="c.check_for_dt"),
+    ),
+).columns(details=JSONB)
+
+TIMELINE_QUERY = text(
+    """
+    SELECT
+        r.id, r.inn, r.ogrn, r.sap_num, r.blocking,
+        r.start_at, r.end_at, r.created_at,
+        jsonb_agg(
+            jsonb_build_object(
+                'workflow_code', r.workflow_code, 'params', r.params
+            )
+            ORDER BY r.detail_id
+        ) AS details
+    FROM ({request_details}) r
+    WHERE r.counterparty_id = ANY(CAST(:counterparty_ids AS bigint[]))
+    AND (
+        r.workflow_code = 'DOC'
+        OR r.validity && tsrange(
+            CAST(:date_from AS timestamp), CAST(:date_to AS timestamp), '[]'
+        )
+    )
+    GROUP BY
+        r.id, r.inn, r.ogrn, r.sap_num, r.blocking,
+        r.start_at, r.end_at, r.created_at
+    """.format(
+        request_details=REQUEST_DETAILS.format(
+            since="CAST(:date_from AS timestamp)",
+        ),
+    ),
+).columns(details=JSONB)
+
+REBUILD_BLOCK_STATE_QUERY = text(
+    """
+    DELETE FROM "counterparty_block_state";
+    INSERT INTO "counterparty_block_state" (
+        id_type, id_value, request_id, blocking,
+        created_at, start_at, end_at
+    )
+    SELECT DISTINCT ON (k.id_type, k.id_value)
+        k.id_type, k.id_value, r.id, r.blocking,
+        r.created_at, r.start_at, r.end_at
+    FROM ({request_details}) r
+    CROSS JOIN LATERAL (
+        VALUES ('inn', r.inn), ('ogrn', r.ogrn), ('sap_num', r.sap_num)
+    ) AS k(id_type, id_value)
+    WHERE k.id_value <> ''
+    AND r.workflow_code = 'FULL'
+    ORDER BY k.id_type, k.id_value, r.created_at DESC, r.id DESC;
+    """.format(
+        request_details=REQUEST_DETAILS.format(
+            since="CAST('-infinity' AS timestamp)",
+        ),
+    ),
+)
+
+# Archived rows keep their ids, so archiving does not move the watermark.
+REPORT_WATERMARK_QUERY = text(
+    """
+    SELECT greatest(
+        (SELECT max(id) FROM request WHERE {period}),
+        (SELECT max(id) FROM request_archive WHERE {period})
+    )
+    """.format(
+        period="""
+            created_at >= coalesce(
+                CAST(:period_from AS timestamp), '-infinity'::timestamp
+            )
+            AND created_at < coalesce(
+                CAST(:period_to AS timestamp), 'infinity'::timestamp
+            )
+        """,
+    ),
+)
+
+REBUILD_ROLLUP_DAILY_QUERY = text(
+    """
+    DELETE FROM "request_rollup_daily";
+    INSERT INTO "request_rollup_daily" (
+        day, from_system, workflow_code, is_resident, blocks, unblocks
+    )
+    SELECT
+        r.created_at::date, r.from_system, r.workflow_code, r.is_resident,
+        count(*) FILTER (WHERE r.blocking),
+        count(*) FILTER (WHERE NOT r.blocking)
+    FROM ({request_details}) r
+    GROUP BY 1, 2, 3, 4;
+    """.format(
+        request_details=REQUEST_DETAILS.format(
+            since="CAST('-infinity' AS timestamp)",
+        ),
+    ),
+)
@@ -0,0 +1,151 @@
+"""Streaming report of block and unblock requests."""
+import csv
+import io
+import json
+from datetime import datetime
+
+from sqlalchemy import select, union_all
+
+import app.models as models
+
+FORMATS = ("ndjson", "csv")
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+BATCH_SIZE = 1_000
+
+REQUEST_FIELDS = (
+    "created_at",
+    "blocking",
+    "from_system",
+    "is_resident",
+    "inn",
+    "ogrn",
+    "sap_num",
+    "mdm_id",
+    "start_at",
+    "end_at",
+    "created_by",
+    "approved_at",
+    "approved_by",
+)
+FIELDS = ["request_id", *REQUEST_FIELDS, "workflow_code", "params"]
+# Generated columns of request_detail and the workflow using each of them,
+# which their partial indexes are built on.
+PARAM_FILTERS = {
+    "name_object": "DOC",
+    "contract": "DOC",
+    "doc_num": "DOC",
+    "balance_unit": "UNIT",
+    "account": "ACC",
+}
+
+
+def _report_rows(filters, request, detail):
+    """Select the report rows of a request table and its detail table."""
+    query = select(
+        request.id.label("request_id"),
+        *(getattr(request, name) for name in REQUEST_FIELDS),
+        detail.workflow_code,
+        detail.params,
+    ).join(
+        detail,
+        (detail.request_id == request.id)
+        & (detail.request_end_at == request.end_at),
+    )
+    if filters.period_from is not None:
+        query = query.where(request.created_at >= filters.period_from)
+    if filters.period_to is not None:
+        query = query.where(request.created_at < filters.period_to)
+    if filters.from_system is not None:
+        query = query.where(request.from_system == filters.from_system)
+    if filters.workflow_code is not None:
+        query = query.where(detail.workflow_code == filters.workflow_code)
+    for name in ("inn", "ogrn", "sap_num"):
+        value = getattr(filters, name)
+        if value:
+            query = query.where(
+                request.counterparty_id.in_(
+                    select(models.Counterparty.id).where(
+                        getattr(models.Counterparty, name) == value,
+                    ),
+                ),
+            )
+    for name, workflow_code in PARAM_FILTERS.items():
+        value = getattr(filters, name)
+        if value is not None:
+            query = query.where(
+                getattr(detail, name) == value,
+                detail.workflow_code == workflow_code,
+            )
+    return query
+
+
+def build_report_query(filters):
+    """Select request x request_detail rows matching the report filters.
+
+    Archived requests are reported too, superseded ones are archived as
+    soon as a later request covers them. Rows are not ordered, so that they
+    stream out without sorting the whole history first.
+    """
+    return union_all(
+        _report_rows(filters, models.Request, models.RequestDetail),
+        _report_rows(
+            filters, models.RequestArchive, models.RequestDetailArchive,
+        ),
+    )
+
+
+def _json_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def format_ndjson(rows):
+    """Render rows as newline-delimited JSON."""
+    return "".join(
+        json.dumps(
+            {field: _json_value(value) for field, value in zip(FIELDS, row)},
+            ensure_ascii=False,
+        )
+        + "\n"
+        for row in rows
+    )
+
+
+def format_csv(rows, header=False):
+    """Render rows as CSV, params as a JSON cell."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(FIELDS)
+    for row in rows:
+        *values, params = row
+        writer.writerow(
+            [
+                value.isoformat() if isinstance(value, datetime) else value
+                for value in values
+            ]
+            + [json.dumps(params, ensure_ascii=False)],
+        )
+    return buffer.getvalue()
+
+
+async def stream_report(session, filters, fmt, is_disconnected=None):
+    """Yield encoded report chunks from a server-side cursor.
+
+    Rows are fetched BATCH_SIZE at a time, so memory does not grow with the
+    report. Streaming stops when is_disconnected() reports the client gone.
+    """
+    if fmt == "csv":
+        yield format_csv((), header=True).encode("utf-8")
+    render = format_csv if fmt == "csv" else format_ndjson
+    result = await session.stream(
+        build_report_query(filters).execution_options(yield_per=BATCH_SIZE),
+    )
+    try:
+        async for rows in result.partitions():
+            if is_disconnected is not None and await is_disconnected():
+                break
+            yield render(rows).encode("utf-8")
+    finally:
+        await result.close()
@@ -0,0 +1,98 @@
+"""Compiled workflow rules evaluated by /check.
+
+Every request_detail is compiled into rule keys: ("FULL",), ("SUM",),
+("OPER", code), ("UNIT", balance_unit) and ("ACC", account). For each key
+the latest request covering check_for_dt decides, like FULL always did,
+so an unblock only lifts the rules it names. SUM blocks amounts above the
+threshold of the deciding request. A DOC unblock whose name_object equals
+the contract lifts the result as a whole.
+"""
+from typing import FrozenSet, NamedTuple, Optional
+
+FULL = ("FULL",)
+SUM = ("SUM",)
+
+
+class CompiledRules(NamedTuple):
+    """Predicates of one request, ready for the index."""
+
+    keys: FrozenSet[tuple]
+    max_sum: Optional[int]
+    doc_names: FrozenSet[str]
+
+
+def compile_details(details):
+    """Compile request_detail rows ({workflow_code, params}) into rules."""
+    keys = set()
+    sums = []
+    doc_names = set()
+    for detail in details:
+        workflow_code = detail["workflow_code"]
+        params = detail.get("params") or {}
+        match workflow_code:
+            case "FULL":
+                keys.add(FULL)
+            case "SUM":
+                if params.get("max_sum") is not None:
+                    keys.add(SUM)
+                    sums.append(params["max_sum"])
+            case "OPER":
+                keys.update(
+                    ("OPER", code)
+                    for code in params.get("operation_sap_code") or ()
+                )
+            case "UNIT":
+                if params.get("balance_unit"):
+                    keys.add(("UNIT", params["balance_unit"]))
+            case "ACC":
+                if params.get("account"):
+                    keys.add(("ACC", params["account"]))
+            case "DOC":
+                if params.get("name_object") is not None:
+                    doc_names.add(params["name_object"])
+    return CompiledRules(
+        frozenset(keys), min(sums) if sums else None, frozenset(doc_names),
+    )
+
+
+def check_keys(amount, operation_sap_code, balance_unit, account):
+    """Rule keys a check with the given attributes can be blocked by."""
+    keys = [FULL]
+    if amount is not None:
+        keys.append(SUM)
+    if operation_sap_code:
+        keys.append(("OPER", operation_sap_code))
+    if balance_unit:
+        keys.append(("UNIT", balance_unit))
+    if account:
+        keys.append(("ACC", account))
+    return keys
+
+
+def evaluate(
+    states, contract, check_for_dt, amount=None, operation_sap_code=None,
+    balance_unit=None, account=None,
+):
+    """Blocking status of a check over the KeyStates of its identifiers."""
+    if check_for_dt is None or not states:
+        return False
+    blocked = False
+    for key in check_keys(amount, operation_sap_code, balance_unit, account):
+        latest = None
+        for state in states:
+            block = state.effective(check_for_dt, key)
+            if block and (
+                latest is None
+                or (block.created_at, block.request_id)
+                > (latest.created_at, latest.request_id)
+            ):
+                latest = block
+        if latest is None or not latest.blocking:
+            continue
+        if key == SUM and not amount > latest.max_sum:
+            continue
+        blocked = True
+        break
+    if not blocked:
+        return False
+    return not any(contract in state.doc_names for state in states)
@@ -1,10 +1,12 @@
 """Schemas for request body validation."""
-from datetime import datetime
+from datetime import date, datetime
+from decimal import Decimal
 from typing import List, Optional
 
 from pydantic import BaseModel, conlist, constr
 
-from app.validators import BaseSchema, BaseWorkflowParams
+from app.validators import (BaseReportSchema, BaseSchema,
+                            BaseWorkflowParams)
 
 
 class WorkflowParams(BaseWorkflowParams):
@@ -59,6 +61,27 @@ class CheckRequest(BaseSchema):
     sap_num: Optional[constr(max_length=20)]
     contract: Optional[constr(max_length=60)]
     check_for_dt: Optional[datetime]
+    amount: Optional[Decimal]
+    operation_sap_code: Optional[constr(max_length=4)]
+    balance_unit: Optional[constr(max_length=5)]
+    account: Optional[constr(max_length=10)]
+
+
+class ReportRequest(BaseReportSchema):
+    """Report filters schema; period bounds apply to created_at."""
+
+    period_from: Optional[datetime]
+    period_to: Optional[datetime]
+    from_system: Optional[int]
+    workflow_code: Optional[str]
+    inn: Optional[constr(max_length=60)]
+    ogrn: Optional[constr(max_length=60)]
+    sap_num: Optional[constr(max_length=20)]
+    name_object: Optional[str]
+    contract: Optional[str]
+    doc_num: Optional[str]
+    balance_unit: Optional[constr(max_length=5)]
+    account: Optional[constr(max_length=10)]
 
 
 class BlockResponse(BaseModel):
@@ -68,12 +91,49 @@ class BlockResponse(BaseModel):
     reg_datetime: datetime
 
 
+class BulkImportError(BaseModel):
+    """Rejected row of a bulk import."""
+
+    row: int
+    errors: List[str]
+
+
+class BulkImportReport(BaseModel):
+    """Bulk import result schema."""
+
+    imported: int
+    rejected: int
+    errors: List[BulkImportError]
+
+
+class ReportSummaryRow(BaseModel):
+    """Daily rollup row schema."""
+
+    day: date
+    from_system: int
+    workflow_code: str
+    is_resident: bool
+    blocks: int
+    unblocks: int
+
+    class Config:
+        orm_mode = True
+
+
 class CheckResponse(BaseModel):
     """Check response schema."""
 
     blocking: bool
 
 
+class TimelineInterval(BaseModel):
+    """Check timeline interval schema, bounds inclusive."""
+
+    start_at: datetime
+    end_at: datetime
+    blocking: bool
+
+
 class DictOperation(BaseModel):
     """Dict operation schema."""
 
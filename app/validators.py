@@ -9,6 +9,13 @@ class BaseSchema(BaseModel):
     def validate_fields(cls, values):
         return h.validate_fields(values)
 
+    @validator(
+        "start_at", "end_at", "approved_at", "check_for_dt",
+        check_fields=False, allow_reuse=True,
+    )
+    def validate_naive_datetime(cls, value):
+        return h.validate_naive_datetime(value)
+
     @validator("end_at", check_fields=False)
     def validate_end_at(cls, end_at, values):
         return h.validate_end_at(end_at, values)
@@ -28,3 +35,17 @@ class BaseWorkflowParams(BaseModel):
     @validator("params", check_fields=False)
     def validate_params(cls, params, values):
         return h.validate_params(params, values)
+
+
+class BaseReportSchema(BaseModel):
+    """Base class for report filters."""
+
+    @validator(
+        "period_from", "period_to", check_fields=False, allow_reuse=True,
+    )
+    def validate_naive_datetime(cls, value):
+        return h.validate_naive_datetime(value)
+
+    @validator("period_to", check_fields=False)
+    def validate_period_to(cls, period_to, values):
+        return h.validate_period_to(period_to, values)
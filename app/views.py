@@ -1,34 +1,187 @@
 """Module for views."""
-from datetime import datetime
-from typing import List
-
-from fastapi import APIRouter, Depends
-from sqlalchemy import text
-
+import os
+from datetime import date, datetime
+from decimal import Decimal
+from http import HTTPStatus
+from itertools import groupby
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import StreamingResponse
+from pydantic.error_wrappers import ErrorWrapper
+from sqlalchemy import insert, select, update
+
+import app.bulk as bulk
+import app.changes as changes
+import app.counterparties as counterparties
+import app.helpers as h
+import app.jobs as jobs
 import app.models as models
+import app.queries as q
+import app.reports as reports
+import app.rules as rules
 import app.schemas as s
-from app.db import get_db
-from app.models import Request as AppRequest
+from app.block_index import block_index, states_from_rows, timeline
+from app.bloom import identifier_filter
+from app.cache import check_cache
+from app.config import settings
+from app.db import get_async_db
+from app.dictionaries import dictionaries, validate_block_request
+from app.jobs import report_jobs
 
 router = APIRouter()
 
+CHECK_BATCH_SIZE = 10_000
 
-@router.post("/block", response_model=s.BlockResponse)
-def create_block(request: s.BlockRequest, session=Depends(get_db)):
-    """Create block request."""
+
+def _is_blocking(row):
+    """Blocking status of a check row, taking DOC exemption into account."""
+    return bool(row.blocking) and not row.doc_exempt
+
+
+async def _load_block_index(session):
+    """Load the in-memory block index once per process."""
+    await block_index.ensure_loaded(session)
+
+
+async def _load_identifier_filter(session):
+    """Build the identifier Bloom filter once per process."""
+    await identifier_filter.ensure_loaded(session)
+
+
+def _is_definite_miss(request):
+    """True if the counterparty never appeared in any request."""
+    if not settings.bloom_filter_enabled:
+        return False
+    return identifier_filter.is_definite_miss(
+        request.inn, request.ogrn, request.sap_num,
+    )
+
+
+def _rule_attributes(request):
+    """Check attributes evaluated by partial workflows, if given."""
+    return {
+        name: getattr(request, name)
+        for name in ("amount", "operation_sap_code", "balance_unit", "account")
+        if getattr(request, name) is not None
+    }
+
+
+def _check_from_index(request):
+    """Answer a check from the in-memory block index."""
+    return block_index.is_blocking(
+        request.inn,
+        request.ogrn,
+        request.sap_num,
+        request.contract,
+        request.check_for_dt,
+        **_rule_attributes(request),
+    )
+
+
+async def _check_rules_batch(chunk, session):
+    """Answer checks with partial workflow attributes in one query."""
+    rows = await session.execute(
+        q.CHECK_RULES_BATCH_QUERY,
+        {
+            "inns": [r.inn for r in chunk],
+            "ogrns": [r.ogrn for r in chunk],
+            "sap_nums": [r.sap_num for r in chunk],
+            "check_for_dts": [r.check_for_dt for r in chunk],
+        },
+    )
+    grouped = {
+        idx: list(group) for idx, group in groupby(rows, lambda r: r.idx)
+    }
+    return [
+        rules.evaluate(
+            states_from_rows(grouped.get(idx, [])),
+            request.contract,
+            request.check_for_dt,
+            **_rule_attributes(request),
+        )
+        for idx, request in enumerate(chunk, 1)
+    ]
+
+
+async def _check_rules(request, session):
+    """Answer a check with partial workflow attributes in one query."""
+    rows = await session.execute(
+        q.CHECK_RULES_QUERY,
+        {
+            "inn": request.inn,
+            "ogrn": request.ogrn,
+            "sap_num": request.sap_num,
+            "check_for_dt": request.check_for_dt,
+        },
+    )
+    return rules.evaluate(
+        states_from_rows(rows),
+        request.contract,
+        request.check_for_dt,
+        **_rule_attributes(request),
+    )
+
+
+async def _create_request(request, blocking, session):
+    """Insert a request with its details in a single transaction."""
     data = request.dict()
     details_data = data.pop("details")
     created_at = datetime.now()
-    req = AppRequest(**data, blocking=True, created_at=created_at)
-
-    session.add(req)
-    session.commit()
-    session.refresh(req)
+    triple = (data["inn"], data["ogrn"], data["sap_num"])
+    counterparty_ids = await counterparties.upsert(session, [triple])
+    result = await session.execute(
+        insert(models.Request)
+        .values(
+            **data,
+            blocking=blocking,
+            created_at=created_at,
+            counterparty_id=counterparty_ids[triple],
+        )
+        .returning(
+            models.Request.id,
+            models.Request.created_at,
+            models.Request.inn,
+            models.Request.ogrn,
+            models.Request.sap_num,
+            models.Request.blocking,
+            models.Request.start_at,
+            models.Request.end_at,
+        ),
+    )
+    req = result.one()
+    if details_data:
+        await session.execute(
+            insert(models.RequestDetail).values(
+                [
+                    {
+                        **detail_data,
+                        "request_id": req.id,
+                        "request_end_at": req.end_at,
+                    }
+                    for detail_data in details_data
+                ],
+            ),
+        )
+    # Taken last, so that the change feed is locked only until commit.
+    seq = await changes.next_seq(session)
+    await session.execute(
+        update(models.Request)
+        .where(
+            models.Request.id == req.id, models.Request.end_at == req.end_at,
+        )
+        .values(change_seq=seq),
+    )
+    await changes.publish(session, seq, req)
+    await session.commit()
 
-    for detail_data in details_data:
-        detail = models.RequestDetail(**detail_data, request_id=req.id)
-        session.add(detail)
-    session.commit()
+    if settings.block_index_enabled:
+        block_index.add(req, details_data)
+    if settings.bloom_filter_enabled:
+        identifier_filter.add(req.inn, req.ogrn, req.sap_num)
+    if settings.check_cache_enabled:
+        check_cache.invalidate(req.inn, req.ogrn, req.sap_num)
 
     return s.BlockResponse(
         request_id=req.id,
@@ -36,165 +189,462 @@ def create_block(request: s.BlockRequest, session=Depends(get_db)):
     )
 
 
-@router.post("/unblock", response_model=s.BlockResponse)
-def create_unblock(request: s.BlockRequest, session=Depends(get_db)):
-    """Create unblock request."""
-    data = request.dict()
-    details_data = data.pop("details")
-    created_at = datetime.now()
+async def _validate_codes(request, session):
+    """Reject unknown dictionary codes with a 422 before any write."""
+    snapshot = await dictionaries.get(session)
+    errors = validate_block_request(snapshot, request)
+    if errors:
+        raise RequestValidationError(
+            [
+                ErrorWrapper(ValueError(message), loc=("body",) + loc)
+                for loc, message in errors
+            ],
+        )
 
-    req = AppRequest(**data, blocking=False, created_at=created_at)
 
-    session.add(req)
-    session.commit()
-    session.refresh(req)
+@router.post("/block", response_model=s.BlockResponse)
+async def create_block(
+    request: s.BlockRequest, session=Depends(get_async_db),
+):
+    """Create block request."""
+    await _validate_codes(request, session)
+    return await _create_request(request, True, session)
 
-    for detail_data in details_data:
-        detail = models.RequestDetail(**detail_data, request_id=req.id)
-        session.add(detail)
-    session.commit()
 
-    return s.BlockResponse(
-        request_id=req.id,
-        reg_datetime=req.created_at,
+@router.post("/unblock", response_model=s.BlockResponse)
+async def create_unblock(
+    request: s.BlockRequest, session=Depends(get_async_db),
+):
+    """Create unblock request."""
+    await _validate_codes(request, session)
+    return await _create_request(request, False, session)
+
+
+@router.post("/block/import", response_model=s.BulkImportReport)
+async def import_blocks(
+    http_request: Request,
+    format: str = "ndjson",
+    session=Depends(get_async_db),
+):
+    """Bulk create block requests from an NDJSON or CSV body."""
+    if format not in bulk.FORMATS:
+        raise HTTPException(status_code=422, detail="Unsupported format")
+    report = await bulk.import_blocks(
+        session, bulk.iter_lines(http_request.stream()), format,
     )
+    await session.commit()
+
+    if settings.block_index_enabled and report.imported:
+        block_index.invalidate()
+    if settings.bloom_filter_enabled and report.imported:
+        identifier_filter.invalidate()
+    if settings.check_cache_enabled and report.imported:
+        check_cache.clear()
+
+    return report
 
 
 @router.post("/check", response_model=s.CheckResponse)
-def check(request: s.CheckRequest, session=Depends(get_db)):
+async def check(
+    request: s.CheckRequest, session=Depends(get_async_db),
+):
     """Check request."""
-    blocking_status = False
+    if settings.bloom_filter_enabled:
+        if not identifier_filter.loaded:
+            await _load_identifier_filter(session)
+        if _is_definite_miss(request):
+            return s.CheckResponse(blocking=False)
+
+    if settings.block_index_enabled:
+        if not block_index.loaded:
+            await _load_block_index(session)
+        # Earlier moments need the archive, which only the database has.
+        if block_index.covers(request.check_for_dt):
+            return s.CheckResponse(blocking=_check_from_index(request))
+
+    # Results depending on partial workflows are not cached: the cache
+    # bounds only cover FULL transitions.
+    if _rule_attributes(request):
+        return s.CheckResponse(blocking=await _check_rules(request, session))
+
+    if settings.check_cache_enabled:
+        cached = check_cache.get(request)
+        if cached is not None:
+            return s.CheckResponse(blocking=cached)
+        cache_version = check_cache.version
 
-    blocking_query = text(
-        """
-        SELECT r.* FROM "request" r
-        INNER JOIN "request_detail" rd ON r.id = rd.request_id
-        WHERE ((r.inn::text = :inn AND :inn != '')
-        OR (r.ogrn::text = :ogrn AND :ogrn != '')
-        OR (r.sap_num::text = :sap_num AND :sap_num != ''))
-        AND rd.workflow_code = 'FULL'
-        AND :check_for_dt BETWEEN r.start_at AND r.end_at
-        ORDER BY r.created_at DESC
-        """,
-    )
+    blocking_status = False
 
-    blocking_values = {
+    check_values = {
         "inn": request.inn,
         "ogrn": request.ogrn,
         "sap_num": request.sap_num,
+        "contract": request.contract,
         "check_for_dt": request.check_for_dt,
     }
 
-    blocking_result_proxy = session.execute(blocking_query, blocking_values)
-    blocking_data = blocking_result_proxy.fetchall()
-    if blocking_data:
-        latest_blocking = blocking_data[0]
-        blocking_status = latest_blocking.blocking
-
-    if blocking_status:
-        doc_query = text(
-            """
-            SELECT r.* FROM "request" r
-            INNER JOIN "request_detail" rd ON r.id = rd.request_id
-            WHERE (r.inn = :inn OR r.ogrn = :ogrn OR r.sap_num = :sap_num)
-            AND rd.workflow_code = 'DOC'
-            AND rd.params ->> 'name_object' = :contract
-        """,
+    if settings.check_cache_enabled:
+        row = (
+            await session.execute(q.CHECK_WITH_BOUNDS_QUERY, check_values)
+        ).one()
+        blocking_status = _is_blocking(row)
+        check_cache.put(
+            request, blocking_status, row.valid_from, row.valid_until,
+            cache_version,
         )
+    else:
+        result = await session.execute(q.CHECK_QUERY, check_values)
+        latest_blocking = result.first()
+        if latest_blocking:
+            blocking_status = _is_blocking(latest_blocking)
 
-        doc_values = {
-            "inn": request.inn,
-            "ogrn": request.ogrn,
-            "sap_num": request.sap_num,
-            "contract": request.contract,
+    return s.CheckResponse(blocking=blocking_status)
+
+
+@router.get("/check/cache")
+async def check_cache_stats():
+    """Get /check result cache counters."""
+    return check_cache.stats()
+
+
+@router.get("/check/timeline", response_model=List[s.TimelineInterval])
+async def check_timeline(
+    date_from: datetime,
+    date_to: datetime,
+    inn: Optional[str] = None,
+    ogrn: Optional[str] = None,
+    sap_num: Optional[str] = None,
+    contract: Optional[str] = None,
+    amount: Optional[Decimal] = None,
+    operation_sap_code: Optional[str] = None,
+    balance_unit: Optional[str] = None,
+    account: Optional[str] = None,
+    session=Depends(get_async_db),
+):
+    """Get merged block intervals of a counterparty over a date range."""
+    if not inn and not ogrn and not sap_num:
+        raise HTTPException(
+            status_code=422,
+            detail="Either INN or OGRN or SAP_NUM must be provided",
+        )
+    date_from = h.validate_naive_datetime(date_from)
+    date_to = h.validate_naive_datetime(date_to)
+    if date_to < date_from:
+        raise HTTPException(
+            status_code=422,
+            detail="date_to must be greater than or equal to date_from",
+        )
+    attributes = {
+        name: value
+        for name, value in (
+            ("amount", amount),
+            ("operation_sap_code", operation_sap_code),
+            ("balance_unit", balance_unit),
+            ("account", account),
+        )
+        if value is not None
+    }
+    if settings.bloom_filter_enabled:
+        if not identifier_filter.loaded:
+            await _load_identifier_filter(session)
+        if identifier_filter.is_definite_miss(inn, ogrn, sap_num):
+            return [
+                s.TimelineInterval(
+                    start_at=date_from, end_at=date_to, blocking=False,
+                ),
+            ]
+
+    if settings.block_index_enabled and not block_index.loaded:
+        await _load_block_index(session)
+    if settings.block_index_enabled and block_index.covers(date_from):
+        intervals = block_index.timeline(
+            inn, ogrn, sap_num, contract, date_from, date_to, **attributes,
+        )
+    else:
+        counterparty_ids = await counterparties.resolve(
+            session, inn, ogrn, sap_num,
+        )
+        rows = await session.execute(
+            q.TIMELINE_QUERY,
+            {
+                "counterparty_ids": counterparty_ids,
+                "date_from": date_from,
+                "date_to": date_to,
+            },
+        )
+        intervals = timeline(
+            states_from_rows(rows), contract, date_from, date_to,
+            **attributes,
+        )
+    return [
+        s.TimelineInterval(start_at=start_at, end_at=end_at, blocking=status)
+        for start_at, end_at, status in intervals
+    ]
+
+
+@router.get("/check/bloom")
+async def check_bloom_stats():
+    """Get identifier Bloom filter counters."""
+    return identifier_filter.stats()
+
+
+@router.post("/check/batch", response_model=List[s.CheckResponse])
+async def check_batch(
+    requests: List[s.CheckRequest], session=Depends(get_async_db),
+):
+    """Check many counterparties at once, in input order."""
+    results = [s.CheckResponse(blocking=False) for _ in requests]
+    pending = range(len(requests))
+    if settings.block_index_enabled:
+        if not block_index.loaded:
+            await _load_block_index(session)
+        # Earlier moments need the archive, which only the database has.
+        uncovered = []
+        for position in pending:
+            request = requests[position]
+            if block_index.covers(request.check_for_dt):
+                blocking = _check_from_index(request)
+                results[position] = s.CheckResponse(blocking=blocking)
+            else:
+                uncovered.append(position)
+        pending = uncovered
+    if not pending:
+        return results
+
+    if settings.bloom_filter_enabled and not identifier_filter.loaded:
+        await _load_identifier_filter(session)
+    # Definite Bloom filter misses are answered without the database, and
+    # only checks with partial workflow attributes need the rules.
+    rule_positions = []
+    positions = []
+    for position in pending:
+        request = requests[position]
+        if _is_definite_miss(request):
+            continue
+        if _rule_attributes(request):
+            rule_positions.append(position)
+        else:
+            positions.append(position)
+    for start in range(0, len(rule_positions), CHECK_BATCH_SIZE):
+        chunk_positions = rule_positions[start:start + CHECK_BATCH_SIZE]
+        chunk = [requests[position] for position in chunk_positions]
+        blocking = await _check_rules_batch(chunk, session)
+        for position, status in zip(chunk_positions, blocking):
+            results[position] = s.CheckResponse(blocking=status)
+    for start in range(0, len(positions), CHECK_BATCH_SIZE):
+        chunk_positions = positions[start:start + CHECK_BATCH_SIZE]
+        chunk = [requests[position] for position in chunk_positions]
+        batch_values = {
+            "inns": [r.inn for r in chunk],
+            "ogrns": [r.ogrn for r in chunk],
+            "sap_nums": [r.sap_num for r in chunk],
+            "contracts": [r.contract for r in chunk],
+            "check_for_dts": [r.check_for_dt for r in chunk],
         }
-        doc_result_proxy = session.execute(doc_query, doc_values)
-        doc_data = doc_result_proxy.fetchall()
+        rows = await session.execute(q.CHECK_BATCH_QUERY, batch_values)
+        for position, row in zip(chunk_positions, rows):
+            results[position] = s.CheckResponse(blocking=_is_blocking(row))
+
+    return results
+
+@router.get("/changes")
+async def get_changes(
+    http_request: Request,
+    since: Optional[str] = None,
+    limit: int = 1000,
+    wait: float = 0,
+    session=Depends(get_async_db),
+):
+    """Get requests committed after the since cursor, oldest first.
+
+    Pass the returned cursor as since to get the next page; wait (seconds)
+    long-polls until new changes arrive.
+    """
+    if not 0 < limit <= changes.MAX_PAGE_SIZE:
+        raise HTTPException(status_code=422, detail="Invalid limit")
+    if not 0 <= wait <= changes.MAX_WAIT:
+        raise HTTPException(status_code=422, detail="Invalid wait")
+    try:
+        page = await changes.fetch_changes(session, since, limit, wait)
+    except ValueError as exc:
+        raise HTTPException(status_code=422, detail=str(exc))
+    body, encoding = changes.encode_page(
+        page, http_request.headers.get("accept-encoding", ""),
+    )
+    headers = {"Vary": "Accept-Encoding"}
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return Response(
+        content=body, media_type="application/json", headers=headers,
+    )
 
-        if not doc_data:
-            blocking_status = True
 
-    return s.CheckResponse(blocking=blocking_status)
+def _dict_response(http_request, payload):
+    """Serve a pre-serialized dictionary body, or 304 if the ETag matches."""
+    headers = {"ETag": payload.etag}
+    if_none_match = http_request.headers.get("if-none-match", "")
+    if payload.etag in (tag.strip() for tag in if_none_match.split(",")):
+        return Response(status_code=HTTPStatus.NOT_MODIFIED, headers=headers)
+    return Response(
+        content=payload.body, media_type="application/json", headers=headers,
+    )
 
 
 @router.get("/dict_operation", response_model=List[s.DictOperation])
-def get_dict_operation(session=Depends(get_db)):
+async def get_dict_operation(
+    http_request: Request, session=Depends(get_async_db),
+):
     """Get blocking operations."""
-    operations = (
-        session.query(models.DictOperation).filter_by(blocking=True).all()
-    )
-    return [
-            s.DictOperation(
-                sap_code=op.sap_code,
-                sap_name=op.sap_name,
-                name=op.name
-            )
-            for op in operations
-        ]
+    snapshot = await dictionaries.get(session)
+    return _dict_response(http_request, snapshot.payload("dict_operation"))
 
 
 @router.get("/dict_system", response_model=List[s.DictSystemSchema])
-async def get_dict_system(session=Depends(get_db)):
+async def get_dict_system(
+    http_request: Request, session=Depends(get_async_db),
+):
     """Get blocking systems."""
-    systems = session.query(models.DictSystem).filter_by(source_doc=True).all()
-    return [
-        s.DictSystemSchema(
-            code=system.code,
-            name=system.name,
-        )
-        for system in systems
-    ]
+    snapshot = await dictionaries.get(session)
+    return _dict_response(http_request, snapshot.payload("dict_system"))
 
 
 @router.get("/dict_doc_type", response_model=List[s.DictDocTypeSchema])
-def get_dict_doc_type(system_code: int, session=Depends(get_db)):
+async def get_dict_doc_type(
+    system_code: int, http_request: Request, session=Depends(get_async_db),
+):
     """Get blocking document types."""
-    doc_types = (
-        session.query(models.DictDocType)
-        .join(models.DictSystem)
-        .filter(
-            models.DictSystem.code == system_code,
-            models.DictSystem.source_doc,
-        )
-        .all()
+    snapshot = await dictionaries.get(session)
+    return _dict_response(
+        http_request, snapshot.payload("dict_doc_type", system_code),
     )
-    return [
-        s.DictDocTypeSchema(
-            code=doc_type.code,
-            name=doc_type.name,
-            fullname=doc_type.fullname,
-        )
-        for doc_type in doc_types
-    ]
 
 
 @router.get("/dict_action", response_model=List[s.DictActionCodeSchema])
-def get_dict_action(doc_type_code: int, session=Depends(get_db)):
+async def get_dict_action(
+    doc_type_code: int, http_request: Request, session=Depends(get_async_db),
+):
     """Get blocking actions."""
-    actions = (
-        session.query(models.DictAction.code, models.DictAction.name)
-        .join(
-            models.DictTypeValidAction,
-            models.DictTypeValidAction.action_code == models.DictAction.code,
-        )
-        .join(
-            models.DictDocType,
-            models.DictDocType.code
-            == models.DictTypeValidAction.doc_type_code,
-        )
-        .filter(models.DictDocType.code == doc_type_code)
-        .all()
+    snapshot = await dictionaries.get(session)
+    return _dict_response(
+        http_request, snapshot.payload("dict_action", doc_type_code),
     )
-    return [
-        s.DictActionCodeSchema(
-            code=action.code,
-            name=action.name,
-        )
-        for action in actions
-    ]
+
+
+@router.post("/dict/reload")
+async def reload_dictionaries(session=Depends(get_async_db)):
+    """Reload the dictionary snapshot from the database."""
+    snapshot = await dictionaries.reload(session)
+    return {"version": snapshot.version}
 
 
 @router.post("/report")
-def create_report():
-    """TODO: Create report."""
-    pass
+async def create_report(
+    filters: s.ReportRequest,
+    http_request: Request,
+    format: str = "ndjson",
+    session=Depends(get_async_db),
+):
+    """Stream requests with their details as NDJSON or CSV."""
+    if format not in reports.FORMATS:
+        raise HTTPException(status_code=422, detail="Unsupported format")
+    return StreamingResponse(
+        reports.stream_report(
+            session, filters, format, http_request.is_disconnected,
+        ),
+        media_type=reports.MEDIA_TYPES[format],
+    )
+
+
+@router.get("/report/summary", response_model=List[s.ReportSummaryRow])
+async def get_report_summary(
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    from_system: Optional[int] = None,
+    workflow_code: Optional[str] = None,
+    is_resident: Optional[bool] = None,
+    session=Depends(get_async_db),
+):
+    """Get daily block and unblock counts from the rollup table."""
+    rollup = models.RequestRollupDaily
+    query = select(rollup).order_by(
+        rollup.day, rollup.from_system, rollup.workflow_code,
+        rollup.is_resident,
+    )
+    if date_from is not None:
+        query = query.where(rollup.day >= date_from)
+    if date_to is not None:
+        query = query.where(rollup.day <= date_to)
+    if from_system is not None:
+        query = query.where(rollup.from_system == from_system)
+    if workflow_code is not None:
+        query = query.where(rollup.workflow_code == workflow_code)
+    if is_resident is not None:
+        query = query.where(rollup.is_resident == is_resident)
+    return (await session.scalars(query)).all()
+
+
+@router.post("/report/jobs", status_code=HTTPStatus.ACCEPTED)
+async def create_report_job(
+    filters: s.ReportRequest,
+    format: str = "ndjson",
+    session=Depends(get_async_db),
+):
+    """Enqueue a report to be generated into a compressed file."""
+    if format not in reports.FORMATS:
+        raise HTTPException(status_code=422, detail="Unsupported format")
+    watermark = await session.scalar(
+        q.REPORT_WATERMARK_QUERY,
+        {"period_from": filters.period_from, "period_to": filters.period_to},
+    )
+    database_url = session.bind.url.set(drivername="postgresql")
+    job = report_jobs.submit(
+        database_url.render_as_string(hide_password=False),
+        filters,
+        format,
+        watermark,
+    )
+    return report_jobs.status(job)
+
+
+@router.get("/report/jobs/{job_id}")
+async def get_report_job(job_id: str):
+    """Get status and progress of a report job."""
+    status = report_jobs.status(job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Unknown report job")
+    return status
+
+
+@router.get("/report/jobs/{job_id}/result")
+async def download_report_job(job_id: str, http_request: Request):
+    """Download the compressed result of a finished job, Range aware."""
+    path = report_jobs.result_path(job_id)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Report is not ready")
+    size = os.path.getsize(path)
+    headers = {
+        "Accept-Ranges": "bytes",
+        "Content-Disposition": (
+            f'attachment; filename="{os.path.basename(path)}"'
+        ),
+    }
+    try:
+        byte_range = jobs.parse_range(http_request.headers.get("range"), size)
+    except ValueError:
+        return Response(
+            status_code=HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE,
+            headers={"Content-Range": f"bytes */{size}"},
+        )
+    status_code = HTTPStatus.OK
+    start, end = 0, size - 1
+    if byte_range is not None:
+        start, end = byte_range
+        status_code = HTTPStatus.PARTIAL_CONTENT
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    headers["Content-Length"] = str(end - start + 1)
+    return StreamingResponse(
+        jobs.iter_file_range(path, start, end),
+        status_code=status_code,
+        media_type="application/gzip",
+        headers=headers,
+    )
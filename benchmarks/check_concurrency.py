@@ -0,0 +1,98 @@
+"""Benchmark /check under concurrent load: async endpoint vs the sync path.
+
+Both variants run in-process against the database from .env, with the
+in-memory block index disabled so every check reaches Postgres:
+
+    poetry run python -m benchmarks.check_concurrency -n 5000 -c 200
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+from fastapi import Depends, FastAPI
+
+import app.queries as q
+import app.schemas as s
+from app.app import app as async_app
+from app.config import settings
+from app.db import get_db
+
+sync_app = FastAPI()
+
+
+@sync_app.post("/check", response_model=s.CheckResponse)
+def sync_check(request: s.CheckRequest, session=Depends(get_db)):
+    """The /check endpoint as a sync def on the psycopg2 engine."""
+    row = session.execute(
+        q.CHECK_QUERY,
+        {
+            "inn": request.inn,
+            "ogrn": request.ogrn,
+            "sap_num": request.sap_num,
+            "contract": request.contract,
+            "check_for_dt": request.check_for_dt,
+        },
+    ).first()
+    return s.CheckResponse(
+        blocking=bool(row and row.blocking and not row.doc_exempt),
+    )
+
+
+async def run(app, total, concurrency, payload):
+    """Fire total requests with at most concurrency in flight."""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async with httpx.AsyncClient(app=app, base_url="http://bench") as client:
+        async def one():
+            async with semaphore:
+                started = time.perf_counter()
+                response = await client.post("/check", json=payload)
+                response.raise_for_status()
+                latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(total)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "rps": total / elapsed,
+        "p50": statistics.median(latencies) * 1000,
+        "p95": latencies[int(len(latencies) * 0.95) - 1] * 1000,
+        "p99": latencies[int(len(latencies) * 0.99) - 1] * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", "--requests", type=int, default=2000)
+    parser.add_argument("-c", "--concurrency", type=int, default=100)
+    parser.add_argument("--inn", default="7701234567")
+    args = parser.parse_args()
+
+    settings.block_index_enabled = False
+    # The result cache would answer repeated checks without the database.
+    settings.check_cache_enabled = False
+    payload = {
+        "from_system": 0,
+        "employee": "bench",
+        "inn": args.inn,
+        "check_for_dt": "2023-06-01T00:00:00",
+    }
+    print(f"{'variant':<8}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}"
+          f"{'p99 ms':>10}")
+    for name, app in (("sync", sync_app), ("async", async_app)):
+        result = asyncio.run(
+            run(app, args.requests, args.concurrency, payload),
+        )
+        print(
+            f"{name:<8}{result['rps']:>10.0f}{result['p50']:>10.1f}"
+            f"{result['p95']:>10.1f}{result['p99']:>10.1f}",
+        )
+
+
+if __name__ == "__main__":
+    main()
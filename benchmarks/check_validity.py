@@ -0,0 +1,145 @@
+"""Benchmark point-in-time lookups: BETWEEN start_at/end_at vs validity @>.
+
+Seeds --rows FULL requests (10M by default) spread over --identifiers
+counterparties with random validity windows, then times the latest-request
+lookup for check dates far in the past, now and far in the future:
+
+    poetry run python -m benchmarks.check_validity --rows 10000000
+
+Seeded rows (created_by = 'bench') are left in place, so point --url at a
+scratch database; --skip-seed reruns the lookups on an already seeded one.
+"""
+import argparse
+import random
+import statistics
+import time
+
+from sqlalchemy import create_engine, text
+
+from app.config import settings
+
+SEED_BATCH_SIZE = 1_000_000
+
+SEED_QUERY = text(
+    """
+    WITH seeded AS (
+        INSERT INTO "request" (
+            is_resident, inn, in_sap, blocking, from_system,
+            created_at, created_by, start_at, end_at
+        )
+        SELECT
+            false, 'bench' || (w.n % :identifiers), false, w.n % 3 != 0, 0,
+            timestamp '2000-01-01' + w.n * interval '1 second', 'bench',
+            w.start_at, w.start_at + random() * interval '5 years'
+        FROM (
+            SELECT
+                n,
+                timestamp '1990-01-01' + random() * interval '60 years'
+                    AS start_at
+            FROM generate_series(:first, :last) AS n
+        ) AS w
+        RETURNING id, end_at
+    )
+    INSERT INTO "request_detail" (
+        request_id, request_end_at, workflow_code, params
+    )
+    SELECT id, end_at, 'FULL', '{}' FROM seeded
+    """,
+)
+
+LOOKUP = """
+    SELECT r.blocking FROM "request" r
+    INNER JOIN "request_detail" rd
+        ON r.id = rd.request_id AND r.end_at = rd.request_end_at
+    WHERE r.counterparty_id IN (
+        SELECT id FROM "counterparty" WHERE inn = :inn
+    )
+    AND rd.workflow_code = 'FULL'
+    AND {predicate}
+    ORDER BY r.created_at DESC
+    LIMIT 1
+"""
+
+VARIANTS = {
+    "between": text(
+        LOOKUP.format(
+            predicate=":check_for_dt BETWEEN r.start_at AND r.end_at",
+        ),
+    ),
+    "range": text(
+        LOOKUP.format(
+            predicate="r.validity @> CAST(:check_for_dt AS timestamp)",
+        ),
+    ),
+}
+
+CHECK_DATES = {
+    "past": "1991-06-01",
+    "now": "2024-06-01",
+    "future": "2049-06-01",
+}
+
+
+def seed(connection, rows, identifiers):
+    """Insert rows bench requests in SEED_BATCH_SIZE statements."""
+    for first in range(1, rows + 1, SEED_BATCH_SIZE):
+        last = min(first + SEED_BATCH_SIZE - 1, rows)
+        connection.execute(
+            SEED_QUERY,
+            {"first": first, "last": last, "identifiers": identifiers},
+        )
+        connection.commit()
+        print(f"seeded {last} rows")
+    connection.execute(text("ANALYZE request"))
+    connection.execute(text("ANALYZE request_detail"))
+    connection.commit()
+
+
+def measure(connection, query, check_for_dt, identifiers, total):
+    """Run total lookups for random bench identifiers, latencies in ms."""
+    latencies = []
+    for _ in range(total):
+        params = {
+            "inn": f"bench{random.randrange(identifiers)}",
+            "check_for_dt": check_for_dt,
+        }
+        started = time.perf_counter()
+        connection.execute(query, params).first()
+        latencies.append((time.perf_counter() - started) * 1000)
+    latencies.sort()
+    return {
+        "p50": statistics.median(latencies),
+        "p95": latencies[int(len(latencies) * 0.95) - 1],
+        "p99": latencies[int(len(latencies) * 0.99) - 1],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default=settings.sql_alchemy_database_url)
+    parser.add_argument("--rows", type=int, default=10_000_000)
+    parser.add_argument("--identifiers", type=int, default=100_000)
+    parser.add_argument("-n", "--lookups", type=int, default=1000)
+    parser.add_argument("--skip-seed", action="store_true")
+    args = parser.parse_args()
+
+    engine = create_engine(args.url)
+    with engine.connect() as connection:
+        if not args.skip_seed:
+            seed(connection, args.rows, args.identifiers)
+        print(f"{'variant':<10}{'date':<8}{'p50 ms':>10}{'p95 ms':>10}"
+              f"{'p99 ms':>10}")
+        for name, query in VARIANTS.items():
+            for label, check_for_dt in CHECK_DATES.items():
+                result = measure(
+                    connection, query, check_for_dt, args.identifiers,
+                    args.lookups,
+                )
+                print(
+                    f"{name:<10}{label:<8}{result['p50']:>10.2f}"
+                    f"{result['p95']:>10.2f}{result['p99']:>10.2f}",
+                )
+
+
+if __name__ == "__main__":
+    main()
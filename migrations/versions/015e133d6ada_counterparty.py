@@ -0,0 +1,155 @@
+"""counterparty
+
+Revision ID: 015e133d6ada
+Revises: 06c6ab21709d
+Create Date: 2026-10-18 02:51:36.907410
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '015e133d6ada'
+down_revision = '06c6ab21709d'
+branch_labels = None
+depends_on = None
+
+IDENTIFIERS = ('inn', 'ogrn', 'sap_num')
+
+
+def _has_btree_gist():
+    return op.get_bind().execute(sa.text(
+        "SELECT 1 FROM pg_extension WHERE extname = 'btree_gist'"
+    )).scalar()
+
+
+def upgrade() -> None:
+    # Missing identifiers are stored as '' so that the triple is unique.
+    op.create_table('counterparty',
+    sa.Column('id', sa.BigInteger(), sa.Identity(), nullable=False),
+    sa.Column('inn', sa.String(length=60), server_default='', nullable=False),
+    sa.Column('ogrn', sa.String(length=60), server_default='', nullable=False),
+    sa.Column('sap_num', sa.String(length=20), server_default='', nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('inn', 'ogrn', 'sap_num', name='uq_counterparty_identifiers')
+    )
+    op.create_index('ix_counterparty_ogrn', 'counterparty', ['ogrn'])
+    op.create_index('ix_counterparty_sap_num', 'counterparty', ['sap_num'])
+
+    op.add_column('request', sa.Column(
+        'counterparty_id', sa.BigInteger(), nullable=True,
+    ))
+    # Writers that do not resolve the counterparty themselves.
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION request_counterparty_fill()
+        RETURNS trigger AS $$
+        BEGIN
+            INSERT INTO counterparty (inn, ogrn, sap_num)
+            VALUES (
+                COALESCE(NEW.inn, ''),
+                COALESCE(NEW.ogrn, ''),
+                COALESCE(NEW.sap_num, '')
+            )
+            ON CONFLICT (inn, ogrn, sap_num)
+            DO UPDATE SET inn = EXCLUDED.inn
+            RETURNING id INTO NEW.counterparty_id;
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER request_counterparty
+        BEFORE INSERT ON request
+        FOR EACH ROW WHEN (NEW.counterparty_id IS NULL)
+        EXECUTE FUNCTION request_counterparty_fill()
+        """
+    )
+
+    # Backfill the history.
+    op.execute(
+        """
+        INSERT INTO counterparty (inn, ogrn, sap_num)
+        SELECT DISTINCT
+            COALESCE(inn, ''), COALESCE(ogrn, ''), COALESCE(sap_num, '')
+        FROM request
+        ON CONFLICT DO NOTHING
+        """
+    )
+    op.execute(
+        """
+        UPDATE request r SET counterparty_id = c.id
+        FROM counterparty c
+        WHERE r.counterparty_id IS NULL
+        AND c.inn = COALESCE(r.inn, '')
+        AND c.ogrn = COALESCE(r.ogrn, '')
+        AND c.sap_num = COALESCE(r.sap_num, '')
+        """
+    )
+    op.alter_column('request', 'counterparty_id', nullable=False)
+    op.create_foreign_key(
+        'request_counterparty_id_fkey', 'request', 'counterparty',
+        ['counterparty_id'], ['id'],
+    )
+
+    # CONCURRENTLY cannot run inside a transaction block.
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_request_counterparty_validity', 'request',
+            ['counterparty_id', 'start_at', 'end_at'],
+            postgresql_concurrently=True,
+        )
+        # Without btree_gist, the btree index above bounds the range.
+        if _has_btree_gist():
+            op.create_index(
+                'ix_request_counterparty_validity_gist', 'request',
+                ['counterparty_id', 'validity'],
+                postgresql_using='gist',
+                postgresql_concurrently=True,
+            )
+        # Replaced by the integer key indexes above.
+        for name in IDENTIFIERS:
+            op.execute(
+                f'DROP INDEX CONCURRENTLY IF EXISTS ix_request_{name}_validity'
+            )
+            op.execute(
+                'DROP INDEX CONCURRENTLY IF EXISTS '
+                f'ix_request_{name}_validity_gist'
+            )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name in IDENTIFIERS:
+            op.create_index(
+                f'ix_request_{name}_validity', 'request',
+                [name, 'start_at', 'end_at'],
+                postgresql_concurrently=True,
+            )
+            if _has_btree_gist():
+                op.create_index(
+                    f'ix_request_{name}_validity_gist', 'request',
+                    [name, 'validity'],
+                    postgresql_using='gist',
+                    postgresql_concurrently=True,
+                )
+        op.execute(
+            'DROP INDEX CONCURRENTLY IF EXISTS '
+            'ix_request_counterparty_validity_gist'
+        )
+        op.drop_index(
+            'ix_request_counterparty_validity', table_name='request',
+            postgresql_concurrently=True,
+        )
+    op.execute('DROP TRIGGER IF EXISTS request_counterparty ON request')
+    op.execute('DROP FUNCTION IF EXISTS request_counterparty_fill()')
+    op.drop_constraint(
+        'request_counterparty_id_fkey', 'request', type_='foreignkey',
+    )
+    op.drop_column('request', 'counterparty_id')
+    op.drop_index('ix_counterparty_sap_num', table_name='counterparty')
+    op.drop_index('ix_counterparty_ogrn', table_name='counterparty')
+    op.drop_table('counterparty')
@@ -0,0 +1,39 @@
+"""request change seq
+
+Revision ID: 06c6ab21709d
+Revises: 93ea84d0169a
+Create Date: 2026-10-18 02:15:08.644172
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '06c6ab21709d'
+down_revision = '93ea84d0169a'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # A constant default does not rewrite the table; existing requests
+    # come first in the feed, ordered by id.
+    op.add_column('request', sa.Column(
+        'change_seq', sa.BigInteger(), server_default='0', nullable=False,
+    ))
+    # CONCURRENTLY cannot run inside a transaction block.
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_request_change_seq', 'request', ['change_seq', 'id'],
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_request_change_seq', table_name='request',
+            postgresql_concurrently=True,
+        )
+    op.drop_column('request', 'change_seq')
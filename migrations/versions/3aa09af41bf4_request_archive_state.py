@@ -0,0 +1,35 @@
+"""request archive state
+
+Revision ID: 3aa09af41bf4
+Revises: 5e7273564bbe
+Create Date: 2026-10-18 05:03:41.927364
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3aa09af41bf4'
+down_revision = '5e7273564bbe'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('request_archive_state',
+    sa.Column('id', sa.SmallInteger(), nullable=False),
+    sa.Column('archived_before', sa.TIMESTAMP(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    # Partitions archived so far only hold requests ended before their
+    # upper bound, which is not stored, so the latest end_at stands in.
+    op.execute(
+        "INSERT INTO request_archive_state (id, archived_before) "
+        "SELECT 1, max(end_at) + interval '1 microsecond' "
+        "FROM request_archive"
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('request_archive_state')
@@ -0,0 +1,63 @@
+"""check indexes
+
+Revision ID: 43f2d84dc760
+Revises: bb00a06d8282
+Create Date: 2026-10-17 21:27:24.118342
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '43f2d84dc760'
+down_revision = 'bb00a06d8282'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # CONCURRENTLY cannot run inside a transaction block.
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_request_inn_validity', 'request',
+            ['inn', 'start_at', 'end_at'],
+            postgresql_concurrently=True,
+        )
+        op.create_index(
+            'ix_request_ogrn_validity', 'request',
+            ['ogrn', 'start_at', 'end_at'],
+            postgresql_concurrently=True,
+        )
+        op.create_index(
+            'ix_request_sap_num_validity', 'request',
+            ['sap_num', 'start_at', 'end_at'],
+            postgresql_concurrently=True,
+        )
+        op.create_index(
+            'ix_request_detail_request_id_full_doc', 'request_detail',
+            ['request_id'],
+            postgresql_where=sa.text("workflow_code IN ('FULL', 'DOC')"),
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_request_detail_request_id_full_doc',
+            table_name='request_detail',
+            postgresql_concurrently=True,
+        )
+        op.drop_index(
+            'ix_request_sap_num_validity', table_name='request',
+            postgresql_concurrently=True,
+        )
+        op.drop_index(
+            'ix_request_ogrn_validity', table_name='request',
+            postgresql_concurrently=True,
+        )
+        op.drop_index(
+            'ix_request_inn_validity', table_name='request',
+            postgresql_concurrently=True,
+        )
@@ -0,0 +1,30 @@
+"""request archive change seq index
+
+Revision ID: 4769a95a2f11
+Revises: 3aa09af41bf4
+Create Date: 2026-10-18 06:12:37.518204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4769a95a2f11'
+down_revision = '3aa09af41bf4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # CONCURRENTLY is not supported on partitioned tables.
+    op.create_index(
+        'ix_request_archive_change_seq', 'request_archive',
+        ['change_seq', 'id'], unique=False,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(
+        'ix_request_archive_change_seq', table_name='request_archive',
+    )
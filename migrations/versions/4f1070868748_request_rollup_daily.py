@@ -0,0 +1,91 @@
+"""request rollup daily
+
+Revision ID: 4f1070868748
+Revises: 862cc21720a3
+Create Date: 2026-10-17 23:52:41.731406
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4f1070868748'
+down_revision = '862cc21720a3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('request_rollup_daily',
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('from_system', sa.SmallInteger(), nullable=False),
+    sa.Column('workflow_code', sa.String(), nullable=False),
+    sa.Column('is_resident', sa.Boolean(), nullable=False),
+    sa.Column('blocks', sa.BigInteger(), nullable=False),
+    sa.Column('unblocks', sa.BigInteger(), nullable=False),
+    sa.PrimaryKeyConstraint(
+        'day', 'from_system', 'workflow_code', 'is_resident',
+    )
+    )
+    # Statement-level trigger: a /block adds one upsert per workflow and a
+    # COPY chunk one per group instead of one per row. Groups are upserted
+    # in key order so concurrent writers lock rollup rows consistently.
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION request_rollup_daily_apply()
+        RETURNS trigger AS $$
+        BEGIN
+            INSERT INTO request_rollup_daily AS d (
+                day, from_system, workflow_code, is_resident,
+                blocks, unblocks
+            )
+            SELECT
+                r.created_at::date, r.from_system, n.workflow_code,
+                r.is_resident,
+                count(*) FILTER (WHERE r.blocking),
+                count(*) FILTER (WHERE NOT r.blocking)
+            FROM new_details n
+            JOIN request r ON r.id = n.request_id
+            GROUP BY 1, 2, 3, 4
+            ORDER BY 1, 2, 3, 4
+            ON CONFLICT (day, from_system, workflow_code, is_resident)
+            DO UPDATE SET
+                blocks = d.blocks + EXCLUDED.blocks,
+                unblocks = d.unblocks + EXCLUDED.unblocks;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER request_detail_rollup_daily
+        AFTER INSERT ON request_detail
+        REFERENCING NEW TABLE AS new_details
+        FOR EACH STATEMENT EXECUTE FUNCTION request_rollup_daily_apply()
+        """
+    )
+    op.execute(
+        """
+        INSERT INTO request_rollup_daily (
+            day, from_system, workflow_code, is_resident, blocks, unblocks
+        )
+        SELECT
+            r.created_at::date, r.from_system, rd.workflow_code,
+            r.is_resident,
+            count(*) FILTER (WHERE r.blocking),
+            count(*) FILTER (WHERE NOT r.blocking)
+        FROM request_detail rd
+        JOIN request r ON r.id = rd.request_id
+        GROUP BY 1, 2, 3, 4
+        """
+    )
+
+
+def downgrade() -> None:
+    op.execute(
+        "DROP TRIGGER IF EXISTS request_detail_rollup_daily ON request_detail"
+    )
+    op.execute("DROP FUNCTION IF EXISTS request_rollup_daily_apply()")
+    op.drop_table('request_rollup_daily')
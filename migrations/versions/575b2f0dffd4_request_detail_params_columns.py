@@ -0,0 +1,65 @@
+"""request detail params columns
+
+Revision ID: 575b2f0dffd4
+Revises: 4f1070868748
+Create Date: 2026-10-18 00:31:12.558203
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '575b2f0dffd4'
+down_revision = '4f1070868748'
+branch_labels = None
+depends_on = None
+
+TEXT_PARAMS = ('name_object', 'contract', 'doc_num', 'balance_unit', 'account')
+
+# Partial indexes: each key is only looked up for its own workflow.
+INDEXES = (
+    ('ix_request_detail_name_object', 'name_object', 'DOC'),
+    ('ix_request_detail_contract', 'contract', 'DOC'),
+    ('ix_request_detail_doc_num', 'doc_num', 'DOC'),
+    ('ix_request_detail_max_sum', 'max_sum', 'SUM'),
+    ('ix_request_detail_balance_unit', 'balance_unit', 'UNIT'),
+    ('ix_request_detail_account', 'account', 'ACC'),
+)
+
+
+def upgrade() -> None:
+    # Adding STORED generated columns rewrites request_detail once.
+    for name in TEXT_PARAMS:
+        op.add_column('request_detail', sa.Column(
+            name, sa.Text(),
+            sa.Computed(f"params ->> '{name}'", persisted=True),
+            nullable=True,
+        ))
+    op.add_column('request_detail', sa.Column(
+        'max_sum', sa.Numeric(),
+        sa.Computed("(params ->> 'max_sum')::numeric", persisted=True),
+        nullable=True,
+    ))
+    # CONCURRENTLY cannot run inside a transaction block.
+    with op.get_context().autocommit_block():
+        for index, column, workflow_code in INDEXES:
+            op.create_index(
+                index, 'request_detail', [column],
+                postgresql_where=sa.text(
+                    f"workflow_code = '{workflow_code}'"
+                ),
+                postgresql_concurrently=True,
+            )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for index, _, _ in INDEXES:
+            op.drop_index(
+                index, table_name='request_detail',
+                postgresql_concurrently=True,
+            )
+    op.drop_column('request_detail', 'max_sum')
+    for name in reversed(TEXT_PARAMS):
+        op.drop_column('request_detail', name)
@@ -0,0 +1,389 @@
+"""request partitions
+
+Revision ID: 5e7273564bbe
+Revises: 015e133d6ada
+Create Date: 2026-10-18 04:12:08.318275
+
+"""
+from datetime import date
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '5e7273564bbe'
+down_revision = '015e133d6ada'
+branch_labels = None
+depends_on = None
+
+# Monthly partitions created ahead of the current month; later ones are
+# added by app.partitions.ensure_partitions.
+MONTHS_AHEAD = 12
+# Requests without an explicit end_at never expire and stay together.
+OPEN_FROM = '9999-01-01'
+
+REQUEST_COLUMNS = (
+    'id', 'is_resident', 'inn', 'ogrn', 'in_sap', 'sap_num',
+    'counterparty_id', 'mdm_id', 'blocking', 'from_system', 'created_at',
+    'created_by', 'approved_at', 'approved_by', 'start_at', 'end_at',
+    'description', 'change_seq',
+)
+DETAIL_COLUMNS = ('id', 'request_id', 'workflow_code', 'params')
+
+TEXT_PARAMS = ('name_object', 'contract', 'doc_num', 'balance_unit', 'account')
+PARAM_INDEXES = (
+    ('ix_request_detail_name_object', 'name_object', 'DOC'),
+    ('ix_request_detail_contract', 'contract', 'DOC'),
+    ('ix_request_detail_doc_num', 'doc_num', 'DOC'),
+    ('ix_request_detail_max_sum', 'max_sum', 'SUM'),
+    ('ix_request_detail_balance_unit', 'balance_unit', 'UNIT'),
+    ('ix_request_detail_account', 'account', 'ACC'),
+)
+
+BLOCK_STATE_UPSERT = """
+    CREATE OR REPLACE FUNCTION counterparty_block_state_upsert()
+    RETURNS trigger AS $$
+    BEGIN
+        INSERT INTO counterparty_block_state AS s (
+            id_type, id_value, request_id, blocking,
+            created_at, start_at, end_at
+        )
+        SELECT
+            k.id_type, k.id_value, r.id, r.blocking,
+            r.created_at, r.start_at, r.end_at
+        FROM request r
+        CROSS JOIN LATERAL (
+            VALUES ('inn', r.inn), ('ogrn', r.ogrn),
+                   ('sap_num', r.sap_num)
+        ) AS k(id_type, id_value)
+        WHERE r.id = NEW.request_id{match} AND k.id_value <> ''
+        ON CONFLICT (id_type, id_value) DO UPDATE SET
+            request_id = EXCLUDED.request_id,
+            blocking = EXCLUDED.blocking,
+            created_at = EXCLUDED.created_at,
+            start_at = EXCLUDED.start_at,
+            end_at = EXCLUDED.end_at
+        WHERE (EXCLUDED.created_at, EXCLUDED.request_id)
+            > (s.created_at, s.request_id);
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql
+"""
+
+ROLLUP_DAILY_APPLY = """
+    CREATE OR REPLACE FUNCTION request_rollup_daily_apply()
+    RETURNS trigger AS $$
+    BEGIN
+        INSERT INTO request_rollup_daily AS d (
+            day, from_system, workflow_code, is_resident,
+            blocks, unblocks
+        )
+        SELECT
+            r.created_at::date, r.from_system, n.workflow_code,
+            r.is_resident,
+            count(*) FILTER (WHERE r.blocking),
+            count(*) FILTER (WHERE NOT r.blocking)
+        FROM new_details n
+        JOIN request r ON r.id = n.request_id{match}
+        GROUP BY 1, 2, 3, 4
+        ORDER BY 1, 2, 3, 4
+        ON CONFLICT (day, from_system, workflow_code, is_resident)
+        DO UPDATE SET
+            blocks = d.blocks + EXCLUDED.blocks,
+            unblocks = d.unblocks + EXCLUDED.unblocks;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql
+"""
+
+
+def _has_btree_gist():
+    return op.get_bind().execute(sa.text(
+        "SELECT 1 FROM pg_extension WHERE extname = 'btree_gist'"
+    )).scalar()
+
+
+def _add_months(month, months):
+    month_index = month.month - 1 + months
+    return date(month.year + month_index // 12, month_index % 12 + 1, 1)
+
+
+def _id_column(sequence):
+    if sequence is None:
+        return sa.Column('id', sa.BigInteger(), nullable=False)
+    return sa.Column('id', sa.BigInteger(), server_default=sa.text(
+        f"nextval('{sequence}'::regclass)"
+    ), nullable=False)
+
+
+def _request_columns(sequence='request_id_seq'):
+    return [
+        _id_column(sequence),
+        sa.Column('is_resident', sa.Boolean(), nullable=False),
+        sa.Column('inn', sa.String(length=60), nullable=True),
+        sa.Column('ogrn', sa.String(length=60), nullable=True),
+        sa.Column('in_sap', sa.Boolean(), nullable=False),
+        sa.Column('sap_num', sa.String(length=20), nullable=True),
+        sa.Column('counterparty_id', sa.BigInteger(), nullable=False),
+        sa.Column('mdm_id', sa.String(length=20), nullable=True),
+        sa.Column('blocking', sa.Boolean(), nullable=False),
+        sa.Column('from_system', sa.SmallInteger(), nullable=False),
+        sa.Column('created_at', sa.TIMESTAMP(), nullable=False),
+        sa.Column('created_by', sa.String(length=30), nullable=False),
+        sa.Column('approved_at', sa.TIMESTAMP(), nullable=True),
+        sa.Column('approved_by', sa.String(length=30), nullable=True),
+        sa.Column('start_at', sa.TIMESTAMP(), nullable=False),
+        sa.Column('end_at', sa.TIMESTAMP(), nullable=False),
+        sa.Column('validity', postgresql.TSRANGE(), sa.Computed(
+            "tsrange(start_at, end_at, '[]')", persisted=True,
+        ), nullable=False),
+        sa.Column('description', sa.Text(), nullable=True),
+        sa.Column('change_seq', sa.BigInteger(), server_default=sa.text(
+            '0'
+        ), nullable=False),
+    ]
+
+
+def _detail_columns(partitioned, sequence='request_detail_id_seq'):
+    columns = [
+        _id_column(sequence),
+        sa.Column('request_id', sa.BigInteger(), nullable=False),
+        sa.Column('workflow_code', sa.String(), nullable=False),
+        sa.Column(
+            'params', postgresql.JSONB(astext_type=sa.Text()), nullable=True,
+        ),
+        *(
+            sa.Column(name, sa.Text(), sa.Computed(
+                f"params ->> '{name}'", persisted=True,
+            ), nullable=True)
+            for name in TEXT_PARAMS
+        ),
+        sa.Column('max_sum', sa.Numeric(), sa.Computed(
+            "(params ->> 'max_sum')::numeric", persisted=True,
+        ), nullable=True),
+    ]
+    if partitioned:
+        # The partition key of request, which details are partitioned by
+        # as well so that a month of both can be detached together.
+        columns.insert(2, sa.Column(
+            'request_end_at', sa.TIMESTAMP(), nullable=False,
+        ))
+    return columns
+
+
+def _create_partitions(table, parent):
+    first = date.today().replace(day=1)
+    op.execute(
+        f"CREATE TABLE {table}_p_history PARTITION OF {parent} "
+        f"FOR VALUES FROM (MINVALUE) TO ('{first}')"
+    )
+    for months in range(MONTHS_AHEAD + 1):
+        month = _add_months(first, months)
+        op.execute(
+            f"CREATE TABLE {table}_p{month:%Y%m} PARTITION OF {parent} "
+            f"FOR VALUES FROM ('{month}') TO ('{_add_months(month, 1)}')"
+        )
+    op.execute(
+        f"CREATE TABLE {table}_p_open PARTITION OF {parent} "
+        f"FOR VALUES FROM ('{OPEN_FROM}') TO (MAXVALUE)"
+    )
+    op.execute(
+        f"CREATE TABLE {table}_p_default PARTITION OF {parent} DEFAULT"
+    )
+
+
+def _add_keys(partitioned):
+    """Constraints, indexes and triggers of request and request_detail."""
+    request_key = ['id', 'end_at'] if partitioned else ['id']
+    detail_key = ['id', 'request_end_at'] if partitioned else ['id']
+    op.create_primary_key('request_pkey', 'request', request_key)
+    op.create_primary_key('request_detail_pkey', 'request_detail', detail_key)
+    op.create_foreign_key(
+        'request_from_system_fkey', 'request', 'dict_system',
+        ['from_system'], ['code'],
+    )
+    op.create_foreign_key(
+        'request_counterparty_id_fkey', 'request', 'counterparty',
+        ['counterparty_id'], ['id'],
+    )
+    op.create_foreign_key(
+        'request_detail_workflow_code_fkey', 'request_detail',
+        'dict_workflow', ['workflow_code'], ['code'],
+    )
+    if partitioned:
+        op.create_foreign_key(
+            'request_detail_request_id_fkey', 'request_detail', 'request',
+            ['request_id', 'request_end_at'], ['id', 'end_at'],
+        )
+    else:
+        op.create_foreign_key(
+            'request_detail_request_id_fkey', 'request_detail', 'request',
+            ['request_id'], ['id'],
+        )
+        op.create_foreign_key(
+            'counterparty_block_state_request_id_fkey',
+            'counterparty_block_state', 'request', ['request_id'], ['id'],
+        )
+        op.create_index('ix_request_id', 'request', ['id'], unique=True)
+        op.create_index(
+            'ix_request_detail_id', 'request_detail', ['id'], unique=True,
+        )
+
+    op.create_index('ix_request_created_at', 'request', ['created_at'])
+    op.create_index(
+        'ix_request_change_seq', 'request', ['change_seq', 'id'],
+    )
+    op.create_index(
+        'ix_request_counterparty_validity', 'request',
+        ['counterparty_id', 'start_at', 'end_at'],
+    )
+    if _has_btree_gist():
+        op.create_index(
+            'ix_request_counterparty_validity_gist', 'request',
+            ['counterparty_id', 'validity'],
+            postgresql_using='gist',
+        )
+    op.create_index(
+        'ix_request_detail_request_id_full_doc', 'request_detail',
+        ['request_id'],
+        postgresql_where=sa.text("workflow_code IN ('FULL', 'DOC')"),
+    )
+    for index, column, workflow_code in PARAM_INDEXES:
+        op.create_index(
+            index, 'request_detail', [column],
+            postgresql_where=sa.text(f"workflow_code = '{workflow_code}'"),
+        )
+
+    op.execute(
+        """
+        CREATE TRIGGER request_counterparty
+        BEFORE INSERT ON request
+        FOR EACH ROW WHEN (NEW.counterparty_id IS NULL)
+        EXECUTE FUNCTION request_counterparty_fill()
+        """
+    )
+    op.execute(BLOCK_STATE_UPSERT.format(
+        match=' AND r.end_at = NEW.request_end_at' if partitioned else '',
+    ))
+    op.execute(
+        """
+        CREATE TRIGGER request_detail_block_state
+        AFTER INSERT ON request_detail
+        FOR EACH ROW WHEN (NEW.workflow_code = 'FULL')
+        EXECUTE FUNCTION counterparty_block_state_upsert()
+        """
+    )
+    op.execute(ROLLUP_DAILY_APPLY.format(
+        match=' AND r.end_at = n.request_end_at' if partitioned else '',
+    ))
+    op.execute(
+        """
+        CREATE TRIGGER request_detail_rollup_daily
+        AFTER INSERT ON request_detail
+        REFERENCING NEW TABLE AS new_details
+        FOR EACH STATEMENT EXECUTE FUNCTION request_rollup_daily_apply()
+        """
+    )
+
+
+def _replace_tables(request_source, detail_source, partitioned):
+    """Rebuild request and request_detail, copying rows from the sources.
+
+    The copy holds an ACCESS EXCLUSIVE lock on both tables until commit.
+    """
+    for sequence in ('request_id_seq', 'request_detail_id_seq'):
+        op.execute(f'ALTER SEQUENCE {sequence} OWNED BY NONE')
+
+    if partitioned:
+        op.create_table(
+            'request_new', *_request_columns(),
+            postgresql_partition_by='RANGE (end_at)',
+        )
+        op.create_table(
+            'request_detail_new', *_detail_columns(True),
+            postgresql_partition_by='RANGE (request_end_at)',
+        )
+        _create_partitions('request', 'request_new')
+        _create_partitions('request_detail', 'request_detail_new')
+    else:
+        op.create_table('request_new', *_request_columns())
+        op.create_table('request_detail_new', *_detail_columns(False))
+
+    columns = ', '.join(REQUEST_COLUMNS)
+    op.execute(
+        f"INSERT INTO request_new ({columns}) "
+        f"SELECT {columns} FROM ({request_source}) r"
+    )
+    columns = ', '.join(DETAIL_COLUMNS)
+    if partitioned:
+        op.execute(
+            f"INSERT INTO request_detail_new ({columns}, request_end_at) "
+            f"SELECT {', '.join(f'rd.{c}' for c in DETAIL_COLUMNS)}, "
+            "r.end_at "
+            f"FROM ({detail_source}) rd "
+            "JOIN request_new r ON r.id = rd.request_id"
+        )
+    else:
+        op.execute(
+            f"INSERT INTO request_detail_new ({columns}) "
+            f"SELECT {columns} FROM ({detail_source}) rd"
+        )
+
+    op.execute('DROP TABLE request_detail, request')
+    op.rename_table('request_new', 'request')
+    op.rename_table('request_detail_new', 'request_detail')
+    op.execute('ALTER SEQUENCE request_id_seq OWNED BY request.id')
+    op.execute(
+        'ALTER SEQUENCE request_detail_id_seq OWNED BY request_detail.id'
+    )
+    _add_keys(partitioned)
+
+
+def upgrade() -> None:
+    # counterparty_block_state is a projection rebuilt from request, and a
+    # reference to request would keep expired partitions from detaching.
+    op.drop_constraint(
+        'counterparty_block_state_request_id_fkey',
+        'counterparty_block_state', type_='foreignkey',
+    )
+    _replace_tables('TABLE request', 'TABLE request_detail', True)
+    # validity is a generated column of the new table, and the trigger
+    # that filled it went with the old one.
+    op.execute('DROP FUNCTION IF EXISTS request_validity_fill()')
+
+    # Detached partitions are attached here by
+    # app.partitions.archive_partitions.
+    op.create_table(
+        'request_archive',
+        *_request_columns(sequence=None),
+        sa.PrimaryKeyConstraint('id', 'end_at'),
+        postgresql_partition_by='RANGE (end_at)',
+    )
+    op.create_index(
+        'ix_request_archive_counterparty_validity', 'request_archive',
+        ['counterparty_id', 'start_at', 'end_at'],
+    )
+    op.create_table(
+        'request_detail_archive',
+        *_detail_columns(True, sequence=None),
+        sa.PrimaryKeyConstraint('id', 'request_end_at'),
+        postgresql_partition_by='RANGE (request_end_at)',
+    )
+    op.create_index(
+        'ix_request_detail_archive_request_id_full_doc',
+        'request_detail_archive', ['request_id'],
+        postgresql_where=sa.text("workflow_code IN ('FULL', 'DOC')"),
+    )
+
+
+def downgrade() -> None:
+    _replace_tables(
+        'SELECT * FROM request UNION ALL SELECT * FROM request_archive',
+        'SELECT * FROM request_detail '
+        'UNION ALL SELECT * FROM request_detail_archive',
+        False,
+    )
+    op.drop_table('request_detail_archive')
+    op.drop_table('request_archive')
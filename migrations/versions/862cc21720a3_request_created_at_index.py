@@ -0,0 +1,33 @@
+"""request created_at index
+
+Revision ID: 862cc21720a3
+Revises: f97e88f022e1
+Create Date: 2026-10-17 23:18:05.402117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '862cc21720a3'
+down_revision = 'f97e88f022e1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # CONCURRENTLY cannot run inside a transaction block.
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_request_created_at', 'request', ['created_at'],
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_request_created_at', table_name='request',
+            postgresql_concurrently=True,
+        )
@@ -0,0 +1,98 @@
+"""counterparty block state
+
+Revision ID: 87301486ec28
+Revises: 43f2d84dc760
+Create Date: 2026-10-17 21:58:03.512806
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '87301486ec28'
+down_revision = '43f2d84dc760'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('counterparty_block_state',
+    sa.Column('id_type', sa.String(length=7), nullable=False),
+    sa.Column('id_value', sa.String(length=60), nullable=False),
+    sa.Column('request_id', sa.BigInteger(), nullable=False),
+    sa.Column('blocking', sa.Boolean(), nullable=False),
+    sa.Column('created_at', sa.TIMESTAMP(), nullable=False),
+    sa.Column('start_at', sa.TIMESTAMP(), nullable=False),
+    sa.Column('end_at', sa.TIMESTAMP(), nullable=False),
+    sa.ForeignKeyConstraint(['request_id'], ['request.id'], ),
+    sa.PrimaryKeyConstraint('id_type', 'id_value')
+    )
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION counterparty_block_state_upsert()
+        RETURNS trigger AS $$
+        BEGIN
+            INSERT INTO counterparty_block_state AS s (
+                id_type, id_value, request_id, blocking,
+                created_at, start_at, end_at
+            )
+            SELECT
+                k.id_type, k.id_value, r.id, r.blocking,
+                r.created_at, r.start_at, r.end_at
+            FROM request r
+            CROSS JOIN LATERAL (
+                VALUES ('inn', r.inn), ('ogrn', r.ogrn),
+                       ('sap_num', r.sap_num)
+            ) AS k(id_type, id_value)
+            WHERE r.id = NEW.request_id AND k.id_value <> ''
+            ON CONFLICT (id_type, id_value) DO UPDATE SET
+                request_id = EXCLUDED.request_id,
+                blocking = EXCLUDED.blocking,
+                created_at = EXCLUDED.created_at,
+                start_at = EXCLUDED.start_at,
+                end_at = EXCLUDED.end_at
+            WHERE (EXCLUDED.created_at, EXCLUDED.request_id)
+                > (s.created_at, s.request_id);
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER request_detail_block_state
+        AFTER INSERT ON request_detail
+        FOR EACH ROW WHEN (NEW.workflow_code = 'FULL')
+        EXECUTE FUNCTION counterparty_block_state_upsert()
+        """
+    )
+    op.execute(
+        """
+        INSERT INTO counterparty_block_state (
+            id_type, id_value, request_id, blocking,
+            created_at, start_at, end_at
+        )
+        SELECT DISTINCT ON (k.id_type, k.id_value)
+            k.id_type, k.id_value, r.id, r.blocking,
+            r.created_at, r.start_at, r.end_at
+        FROM request r
+        CROSS JOIN LATERAL (
+            VALUES ('inn', r.inn), ('ogrn', r.ogrn), ('sap_num', r.sap_num)
+        ) AS k(id_type, id_value)
+        WHERE k.id_value <> ''
+        AND EXISTS (
+            SELECT 1 FROM request_detail rd
+            WHERE rd.request_id = r.id AND rd.workflow_code = 'FULL'
+        )
+        ORDER BY k.id_type, k.id_value, r.created_at DESC, r.id DESC
+        """
+    )
+
+
+def downgrade() -> None:
+    op.execute(
+        "DROP TRIGGER IF EXISTS request_detail_block_state ON request_detail"
+    )
+    op.execute("DROP FUNCTION IF EXISTS counterparty_block_state_upsert()")
+    op.drop_table('counterparty_block_state')
@@ -0,0 +1,44 @@
+"""change feed
+
+Revision ID: 93ea84d0169a
+Revises: d42e884b8a81
+Create Date: 2026-10-18 01:42:19.530866
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '93ea84d0169a'
+down_revision = 'd42e884b8a81'
+branch_labels = None
+depends_on = None
+
+DICT_VERSION_BUMP = """
+    CREATE OR REPLACE FUNCTION dict_version_bump()
+    RETURNS trigger AS $$
+    BEGIN
+        UPDATE dict_version SET version = version + 1 WHERE id = 1;{notify}
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql
+"""
+
+
+def upgrade() -> None:
+    op.create_table('change_feed',
+    sa.Column('id', sa.SmallInteger(), nullable=False),
+    sa.Column('seq', sa.BigInteger(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.execute("INSERT INTO change_feed (id, seq) VALUES (1, 0)")
+    # Listeners reload their dictionary snapshot on this channel.
+    op.execute(DICT_VERSION_BUMP.format(
+        notify="\n        PERFORM pg_notify('dict_changes', '');",
+    ))
+
+
+def downgrade() -> None:
+    op.execute(DICT_VERSION_BUMP.format(notify=""))
+    op.drop_table('change_feed')
@@ -0,0 +1,114 @@
+"""request validity range
+
+Revision ID: d42e884b8a81
+Revises: 575b2f0dffd4
+Create Date: 2026-10-18 01:04:47.281903
+
+"""
+import logging
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = 'd42e884b8a81'
+down_revision = '575b2f0dffd4'
+branch_labels = None
+depends_on = None
+
+logger = logging.getLogger('alembic.runtime.migration')
+
+INDEXES = (
+    ('ix_request_inn_validity_gist', 'inn'),
+    ('ix_request_ogrn_validity_gist', 'ogrn'),
+    ('ix_request_sap_num_validity_gist', 'sap_num'),
+)
+# Rows backfilled per transaction.
+BATCH_SIZE = 10000
+
+# '[]' keeps the inclusive bounds of BETWEEN start_at AND end_at.
+VALIDITY_FILL = """
+    CREATE OR REPLACE FUNCTION request_validity_fill()
+    RETURNS trigger AS $$
+    BEGIN
+        NEW.validity := tsrange(NEW.start_at, NEW.end_at, '[]');
+        RETURN NEW;
+    END;
+    $$ LANGUAGE plpgsql
+"""
+
+
+def upgrade() -> None:
+    # A generated STORED column would rewrite request under an ACCESS
+    # EXCLUSIVE lock. A nullable column is added in the catalog only; a
+    # trigger fills it for new writes and old rows are backfilled in
+    # batches, each in its own transaction.
+    op.add_column(
+        'request', sa.Column('validity', postgresql.TSRANGE(), nullable=True),
+    )
+    op.execute(VALIDITY_FILL)
+    op.execute(
+        """
+        CREATE TRIGGER request_validity
+        BEFORE INSERT OR UPDATE OF start_at, end_at ON request
+        FOR EACH ROW EXECUTE FUNCTION request_validity_fill()
+        """
+    )
+    bind = op.get_bind()
+    with op.get_context().autocommit_block():
+        low, high = bind.execute(
+            sa.text('SELECT min(id), max(id) FROM request')
+        ).one()
+        for start in range(low or 0, (high or 0) + 1, BATCH_SIZE):
+            bind.execute(
+                sa.text(
+                    "UPDATE request "
+                    "SET validity = tsrange(start_at, end_at, '[]') "
+                    "WHERE id >= :start AND id < :end AND validity IS NULL"
+                ),
+                {'start': start, 'end': start + BATCH_SIZE},
+            )
+        # The validated check lets SET NOT NULL skip its own full scan,
+        # and VALIDATE does not block writes.
+        op.execute(
+            'ALTER TABLE request ADD CONSTRAINT request_validity_not_null '
+            'CHECK (validity IS NOT NULL) NOT VALID'
+        )
+        op.execute(
+            'ALTER TABLE request VALIDATE CONSTRAINT request_validity_not_null'
+        )
+        op.alter_column('request', 'validity', nullable=False)
+        op.drop_constraint(
+            'request_validity_not_null', 'request', type_='check',
+        )
+
+    available = bind.execute(sa.text(
+        "SELECT 1 FROM pg_available_extensions WHERE name = 'btree_gist'"
+    )).scalar()
+    if not available:
+        # The btree (identifier, start_at, end_at) indexes then serve the
+        # range through their start_at and end_at bounds.
+        logger.warning(
+            'btree_gist is not available, validity is not indexed'
+        )
+        return
+    op.execute('CREATE EXTENSION IF NOT EXISTS btree_gist')
+    # CONCURRENTLY cannot run inside a transaction block.
+    with op.get_context().autocommit_block():
+        for index, column in INDEXES:
+            op.create_index(
+                index, 'request', [column, 'validity'],
+                postgresql_using='gist',
+                postgresql_concurrently=True,
+            )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for index, _ in INDEXES:
+            op.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {index}')
+    op.execute('DROP TRIGGER IF EXISTS request_validity ON request')
+    op.execute('DROP FUNCTION IF EXISTS request_validity_fill()')
+    op.drop_column('request', 'validity')
@@ -0,0 +1,60 @@
+"""dict version
+
+Revision ID: f97e88f022e1
+Revises: 87301486ec28
+Create Date: 2026-10-17 22:41:37.204519
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f97e88f022e1'
+down_revision = '87301486ec28'
+branch_labels = None
+depends_on = None
+
+DICT_TABLES = (
+    'dict_action',
+    'dict_doc_type',
+    'dict_operation',
+    'dict_system',
+    'dict_type_valid_action',
+    'dict_workflow',
+)
+
+
+def upgrade() -> None:
+    op.create_table('dict_version',
+    sa.Column('id', sa.SmallInteger(), nullable=False),
+    sa.Column('version', sa.BigInteger(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.execute("INSERT INTO dict_version (id, version) VALUES (1, 1)")
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION dict_version_bump()
+        RETURNS trigger AS $$
+        BEGIN
+            UPDATE dict_version SET version = version + 1 WHERE id = 1;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        """
+    )
+    for table in DICT_TABLES:
+        op.execute(
+            f"""
+            CREATE TRIGGER {table}_version
+            AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON {table}
+            FOR EACH STATEMENT EXECUTE FUNCTION dict_version_bump()
+            """
+        )
+
+
+def downgrade() -> None:
+    for table in DICT_TABLES:
+        op.execute(f"DROP TRIGGER IF EXISTS {table}_version ON {table}")
+    op.execute("DROP FUNCTION IF EXISTS dict_version_bump()")
+    op.drop_table('dict_version')
@@ -1,14 +1,19 @@
 """Test configuration file."""
+from datetime import datetime
+
 import pytest
 from alembic import command
 from alembic.config import Config
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine, text
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
 
+from app import models
 from app.app import app
 from app.config import settings
-from app.db import Base, get_db
+from app.db import Base, get_async_db, get_db
 
 engine = create_engine(settings.database_url_test)
 TestingSessionLocal = sessionmaker(
@@ -25,7 +30,79 @@ def override_get_db():
         db.close()
 
 
+# TestClient runs every request on a fresh event loop, so asyncpg
+# connections must not be pooled between requests.
+async_engine = create_async_engine(
+    settings.async_database_url_test, poolclass=NullPool,
+)
+TestingAsyncSessionLocal = async_sessionmaker(
+    async_engine, autoflush=False, expire_on_commit=False,
+)
+
+
+async def override_get_async_db():
+    """Override get_async_db function."""
+    async with TestingAsyncSessionLocal() as db:
+        yield db
+
+
 app.dependency_overrides[get_db] = override_get_db
+app.dependency_overrides[get_async_db] = override_get_async_db
+
+# Partitions, hot or archived, holding the requests with negative ids that
+# tests add and their details.
+LOCATION_QUERY = text(
+    """
+    SELECT r.id, r.tableoid::regclass::text, rd.tableoid::regclass::text
+    FROM (
+        SELECT id, end_at, tableoid FROM request
+        UNION ALL SELECT id, end_at, tableoid FROM request_archive
+    ) r
+    JOIN (
+        SELECT request_id, request_end_at, tableoid FROM request_detail
+        UNION ALL
+        SELECT request_id, request_end_at, tableoid
+        FROM request_detail_archive
+    ) rd ON rd.request_id = r.id AND rd.request_end_at = r.end_at
+    WHERE r.id < 0
+    ORDER BY r.id
+    """,
+)
+
+
+def add_request(
+    session,
+    request_id,
+    end_at,
+    start_at=datetime(1990, 1, 1),
+    created_at=datetime(2023, 1, 1),
+    blocking=True,
+):
+    """Add a request of testinn with one FULL detail."""
+    session.add(
+        models.Request(
+            id=request_id,
+            is_resident=False,
+            inn="testinn",
+            in_sap=False,
+            blocking=blocking,
+            from_system=0,
+            created_at=created_at,
+            created_by="tests",
+            start_at=start_at,
+            end_at=end_at,
+        ),
+    )
+    session.flush()
+    session.add(
+        models.RequestDetail(
+            id=request_id,
+            request_id=request_id,
+            request_end_at=end_at,
+            workflow_code="FULL",
+        ),
+    )
+    session.flush()
 
 
 @pytest.fixture(scope="session")
@@ -0,0 +1,179 @@
+"""Class for testing the archival of requests."""
+from datetime import datetime
+
+import app.archive as archive
+import app.partitions as partitions
+import app.queries as q
+import app.reports as reports
+import app.schemas as s
+from app.block_index import BlockIndex
+from tests.conftest import LOCATION_QUERY, add_request
+
+
+def check(session, check_for_dt):
+    """Blocking status of testinn for /check at a moment."""
+    row = session.execute(
+        q.CHECK_QUERY,
+        {
+            "inn": "testinn",
+            "ogrn": "",
+            "sap_num": "",
+            "contract": "contract",
+            "check_for_dt": check_for_dt,
+        },
+    ).first()
+    return bool(row and row.blocking and not row.doc_exempt)
+
+
+class TestArchive:
+    """Class for testing the archival of requests."""
+
+    def test_archive_expired(self, test_session):
+        """Expired requests move to the archive with their details."""
+        add_request(
+            test_session, -2, datetime(9999, 12, 31, 23, 59, 59),
+            start_at=datetime(2020, 1, 1),
+        )
+        add_request(
+            test_session, -1, datetime(2000, 1, 1),
+            start_at=datetime(1999, 1, 1),
+        )
+
+        after, archived = archive.archive_batch(
+            test_session, datetime(2023, 1, 1), -3, 2,
+        )
+        done = archive.archive_batch(
+            test_session, datetime(2023, 1, 1), -1, 2,
+        )
+        locations = test_session.execute(LOCATION_QUERY).all()
+        test_session.rollback()
+
+        assert (after, archived) == (-1, 1)
+        assert done[1] == 0
+        assert locations == [
+            (-2, "request_p_open", "request_detail_p_open"),
+            (
+                -1,
+                "request_archive_p_history",
+                "request_detail_archive_p_history",
+            ),
+        ]
+
+    def test_archive_superseded(self, test_session):
+        """Requests covered by a later one of the same kind are archived."""
+        add_request(
+            test_session, -3, datetime(2001, 1, 1),
+            start_at=datetime(1999, 1, 1),
+        )
+        add_request(
+            test_session, -2, datetime(2002, 1, 1),
+            start_at=datetime(1998, 1, 1),
+            created_at=datetime(2023, 1, 2), blocking=False,
+        )
+        add_request(
+            test_session, -1, datetime(2003, 1, 1),
+            start_at=datetime(1999, 6, 1), created_at=datetime(2023, 1, 3),
+        )
+
+        _, archived = archive.archive_batch(
+            test_session, datetime(1990, 1, 1), -4, 3,
+        )
+        locations = test_session.execute(LOCATION_QUERY).all()
+        test_session.rollback()
+
+        assert archived == 1
+        assert [partition for _, partition, _ in locations] == [
+            "request_archive_p_history",
+            "request_p_history",
+            "request_p_history",
+        ]
+
+    def test_archive_partitions_after_requests(self, test_session):
+        """A partition is completed next to requests archived before it."""
+        add_request(
+            test_session, -2, datetime(1999, 1, 1),
+            start_at=datetime(1998, 1, 1),
+        )
+        archive.archive_batch(test_session, datetime(1998, 6, 1), -3, 1)
+        add_request(
+            test_session, -1, datetime(2000, 1, 1),
+            start_at=datetime(1999, 1, 1),
+        )
+
+        archived = partitions.archive_partitions(test_session, datetime.now())
+        locations = test_session.execute(LOCATION_QUERY).all()
+        archived_before = test_session.scalar(q.ARCHIVED_BEFORE_QUERY)
+        test_session.rollback()
+
+        assert archived == ["request_p_history"]
+        assert [partition for _, partition, _ in locations] == [
+            "request_archive_p_history", "request_archive_p_history",
+        ]
+        assert archived_before <= datetime.now()
+
+    def test_check_falls_back_to_archive(self, test_session):
+        """/check reads the archive before archived_before."""
+        add_request(
+            test_session, -2, datetime(2010, 1, 1),
+            start_at=datetime(2000, 1, 1),
+        )
+        add_request(
+            test_session, -1, datetime(2020, 1, 1),
+            start_at=datetime(2015, 1, 1),
+            created_at=datetime(2023, 1, 2), blocking=False,
+        )
+        before = check(test_session, datetime(2005, 1, 1))
+
+        archive.archive_batch(test_session, datetime(2012, 1, 1), -3, 2)
+        hot_only = check(test_session, datetime(2005, 1, 1))
+        test_session.execute(
+            q.ADVANCE_ARCHIVED_BEFORE_QUERY, {"before": datetime(2012, 1, 1)},
+        )
+        archived = check(test_session, datetime(2005, 1, 1))
+        test_session.rollback()
+
+        assert before is True
+        assert hot_only is False
+        assert archived is True
+
+    def test_readers_include_archive(self, test_session):
+        """Reports and the change feed still return archived requests."""
+        add_request(
+            test_session, -2, datetime(2001, 1, 1),
+            start_at=datetime(1999, 1, 1),
+        )
+        add_request(
+            test_session, -1, datetime(2002, 1, 1),
+            start_at=datetime(1999, 1, 1), created_at=datetime(2023, 1, 2),
+        )
+        archive.archive_batch(test_session, datetime(1990, 1, 1), -3, 2)
+
+        report = test_session.execute(
+            reports.build_report_query(
+                s.ReportRequest(
+                    period_from=datetime(2023, 1, 1),
+                    period_to=datetime(2023, 1, 3),
+                ),
+            ),
+        ).all()
+        changes = test_session.execute(
+            q.CHANGES_QUERY, {"seq": -1, "id": 0, "limit": 1_000},
+        ).all()
+        locations = test_session.execute(LOCATION_QUERY).all()
+        test_session.rollback()
+
+        assert locations[0][1] == "request_archive_p_history"
+        assert sorted(
+            row.request_id for row in report if row.request_id < 0
+        ) == [-2, -1]
+        assert [row.id for row in changes if row.id < 0] == [-2, -1]
+
+    def test_block_index_covers(self):
+        """The index leaves moments before archived_before to the database."""
+        index = BlockIndex()
+        assert index.covers(datetime(2000, 1, 1))
+
+        index.archived_before = datetime(2012, 1, 1)
+        assert not index.covers(datetime(2000, 1, 1))
+        assert index.covers(datetime(2012, 1, 1))
+        assert index.covers(None)
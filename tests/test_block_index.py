@@ -0,0 +1,206 @@
+"""Class for testing the in-memory block index."""
+from datetime import datetime
+from types import SimpleNamespace
+
+from app.block_index import BlockIndex, timeline
+
+
+def make_request(request_id, blocking, created_at, start_at, end_at, **ids):
+    """Build a committed request stand-in."""
+    return SimpleNamespace(
+        id=request_id,
+        blocking=blocking,
+        created_at=created_at,
+        start_at=start_at,
+        end_at=end_at,
+        inn=ids.get("inn"),
+        ogrn=ids.get("ogrn"),
+        sap_num=ids.get("sap_num"),
+    )
+
+
+FULL = [{"workflow_code": "FULL", "params": {}}]
+
+
+class TestBlockIndex:
+    """Class for testing the in-memory block index."""
+
+    def setup_method(self):
+        self.index = BlockIndex()
+        self.index.loaded = True
+
+    def test_latest_created_at_wins(self):
+        """Later requests override earlier ones inside their window."""
+        self.index.add(
+            make_request(
+                1, True, datetime(2023, 1, 1),
+                datetime(2023, 1, 1), datetime(2023, 12, 31), inn="1",
+            ),
+            FULL,
+        )
+        self.index.add(
+            make_request(
+                2, False, datetime(2023, 2, 1),
+                datetime(2023, 3, 1), datetime(2023, 3, 31), inn="1",
+            ),
+            FULL,
+        )
+
+        def check(dt):
+            return self.index.is_blocking("1", None, None, None, dt)
+
+        assert check(datetime(2022, 12, 31)) is False
+        assert check(datetime(2023, 1, 1)) is True
+        assert check(datetime(2023, 3, 15)) is False
+        assert check(datetime(2023, 3, 31)) is False
+        assert check(datetime(2023, 4, 1)) is True
+        assert check(datetime(2023, 12, 31)) is True
+        assert check(datetime(2024, 1, 1)) is False
+        assert check(None) is False
+
+    def test_identifiers_are_combined(self):
+        """The latest row across inn, ogrn and sap_num decides."""
+        self.index.add(
+            make_request(
+                1, True, datetime(2023, 1, 1),
+                datetime(2000, 1, 1), datetime(2030, 1, 1), ogrn="2",
+            ),
+            FULL,
+        )
+        self.index.add(
+            make_request(
+                2, False, datetime(2023, 1, 2),
+                datetime(2000, 1, 1), datetime(2030, 1, 1), sap_num="3",
+            ),
+            FULL,
+        )
+        dt = datetime(2023, 6, 1)
+
+        assert self.index.is_blocking("", "2", "", None, dt) is True
+        assert self.index.is_blocking("", "2", "3", None, dt) is False
+
+    def test_doc_exemption(self):
+        """A DOC row for the contract lifts the block."""
+        self.index.add(
+            make_request(
+                1, True, datetime(2023, 1, 1),
+                datetime(2000, 1, 1), datetime(2030, 1, 1), inn="1",
+            ),
+            FULL,
+        )
+        self.index.add(
+            make_request(
+                2, False, datetime(2023, 1, 2),
+                datetime(2000, 1, 1), datetime(2030, 1, 1), inn="1",
+            ),
+            [{"workflow_code": "DOC", "params": {"name_object": "c-1"}}],
+        )
+        dt = datetime(2023, 6, 1)
+
+        assert self.index.is_blocking("1", None, None, "c-1", dt) is False
+        assert self.index.is_blocking("1", None, None, "c-2", dt) is True
+
+    def test_partial_workflows(self):
+        """SUM, OPER, UNIT and ACC rules block only matching checks."""
+        window = (datetime(2000, 1, 1), datetime(2030, 1, 1))
+        self.index.add(
+            make_request(1, True, datetime(2023, 1, 1), *window, inn="1"),
+            [
+                {"workflow_code": "SUM", "params": {"max_sum": 1000}},
+                {
+                    "workflow_code": "OPER",
+                    "params": {"operation_sap_code": ["P1", "P2"]},
+                },
+                {"workflow_code": "UNIT", "params": {"balance_unit": "BE1"}},
+                {"workflow_code": "ACC", "params": {"account": "60"}},
+            ],
+        )
+        dt = datetime(2023, 6, 1)
+
+        def check(**attributes):
+            return self.index.is_blocking(
+                "1", None, None, None, dt, **attributes,
+            )
+
+        assert check() is False
+        assert check(amount=1000) is False
+        assert check(amount=1001) is True
+        assert check(operation_sap_code="P2") is True
+        assert check(operation_sap_code="P3") is False
+        assert check(balance_unit="BE1") is True
+        assert check(balance_unit="BE2") is False
+        assert check(account="60") is True
+        assert check(amount=10, operation_sap_code="P3", account="61") is False
+
+        self.index.add(
+            make_request(2, False, datetime(2023, 2, 1), *window, inn="1"),
+            [
+                {
+                    "workflow_code": "OPER",
+                    "params": {"operation_sap_code": ["P2"]},
+                },
+            ],
+        )
+        assert check(operation_sap_code="P2") is False
+        assert check(operation_sap_code="P1") is True
+        assert check(amount=5000) is True
+
+    def test_timeline(self):
+        """Intervals merge equal neighbours and agree with point checks."""
+        self.index.add(
+            make_request(
+                1, True, datetime(2023, 1, 1),
+                datetime(2023, 1, 1), datetime(2023, 12, 31), inn="1",
+            ),
+            FULL,
+        )
+        self.index.add(
+            make_request(
+                2, False, datetime(2023, 2, 1),
+                datetime(2023, 3, 1), datetime(2023, 3, 31), inn="1",
+            ),
+            FULL,
+        )
+        self.index.add(
+            make_request(
+                3, True, datetime(2023, 3, 1),
+                datetime(2023, 3, 31), datetime(2023, 6, 30), ogrn="2",
+            ),
+            FULL,
+        )
+        date_from, date_to = datetime(2022, 1, 1), datetime(2024, 1, 1)
+
+        intervals = self.index.timeline(
+            "1", "2", None, None, date_from, date_to,
+        )
+
+        assert [(start, blocking) for start, _, blocking in intervals] == [
+            (date_from, False),
+            (datetime(2023, 1, 1), True),
+            (datetime(2023, 3, 1), False),
+            (datetime(2023, 3, 31), True),
+            (datetime(2023, 12, 31, 0, 0, 0, 1), False),
+        ]
+        assert intervals[-1][1] == date_to
+        for start, end, blocking in intervals:
+            for dt in (start, end):
+                assert self.index.is_blocking(
+                    "1", "2", None, None, dt,
+                ) is blocking
+        assert timeline([], None, date_from, date_to) == [
+            (date_from, date_to, False),
+        ]
+
+    def test_invalidate_during_load(self):
+        """A load overtaken by invalidate() is not installed."""
+        index = BlockIndex()
+
+        def execute(query):
+            index.invalidate()
+            return iter([])
+
+        index.load(
+            SimpleNamespace(execute=execute, scalar=lambda query: None),
+        )
+
+        assert index.loaded is False
@@ -0,0 +1,65 @@
+"""Class for testing the identifier Bloom filter."""
+from types import SimpleNamespace
+
+from app.bloom import BloomFilter, IdentifierFilter
+
+
+def make_session(rows):
+    """Build a session stand-in serving the filter load queries."""
+    return SimpleNamespace(
+        scalar=lambda query: len(rows),
+        execute=lambda query: iter(rows),
+    )
+
+
+class TestBloom:
+    """Class for testing the identifier Bloom filter."""
+
+    def test_no_false_negatives(self):
+        """Added items are always reported, misses stay near fp_rate."""
+        bloom = BloomFilter(1_000, 0.01)
+        for i in range(1_000):
+            bloom.add(f"inn:{i}")
+
+        assert all(f"inn:{i}" in bloom for i in range(1_000))
+        false_positives = sum(
+            f"ogrn:{i}" in bloom for i in range(10_000)
+        )
+        assert false_positives < 300
+        assert 0.005 < bloom.estimated_fp_rate() < 0.02
+
+    def test_identifier_filter(self):
+        """Misses on every identifier are definite and counted."""
+        identifiers = IdentifierFilter(0.01)
+        assert identifiers.is_definite_miss("1", None, None) is False
+
+        identifiers.load(make_session([("1", None, None), (None, "2", "")]))
+        identifiers.add(None, None, "3")
+
+        assert identifiers.is_definite_miss("1", None, None) is False
+        assert identifiers.is_definite_miss("", "2", "") is False
+        assert identifiers.is_definite_miss("9", "9", "3") is False
+        assert identifiers.is_definite_miss("2", "1", None) is True
+        stats = identifiers.stats()
+        assert stats["items"] == 3
+        assert stats["checks"] == 4
+        assert stats["definite_misses"] == 1
+        assert stats["fast_path_rate"] == 0.25
+
+        identifiers.invalidate()
+        assert identifiers.is_definite_miss("2", "1", None) is False
+
+    def test_invalidate_during_load(self):
+        """A load overtaken by invalidate() is not installed."""
+        identifiers = IdentifierFilter(0.01)
+
+        def execute(query):
+            identifiers.invalidate()
+            return iter([("1", None, None)])
+
+        identifiers.load(
+            SimpleNamespace(scalar=lambda query: 1, execute=execute),
+        )
+
+        assert identifiers.loaded is False
+        assert identifiers.is_definite_miss("2", None, None) is False
@@ -0,0 +1,72 @@
+"""Class for testing the /check result cache."""
+from datetime import datetime
+from types import SimpleNamespace
+
+from app.cache import CheckCache
+
+
+def make_check(inn="1", contract=None, check_for_dt=datetime(2023, 6, 1)):
+    """Build a check request stand-in."""
+    return SimpleNamespace(
+        inn=inn,
+        ogrn=None,
+        sap_num=None,
+        contract=contract,
+        check_for_dt=check_for_dt,
+    )
+
+
+class TestCheckCache:
+    """Class for testing the /check result cache."""
+
+    def setup_method(self):
+        self.cache = CheckCache(max_entries=2, ttl=60, bucket_seconds=60)
+
+    def test_hit_and_miss(self):
+        """Stored results are served and counted."""
+        assert self.cache.get(make_check()) is None
+        self.cache.put(make_check(), True)
+        assert self.cache.get(make_check()) is True
+        assert self.cache.stats()["hits"] == 1
+        assert self.cache.stats()["misses"] == 1
+
+    def test_lru_eviction(self):
+        """The least recently used entry is evicted first."""
+        self.cache.put(make_check("1"), True)
+        self.cache.put(make_check("2"), False)
+        self.cache.get(make_check("1"))
+        self.cache.put(make_check("3"), False)
+
+        assert self.cache.get(make_check("1")) is True
+        assert self.cache.get(make_check("2")) is None
+        assert self.cache.stats()["evictions"] == 1
+
+    def test_invalidate_by_identifier(self):
+        """Writes evict entries for the written identifiers only."""
+        self.cache.put(make_check("1"), True)
+        self.cache.put(make_check("2"), True)
+        self.cache.invalidate(inn="1")
+
+        assert self.cache.get(make_check("1")) is None
+        assert self.cache.get(make_check("2")) is True
+
+    def test_transition_boundary(self):
+        """Entries are not served past the next block transition."""
+        self.cache.put(
+            make_check(check_for_dt=datetime(2023, 6, 1, 10, 0, 0)),
+            False,
+            valid_until=datetime(2023, 6, 1, 10, 0, 30),
+        )
+
+        before = make_check(check_for_dt=datetime(2023, 6, 1, 10, 0, 29))
+        after = make_check(check_for_dt=datetime(2023, 6, 1, 10, 0, 30))
+        assert self.cache.get(before) is False
+        assert self.cache.get(after) is None
+
+    def test_stale_put_is_dropped(self):
+        """A result computed before an invalidation is not stored."""
+        version = self.cache.version
+        self.cache.invalidate(inn="1")
+        self.cache.put(make_check("1"), False, version=version)
+
+        assert self.cache.get(make_check("1")) is None
@@ -0,0 +1,97 @@
+"""Class for testing the LISTEN/NOTIFY change feed."""
+import asyncio
+import json
+
+import pytest
+
+import app.changes as changes
+import app.queries as q
+from app.changes import ChangeListener
+from app.config import settings
+from tests.conftest import TestingAsyncSessionLocal
+
+
+async def notify(**event):
+    """Publish an event as another worker would."""
+    async with TestingAsyncSessionLocal() as session:
+        if "seq" not in event:
+            event["seq"] = await session.scalar(q.NEXT_CHANGE_SEQ_QUERY)
+        await session.execute(
+            q.NOTIFY_QUERY,
+            {"channel": changes.CHANNEL, "payload": json.dumps(event)},
+        )
+        await session.commit()
+    return event["seq"]
+
+
+async def wait_for(condition):
+    """Wait up to five seconds for the listener to catch up."""
+    for _ in range(500):
+        if condition():
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError("Change feed event was not applied")
+
+
+class TestChanges:
+    """Class for testing the LISTEN/NOTIFY change feed."""
+
+    def test_listener(self, test_session, monkeypatch):
+        """Events are applied in order, own ones skipped, gaps resync."""
+        invalidated = []
+        resyncs = []
+        monkeypatch.setattr(
+            changes.check_cache,
+            "invalidate",
+            lambda *identifiers: invalidated.append(identifiers),
+        )
+
+        async def resync(session):
+            resyncs.append(listener.last_seq)
+
+        listener = ChangeListener()
+        monkeypatch.setattr(listener, "resync", resync)
+
+        async def scenario():
+            await listener.connect(
+                settings.database_url_test, TestingAsyncSessionLocal,
+            )
+            task = asyncio.create_task(
+                listener.run(
+                    settings.database_url_test, TestingAsyncSessionLocal,
+                ),
+            )
+            try:
+                seq = await notify(
+                    origin="other", id=-1, inn="feedinn", ogrn=None,
+                    sap_num=None,
+                )
+                await wait_for(lambda: listener.applied == 1)
+                assert listener.last_seq == seq
+                assert invalidated == [("feedinn", None, None)]
+
+                seq = await notify(
+                    origin=changes.ORIGIN, id=-1, inn="owninn", ogrn=None,
+                    sap_num=None,
+                )
+                await wait_for(lambda: listener.last_seq == seq)
+                assert len(invalidated) == 1
+
+                await notify(origin="other", seq=seq + 5, resync=True)
+                await wait_for(lambda: resyncs)
+                assert resyncs == [seq + 5]
+            finally:
+                task.cancel()
+                await listener.close()
+
+        asyncio.run(scenario())
+        assert listener.applied == 1
+
+    def test_cursor(self):
+        """Cursors round-trip and reject garbage."""
+        cursor = changes.encode_cursor(12, 345)
+        assert changes.decode_cursor(cursor) == (12, 345)
+        assert changes.decode_cursor(None) == (-1, 0)
+        for garbage in ("%%%", changes.encode_cursor("a", 1), "MTI"):
+            with pytest.raises(ValueError):
+                changes.decode_cursor(garbage)
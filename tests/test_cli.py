@@ -0,0 +1,164 @@
+"""Class for testing maintenance commands."""
+from datetime import date
+
+import pytest
+from sqlalchemy import text
+
+import app.queries as q
+from app import cli, export, models
+
+BLOCK_STATE_QUERY = text(
+    """
+    SELECT id_type, id_value, request_id, blocking
+    FROM counterparty_block_state
+    WHERE id_value IN ('cliinn', 'cliogrn')
+    ORDER BY id_type
+    """,
+)
+
+
+class TestCli:
+    """Class for testing maintenance commands."""
+
+    def test_rebuild_block_state(self, test_session):
+        """Trigger-maintained state should match a full rebuild."""
+        for request_id, blocking, created_at in (
+            (-2, True, "2023-01-01"),
+            (-1, False, "2023-02-01"),
+        ):
+            test_session.add(
+                models.Request(
+                    id=request_id,
+                    is_resident=False,
+                    inn="cliinn",
+                    ogrn="cliogrn" if blocking else None,
+                    in_sap=False,
+                    blocking=blocking,
+                    from_system=0,
+                    created_at=created_at,
+                    created_by="cli",
+                    change_seq=test_session.scalar(q.NEXT_CHANGE_SEQ_QUERY),
+                ),
+            )
+            test_session.flush()
+            test_session.add(
+                models.RequestDetail(
+                    id=request_id,
+                    request_id=request_id,
+                    workflow_code="FULL",
+                ),
+            )
+            test_session.flush()
+
+        expected = [
+            ("inn", "cliinn", -1, False),
+            ("ogrn", "cliogrn", -2, True),
+        ]
+        assert test_session.execute(BLOCK_STATE_QUERY).all() == expected
+
+        test_session.execute(
+            text("UPDATE counterparty_block_state SET blocking = NOT blocking"),
+        )
+        cli.rebuild_block_state(test_session)
+        assert test_session.execute(BLOCK_STATE_QUERY).all() == expected
+        test_session.rollback()
+
+    def test_rebuild_rollups(self, test_session):
+        """Trigger-maintained rollups should match a full rebuild."""
+        rollup_query = text(
+            """
+            SELECT day, workflow_code, is_resident, blocks, unblocks
+            FROM request_rollup_daily
+            WHERE day = '1999-01-01'
+            ORDER BY workflow_code
+            """,
+        )
+        for request_id, blocking in ((-2, True), (-1, False)):
+            test_session.add(
+                models.Request(
+                    id=request_id,
+                    is_resident=True,
+                    inn="1234567890",
+                    in_sap=False,
+                    blocking=blocking,
+                    from_system=0,
+                    created_at="1999-01-01 12:00",
+                    created_by="cli",
+                ),
+            )
+            test_session.flush()
+            test_session.add_all(
+                [
+                    models.RequestDetail(
+                        id=request_id * 2,
+                        request_id=request_id,
+                        workflow_code="FULL",
+                    ),
+                    models.RequestDetail(
+                        id=request_id * 2 - 1,
+                        request_id=request_id,
+                        workflow_code="SUM",
+                    ),
+                ],
+            )
+            test_session.flush()
+
+        expected = [
+            (date(1999, 1, 1), "FULL", True, 1, 1),
+            (date(1999, 1, 1), "SUM", True, 1, 1),
+        ]
+        assert test_session.execute(rollup_query).all() == expected
+
+        test_session.execute(
+            text("UPDATE request_rollup_daily SET blocks = 0"),
+        )
+        cli.rebuild_rollups(test_session)
+        assert test_session.execute(rollup_query).all() == expected
+        test_session.rollback()
+
+    def test_export_history(self, test_session, tmp_path):
+        """Export should append only requests after the stored cursor."""
+        pq = pytest.importorskip("pyarrow.parquet")
+
+        def add_request(request_id, created_at):
+            test_session.add(
+                models.Request(
+                    id=request_id,
+                    is_resident=False,
+                    inn="exportinn",
+                    in_sap=False,
+                    blocking=True,
+                    from_system=0,
+                    created_at=created_at,
+                    created_by="cli",
+                ),
+            )
+            test_session.flush()
+            test_session.add(
+                models.RequestDetail(
+                    id=-request_id,
+                    request_id=request_id,
+                    workflow_code="SUM",
+                    params={"max_sum": 100, "operation_sap_code": ["P1"]},
+                ),
+            )
+            test_session.flush()
+
+        add_request(900_001, "2023-01-15")
+        add_request(900_002, "2023-02-15")
+        exported, files = export.export_history(test_session, tmp_path)
+        assert exported >= 2
+        table = pq.read_table(tmp_path / "created_month=2023-02")
+        assert table.column("request_id").to_pylist() == [900_002]
+        assert table.column("max_sum").to_pylist() == [100]
+        assert table.column("operation_sap_code").to_pylist() == [["P1"]]
+        assert export.read_state(tmp_path)[1:] == (900_002, -900_002)
+
+        add_request(900_003, "2023-02-20")
+        assert export.export_history(test_session, tmp_path)[0] == 1
+        table = pq.read_table(tmp_path / "created_month=2023-02")
+        assert sorted(table.column("request_id").to_pylist()) == [
+            900_002, 900_003,
+        ]
+        assert export.export_history(test_session, tmp_path) == (0, [])
+        test_session.rollback()
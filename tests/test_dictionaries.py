@@ -0,0 +1,57 @@
+"""Class for testing the dictionary snapshot."""
+import json
+from types import SimpleNamespace as Row
+
+from app.dictionaries import build_snapshot, render
+
+
+def make_snapshot():
+    """Build a small snapshot from row stand-ins."""
+    return build_snapshot(
+        version=1,
+        systems=[
+            Row(code=2, name="B", source_doc=True),
+            Row(code=1, name="A", source_doc=True),
+            Row(code=0, name="Z", source_doc=False),
+        ],
+        workflows=[Row(code="FULL"), Row(code="DOC")],
+        doc_types=[Row(code=1, name="FI", fullname="fi", system_code=1)],
+        actions=[Row(code=1, name="edit"), Row(code=3, name="next")],
+        type_valid_actions=[(1, 3), (1, 1)],
+        operations=[
+            Row(sap_code="P2", sap_name="b", name="b", blocking=False),
+            Row(sap_code="P1", sap_name="a", name="a", blocking=True),
+        ],
+    )
+
+
+class TestDictionarySnapshot:
+    """Class for testing the dictionary snapshot."""
+
+    def test_payloads(self):
+        """Bodies are sorted, filtered and carry a content ETag."""
+        snapshot = make_snapshot()
+        systems = snapshot.payload("dict_system")
+        assert json.loads(systems.body) == [
+            {"code": 1, "name": "A"},
+            {"code": 2, "name": "B"},
+        ]
+        assert systems.etag == render(json.loads(systems.body)).etag
+        assert json.loads(snapshot.payload("dict_operation").body) == [
+            {"sap_code": "P1", "sap_name": "a", "name": "a"},
+        ]
+        assert json.loads(snapshot.payload("dict_action", 1).body) == [
+            {"code": 1, "name": "edit"},
+            {"code": 3, "name": "next"},
+        ]
+        assert snapshot.payload("dict_doc_type", 0).body == b"[]"
+
+    def test_valid_actions(self):
+        """The (doc_type, action) bitset only accepts listed pairs."""
+        snapshot = make_snapshot()
+        assert snapshot.valid_actions == {1: 0b1010}
+        assert snapshot.is_valid_action(1, 1)
+        assert snapshot.is_valid_action(1, 3)
+        assert not snapshot.is_valid_action(1, 2)
+        assert not snapshot.is_valid_action(2, 1)
+        assert not snapshot.is_valid_action(1, None)
@@ -1,4 +1,9 @@
 """Class for testing migrations in the database."""
+from datetime import datetime
+
+from sqlalchemy import text
+
+import app.queries as q
 from app import models
 
 
@@ -290,3 +295,182 @@ class TestMigrations:
             assert actual_operation.name == expected_operation["name"]
             assert actual_operation.sap_name == expected_operation["sap_name"]
             assert actual_operation.blocking == expected_operation["blocking"]
+
+    def test_check_query_uses_indexes(self, test_session):
+        """Check that the /check lookup is served by the check indexes."""
+        test_session.execute(
+            text(
+                """
+                INSERT INTO request (
+                    id, is_resident, inn, ogrn, in_sap, sap_num, blocking,
+                    from_system, created_at, created_by, start_at, end_at
+                )
+                SELECT
+                    -n, false, 'inn' || n, 'ogrn' || n, true, 'sap' || n,
+                    true, 0, now(), 'explain', '1990-01-01', '9999-12-31'
+                FROM generate_series(1, 5000) AS n
+                """,
+            ),
+        )
+        test_session.execute(
+            text(
+                """
+                INSERT INTO request_detail (
+                    id, request_id, request_end_at, workflow_code, params
+                )
+                SELECT -n, -n, timestamp '9999-12-31', 'FULL', '{}'
+                FROM generate_series(1, 5000) n
+                UNION ALL
+                SELECT
+                    -5000 - n, -n, timestamp '9999-12-31', 'DOC',
+                    jsonb_build_object('name_object', 'c' || n)
+                FROM generate_series(1, 5000) n
+                """,
+            ),
+        )
+        test_session.execute(text("ANALYZE request"))
+        test_session.execute(text("ANALYZE request_detail"))
+        test_session.execute(text("ANALYZE counterparty"))
+        test_session.execute(text("ANALYZE counterparty_block_state"))
+        identifiers = {
+            "inn": "inn1",
+            "ogrn": "ogrn2",
+            "sap_num": "sap3",
+        }
+        counterparty_ids = test_session.execute(
+            q.RESOLVE_COUNTERPARTY_QUERY, identifiers,
+        ).scalars().all()
+        plan = test_session.execute(
+            text("EXPLAIN " + q.CHECK_QUERY.text),
+            {
+                **identifiers,
+                "contract": "contract",
+                "check_for_dt": datetime(2023, 1, 1),
+            },
+        ).scalars().all()
+        plan = "\n".join(plan)
+        test_session.rollback()
+
+        assert len(counterparty_ids) == 3
+        # The counterparty ids are resolved within the same query.
+        assert "uq_counterparty_identifiers" in plan, plan
+        assert "ix_counterparty_ogrn" in plan, plan
+        assert "ix_counterparty_sap_num" in plan, plan
+        # Partition indexes are named after the partition and columns.
+        assert "_counterparty_id_start_at_end_at_idx" in plan, plan
+        assert "_request_id_idx" in plan, plan
+        assert "_name_object_idx" in plan, plan
+        assert "counterparty_block_state_pkey" in plan, plan
+
+    def test_request_validity(self, test_session):
+        """Check that validity covers start_at and end_at inclusively."""
+        test_session.execute(
+            text(
+                """
+                INSERT INTO request (
+                    id, is_resident, inn, in_sap, blocking, from_system,
+                    created_at, created_by, start_at, end_at
+                )
+                VALUES (
+                    -1, false, 'validity', false, true, 0, now(), 'validity',
+                    '2023-01-01', '2023-01-31 23:59:59'
+                )
+                """,
+            ),
+        )
+        # Enough requests of other counterparties in the same partition for
+        # the planner to prefer an index with default settings.
+        test_session.execute(
+            text(
+                """
+                INSERT INTO request (
+                    id, is_resident, inn, in_sap, blocking, from_system,
+                    created_at, created_by, start_at, end_at
+                )
+                SELECT
+                    -1 - n, false, 'validity' || n, false, true, 0, now(),
+                    'validity', '2023-01-01', '2023-01-31 23:59:59'
+                FROM generate_series(1, 5000) AS n
+                """,
+            ),
+        )
+        test_session.execute(text("ANALYZE request"))
+        counterparty_id = test_session.scalar(
+            text("SELECT counterparty_id FROM request WHERE id = -1"),
+        )
+        covers = test_session.execute(
+            text(
+                """
+                SELECT
+                    validity @> timestamp '2023-01-01',
+                    validity @> timestamp '2023-01-31 23:59:59',
+                    validity @> timestamp '2023-02-01',
+                    validity @> timestamp '2022-12-31 23:59:59'
+                FROM request WHERE id = -1
+                """,
+            ),
+        ).one()
+        plan = test_session.execute(
+            text(
+                """
+                EXPLAIN SELECT id FROM request
+                WHERE counterparty_id = :counterparty_id
+                AND validity @> timestamp '2023-01-15'
+                AND start_at <= timestamp '2023-01-15'
+                AND end_at >= timestamp '2023-01-15'
+                """,
+            ),
+            {"counterparty_id": counterparty_id},
+        ).scalars().all()
+        plan = "\n".join(plan)
+        test_session.rollback()
+
+        assert tuple(covers) == (True, True, False, False)
+        # The GiST index with btree_gist, the btree one without it.
+        assert "_counterparty_id_" in plan, plan
+
+    def test_request_counterparty(self, test_session):
+        """Check that requests share one counterparty per identifier triple."""
+        test_session.execute(
+            text(
+                """
+                INSERT INTO request (
+                    id, is_resident, inn, ogrn, in_sap, sap_num, blocking,
+                    from_system, created_at, created_by, start_at, end_at
+                )
+                SELECT
+                    v.id, false, v.inn, v.ogrn, false, v.sap_num, true, 0,
+                    now(), 'counterparty', now(), now()
+                FROM (
+                    VALUES
+                        (-1, 'cpinn', NULL, NULL),
+                        (-2, 'cpinn', '', ''),
+                        (-3, 'cpinn', 'cpogrn', NULL)
+                ) AS v(id, inn, ogrn, sap_num)
+                """,
+            ),
+        )
+        rows = test_session.execute(
+            text(
+                """
+                SELECT r.id, c.inn, c.ogrn, c.sap_num, r.counterparty_id
+                FROM request r
+                JOIN counterparty c ON c.id = r.counterparty_id
+                WHERE r.id < 0 ORDER BY r.id DESC
+                """,
+            ),
+        ).all()
+        resolved = test_session.execute(
+            q.RESOLVE_COUNTERPARTY_QUERY,
+            {"inn": "", "ogrn": "cpogrn", "sap_num": None},
+        ).scalars().all()
+        test_session.rollback()
+
+        assert [tuple(row)[:4] for row in rows] == [
+            (-1, "cpinn", "", ""),
+            (-2, "cpinn", "", ""),
+            (-3, "cpinn", "cpogrn", ""),
+        ]
+        assert rows[0].counterparty_id == rows[1].counterparty_id
+        assert rows[0].counterparty_id != rows[2].counterparty_id
+        assert resolved == [rows[2].counterparty_id]
@@ -164,6 +164,7 @@ class TestModels:
         request_detail = models.RequestDetail(
             id=10,
             request_id=10,
+            request_end_at=datetime(2023, 12, 31, 23, 59, 59),
             workflow_code="PART",
             params={"test": "test"},
         )
@@ -0,0 +1,88 @@
+"""Class for testing the request partitions."""
+from datetime import date, datetime
+
+from sqlalchemy import text
+
+import app.partitions as partitions
+import app.queries as q
+from tests.conftest import LOCATION_QUERY, add_request
+
+def location(session):
+    """Partitions holding the test request and its detail."""
+    return tuple(session.execute(LOCATION_QUERY).one()[1:])
+
+
+class TestPartitions:
+    """Class for testing the request partitions."""
+
+    def test_add_months(self):
+        """Months roll over into the next year."""
+        assert partitions.add_months(date(2023, 11, 1), 1) == date(2023, 12, 1)
+        assert partitions.add_months(date(2023, 11, 1), 2) == date(2024, 1, 1)
+        assert partitions.add_months(date(2023, 1, 1), 25) == date(2025, 2, 1)
+
+    def test_ensure_partitions(self, test_session):
+        """New months are created and take over rows from the default."""
+        add_request(test_session, -1, datetime(2100, 1, 20))
+        assert location(test_session) == (
+            "request_p_default", "request_detail_p_default",
+        )
+
+        created = partitions.ensure_partitions(
+            test_session, 1, today=date(2100, 1, 15),
+        )
+        again = partitions.ensure_partitions(
+            test_session, 1, today=date(2100, 1, 15),
+        )
+        moved = location(test_session)
+        test_session.rollback()
+
+        assert created == ["request_p210001", "request_p210002"]
+        assert again == []
+        assert moved == ("request_p210001", "request_detail_p210001")
+
+    def test_archive_partitions(self, test_session):
+        """Expired partitions move to the archive tables as they are."""
+        add_request(test_session, -1, datetime(2000, 1, 1))
+        assert location(test_session) == (
+            "request_p_history", "request_detail_p_history",
+        )
+
+        archived = partitions.archive_partitions(test_session, datetime.now())
+        remaining = [
+            name for name, _, _, _ in partitions.partitions(
+                test_session, "request",
+            )
+        ]
+        archive = location(test_session)
+        hot = test_session.scalar(
+            text("SELECT count(*) FROM request WHERE id = -1"),
+        )
+        test_session.rollback()
+
+        assert archived == ["request_p_history"]
+        assert "request_p_history" not in remaining
+        assert "request_p_open" in remaining
+        assert archive == (
+            "request_archive_p_history", "request_detail_archive_p_history",
+        )
+        assert hot == 0
+
+    def test_check_query_prunes_partitions(self, test_session):
+        """The FULL lookup of /check skips partitions expired by then."""
+        plan = test_session.execute(
+            text("EXPLAIN " + q.CHECK_QUERY.text),
+            {
+                "inn": "testinn",
+                "ogrn": None,
+                "sap_num": None,
+                "contract": "contract",
+                "check_for_dt": datetime(9999, 6, 1),
+            },
+        ).scalars().all()
+        plan = "\n".join(plan)
+        test_session.rollback()
+
+        # Only the DOC lookup, which is not bounded by date, reads them.
+        assert plan.count("on request_p_history ") == 1, plan
+        assert plan.count("on request_p_open ") == 2, plan
@@ -1,3 +1,5 @@
+from datetime import datetime, timedelta, timezone
+
 import pytest
 import app.helpers as h
 
@@ -111,6 +113,16 @@ def test_validate_params():
     assert str(exc_info.value) == "account is required for ACC workflow"
 
 
+def test_validate_naive_datetime():
+    """Aware datetimes should become naive UTC, naive ones stay as is."""
+    naive = datetime(2023, 5, 26, 16, 59)
+    aware = datetime(2023, 5, 26, 19, 59, tzinfo=timezone(timedelta(hours=3)))
+
+    assert h.validate_naive_datetime(naive) == naive
+    assert h.validate_naive_datetime(aware) == naive
+    assert h.validate_naive_datetime(None) is None
+
+
 class Params:
     def __init__(
         self,
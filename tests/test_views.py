@@ -1,6 +1,27 @@
 """Class for testing views of the application."""
+import asyncio
+import gzip
+import json
+import os
+import time
+from datetime import datetime
 from http import HTTPStatus
 
+import pytest
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+
+import app.queries as q
+import app.reports as reports
+import app.schemas as s
+import app.views as views
+from app import models
+from app.block_index import block_index
+from app.bloom import identifier_filter
+from app.config import settings
+from app.jobs import job_id, report_jobs
+from tests.conftest import TestingAsyncSessionLocal
+
 
 class TestViews:
     """Class for testing views of the application."""
@@ -102,6 +123,103 @@ class TestViews:
         assert response.status_code == HTTPStatus.OK, response.text
         assert response.json() == expected_response
 
+    def test_check_doc_exemption(self, test_client):
+        """DOC unblock for a contract should lift the block for it only."""
+        identifiers = {
+            "inn": "docinn",
+            "ogrn": "docogrn",
+            "sap_num": "docsapnum",
+        }
+        response = test_client.post(
+            "/block", json={**self.params, **identifiers},
+        )
+        assert response.status_code == HTTPStatus.OK, response.text
+        doc_detail = {
+            "workflow_code": "DOC",
+            "params": {
+                "system_code": 2,
+                "doc_type_code": 3,
+                "action_code": 1,
+                "doc_num": "42",
+                "name_object": "doccontract",
+            },
+        }
+        response = test_client.post(
+            "/unblock",
+            json={**self.params, **identifiers, "details": [doc_detail]},
+        )
+        assert response.status_code == HTTPStatus.OK, response.text
+
+        response = test_client.post(
+            "/check",
+            json={
+                **self.check_params, **identifiers, "contract": "doccontract",
+            },
+        )
+        assert response.status_code == HTTPStatus.OK, response.text
+        assert response.json() == {"blocking": False}
+
+        response = test_client.post(
+            "/check",
+            json={**self.check_params, **identifiers, "contract": "other"},
+        )
+        assert response.status_code == HTTPStatus.OK, response.text
+        assert response.json() == {"blocking": True}
+
+    def test_check_batch(self, test_client):
+        """Batch check should return single-check results in input order."""
+        checks = [
+            {**self.check_params, "inn": "testinn", "ogrn": "testogrn",
+             "sap_num": "testsapnum"},
+            {**self.check_params, "inn": "checkfalseinn", "ogrn": "",
+             "sap_num": ""},
+            {**self.check_params, "inn": "docinn", "ogrn": "", "sap_num": "",
+             "contract": "doccontract"},
+            {**self.check_params, "inn": "", "ogrn": "",
+             "sap_num": "docsapnum", "contract": "other"},
+        ]
+        expected_response = [
+            {"blocking": True},
+            {"blocking": False},
+            {"blocking": False},
+            {"blocking": True},
+        ]
+        response = test_client.post("/check/batch", json=checks)
+        assert response.status_code == HTTPStatus.OK, response.text
+        assert response.json() == expected_response
+
+        for check, expected in zip(checks, expected_response):
+            response = test_client.post("/check", json=check)
+            assert response.json() == expected
+
+    def test_check_index_matches_sql(self, test_client, monkeypatch):
+        """Index-backed checks should agree with the SQL fallback."""
+        checks = [
+            {**self.check_params, "inn": "testinn", "ogrn": "", "sap_num": ""},
+            {**self.check_params, "inn": "unblockinn", "ogrn": "",
+             "sap_num": ""},
+            {**self.check_params, "inn": "docinn", "ogrn": "", "sap_num": "",
+             "contract": "doccontract"},
+            {**self.check_params, "inn": "testinn", "ogrn": "", "sap_num": "",
+             "check_for_dt": "2030-01-01T00:00:00"},
+        ]
+        from_index = [
+            test_client.post("/check", json=check).json() for check in checks
+        ]
+        monkeypatch.setattr(settings, "block_index_enabled", False)
+        from_sql = [
+            test_client.post("/check", json=check).json() for check in checks
+        ]
+
+        assert from_index == from_sql
+        assert test_client.post("/check/batch", json=checks).json() == from_sql
+        assert from_sql == [
+            {"blocking": True},
+            {"blocking": False},
+            {"blocking": False},
+            {"blocking": False},
+        ]
+
     def test_dict_operation(self, test_client):
         """Request should return 200 and dict_operation."""
         response = test_client.get("/dict_operation")
@@ -200,3 +318,580 @@ class TestViews:
             ]
         assert response.status_code == HTTPStatus.OK, response.text
         assert response.json() == expected_response
+
+    def test_block_is_atomic(self, test_client, test_session, monkeypatch):
+        """A failing detail insert should not leave a request behind."""
+        monkeypatch.setattr(views, "validate_block_request", lambda *_: [])
+        params = {
+            **self.params,
+            "inn": "atomicinn",
+            "details": [{"workflow_code": "NOPE", "params": {}}],
+        }
+        with pytest.raises(IntegrityError):
+            test_client.post("/block", json=params)
+
+        assert (
+            test_session.query(models.Request)
+            .filter_by(inn="atomicinn")
+            .count()
+            == 0
+        )
+
+    def test_import_blocks(self, test_client):
+        """Valid rows should be imported and invalid ones reported."""
+        rows = [
+            {**self.params, "inn": "importinn1", "ogrn": "", "sap_num": ""},
+            {**self.params, "inn": "", "ogrn": "", "sap_num": ""},
+            {**self.params, "inn": "importinn2", "ogrn": "", "sap_num": ""},
+        ]
+        body = "\n".join(json.dumps(row) for row in rows) + "\n{broken\n"
+        response = test_client.post(
+            "/block/import", params={"format": "ndjson"}, content=body,
+        )
+        assert response.status_code == HTTPStatus.OK, response.text
+        report = response.json()
+        assert report["imported"] == 2
+        assert report["rejected"] == 2
+        assert [error["row"] for error in report["errors"]] == [2, 4]
+
+        for inn in ("importinn1", "importinn2"):
+            response = test_client.post(
+                "/check",
+                json={**self.check_params, "inn": inn, "ogrn": "",
+                      "sap_num": ""},
+            )
+            assert response.json() == {"blocking": True}
+
+    def test_import_blocks_csv(self, test_client):
+        """CSV details may span lines, bad booleans reject their row."""
+        header = "is_resident,inn,in_sap,from_system,created_by,details"
+        details = json.dumps(self.params["details"], indent=1)
+        details = details.replace('"', '""')
+        body = f'{header}\nfalse,importcsvinn,false,0,csv,"{details}"\n'
+        response = test_client.post(
+            "/block/import", params={"format": "csv"}, content=body,
+        )
+        assert response.status_code == HTTPStatus.OK, response.text
+        assert response.json() == {"imported": 1, "rejected": 0, "errors": []}
+
+        response = test_client.post(
+            "/check",
+            json={**self.check_params, "inn": "importcsvinn", "ogrn": "",
+                  "sap_num": ""},
+        )
+        assert response.json() == {"blocking": True}
+
+        body = f"{header}\nfalse,badboolinn,maybe,0,csv,\n"
+        response = test_client.post(
+            "/block/import", params={"format": "csv"}, content=body,
+        )
+        assert response.status_code == HTTPStatus.OK, response.text
+        assert response.json() == {
+            "imported": 0,
+            "rejected": 1,
+            "errors": [
+                {
+                    "row": 1,
+                    "errors": [
+                        "malformed row: in_sap is not a boolean: 'maybe'",
+                    ],
+                },
+            ],
+        }
+
+    def test_check_cache(self, test_client, monkeypatch):
+        """Cached /check results should be evicted by writes."""
+        monkeypatch.setattr(settings, "block_index_enabled", False)
+        monkeypatch.setattr(settings, "bloom_filter_enabled", False)
+        check = {
+            **self.check_params, "inn": "cacheinn", "ogrn": "", "sap_num": "",
+        }
+        hits = test_client.get("/check/cache").json()["hits"]
+
+        assert test_client.post("/check", json=check).json() == {
+            "blocking": False,
+        }
+        assert test_client.post("/check", json=check).json() == {
+            "blocking": False,
+        }
+        assert test_client.get("/check/cache").json()["hits"] == hits + 1
+
+        response = test_client.post(
+            "/block",
+            json={**self.params, "inn": "cacheinn", "ogrn": "", "sap_num": ""},
+        )
+        assert response.status_code == HTTPStatus.OK, response.text
+        assert test_client.post("/check", json=check).json() == {
+            "blocking": True,
+        }
+
+    def test_dict_etag(self, test_client):
+        """Dictionary responses should carry an ETag and honour it."""
+        response = test_client.get("/dict_system")
+        etag = response.headers["etag"]
+        assert response.status_code == HTTPStatus.OK, response.text
+
+        response = test_client.get(
+            "/dict_system", headers={"If-None-Match": etag},
+        )
+        assert response.status_code == HTTPStatus.NOT_MODIFIED
+        assert response.headers["etag"] == etag
+        assert response.content == b""
+
+        response = test_client.get(
+            "/dict_system", headers={"If-None-Match": '"stale"'},
+        )
+        assert response.status_code == HTTPStatus.OK, response.text
+        assert test_client.get(
+            "/dict_doc_type", params={"system_code": 999},
+        ).json() == []
+
+    def test_dict_reload(self, test_client, test_session):
+        """A dictionary change should bump the version and show on reload."""
+        etag = test_client.get("/dict_system").headers["etag"]
+        version = test_session.get(models.DictVersion, 1).version
+
+        test_session.add(
+            models.DictSystem(code=9, name="reload", source_doc=True),
+        )
+        test_session.commit()
+        test_session.expire_all()
+        assert test_session.get(models.DictVersion, 1).version > version
+        assert test_client.get("/dict_system").headers["etag"] == etag
+
+        response = test_client.post("/dict/reload")
+        assert response.status_code == HTTPStatus.OK, response.text
+        response = test_client.get("/dict_system")
+        assert response.headers["etag"] != etag
+        assert {"code": 9, "name": "reload"} in response.json()
+
+    def test_block_unknown_codes(self, test_client, test_session):
+        """Unknown dictionary codes should be rejected before any write."""
+        params = {
+            **self.params,
+            "inn": "codesinn",
+            "from_system": 42,
+            "details": [
+                {"workflow_code": "NOPE", "params": {}},
+                {
+                    "workflow_code": "DOC",
+                    "params": {
+                        "system_code": 1,
+                        "doc_type_code": 3,
+                        "action_code": 2,
+                        "doc_num": "1",
+                        "name_object": "obj",
+                    },
+                },
+                {
+                    "workflow_code": "OPER",
+                    "params": {"operation_sap_code": ["P1", "ZZ"]},
+                },
+            ],
+        }
+        response = test_client.post("/unblock", json=params)
+        assert response.status_code == HTTPStatus.UNPROCESSABLE_ENTITY
+        assert [error["loc"] for error in response.json()["detail"]] == [
+            ["body", "from_system"],
+            ["body", "details", 0, "workflow_code"],
+            ["body", "details", 1, "params", "doc_type_code"],
+            ["body", "details", 1, "params", "action_code"],
+            ["body", "details", 2, "params", "operation_sap_code"],
+        ]
+        assert (
+            test_session.query(models.Request)
+            .filter_by(inn="codesinn")
+            .count()
+            == 0
+        )
+
+    def test_report(self, test_client):
+        """Report should stream filtered rows as NDJSON and CSV."""
+        filters = {"inn": "testinn", "workflow_code": "FULL"}
+        response = test_client.post("/report", json=filters)
+        assert response.status_code == HTTPStatus.OK, response.text
+        assert response.headers["content-type"] == "application/x-ndjson"
+        rows = [json.loads(line) for line in response.text.splitlines()]
+        assert rows
+        assert {row["inn"] for row in rows} == {"testinn"}
+        assert {row["workflow_code"] for row in rows} == {"FULL"}
+        assert rows[0]["request_id"] == 1
+        assert rows[0]["params"]["debit"] is True
+
+        response = test_client.post(
+            "/report", params={"format": "csv"}, json=filters,
+        )
+        assert response.status_code == HTTPStatus.OK, response.text
+        lines = response.text.splitlines()
+        assert lines[0].startswith("request_id,created_at,blocking")
+        assert len(lines) == len(rows) + 1
+
+        response = test_client.post(
+            "/report", json={**filters, "period_from": "2999-01-01T00:00:00"},
+        )
+        assert response.text == ""
+        response = test_client.post(
+            "/report", params={"format": "xml"}, json=filters,
+        )
+        assert response.status_code == HTTPStatus.UNPROCESSABLE_ENTITY
+
+    def test_report_stops_on_disconnect(self, test_client):
+        """Report streaming should stop once the client is gone."""
+        async def collect():
+            async def is_disconnected():
+                return True
+
+            async with TestingAsyncSessionLocal() as session:
+                return [
+                    chunk
+                    async for chunk in reports.stream_report(
+                        session, s.ReportRequest(), "csv", is_disconnected,
+                    )
+                ]
+
+        chunks = asyncio.run(collect())
+        assert len(chunks) == 1
+        assert chunks[0].startswith(b"request_id,")
+
+    def test_report_jobs(
+        self, test_client, test_session, tmp_path, monkeypatch,
+    ):
+        """Report jobs should run in the background and be deduplicated."""
+        monkeypatch.setattr(report_jobs, "directory", str(tmp_path))
+        filters = {"inn": "testinn", "period_from": "2000-01-01T00:00:00"}
+
+        response = test_client.post("/report/jobs", json=filters)
+        assert response.status_code == HTTPStatus.ACCEPTED, response.text
+        job = response.json()["job_id"]
+        assert test_client.post(
+            "/report/jobs", json=filters,
+        ).json()["job_id"] == job
+
+        deadline = time.monotonic() + 60
+        status = test_client.get(f"/report/jobs/{job}").json()
+        while status["status"] in ("queued", "running"):
+            assert time.monotonic() < deadline
+            time.sleep(0.1)
+            status = test_client.get(f"/report/jobs/{job}").json()
+        assert status["status"] == "done", status
+
+        response = test_client.get(f"/report/jobs/{job}/result")
+        assert response.status_code == HTTPStatus.OK
+        lines = gzip.decompress(response.content).decode().splitlines()
+        assert len(lines) == status["rows"] > 0
+        assert json.loads(lines[0])["inn"] == "testinn"
+
+        response = test_client.get(
+            f"/report/jobs/{job}/result", headers={"Range": "bytes=0-9"},
+        )
+        assert response.status_code == HTTPStatus.PARTIAL_CONTENT
+        assert response.headers["content-range"] == (
+            f"bytes 0-9/{status['size']}"
+        )
+        assert len(response.content) == 10
+        assert test_client.get(
+            f"/report/jobs/{job}/result", headers={"Range": "bytes=9999999-"},
+        ).status_code == HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE
+        assert test_client.get(
+            "/report/jobs/notajob",
+        ).status_code == HTTPStatus.NOT_FOUND
+
+        test_session.add(
+            models.Request(
+                id=100_000,
+                is_resident=False,
+                inn="jobinn",
+                blocking=True,
+                from_system=0,
+                created_at=datetime.now(),
+                created_by="testuser",
+            ),
+        )
+        test_session.commit()
+        assert test_client.post(
+            "/report/jobs", json=filters,
+        ).json()["job_id"] != job
+        report_jobs.shutdown()
+
+    def test_report_job_claims(
+        self, test_client, test_session, tmp_path, monkeypatch,
+    ):
+        """A job claimed by another worker should only be taken over stale."""
+        monkeypatch.setattr(report_jobs, "directory", str(tmp_path))
+        filters = {"inn": "testinn"}
+        watermark = test_session.scalar(
+            q.REPORT_WATERMARK_QUERY, {"period_from": None, "period_to": None},
+        )
+        job = job_id(s.ReportRequest(**filters), "ndjson", watermark)
+        paths = [
+            tmp_path / f"{job}.lock",
+            tmp_path / f"{job}.params.json",
+            tmp_path / f"{job}.json",
+        ]
+        paths[0].touch()
+        paths[1].write_text(json.dumps({"format": "ndjson", "filters": {}}))
+        paths[2].write_text(json.dumps({"status": "running", "rows": 0}))
+
+        response = test_client.post("/report/jobs", json=filters)
+        assert response.json()["job_id"] == job
+        assert response.json()["status"] == "running"
+
+        stale = time.time() - settings.report_jobs_stale_after - 1
+        for path in paths:
+            os.utime(path, (stale, stale))
+        response = test_client.post("/report/jobs", json=filters)
+        assert response.json()["status"] == "queued"
+        deadline = time.monotonic() + 60
+        while report_jobs.status(job)["status"] in ("queued", "running"):
+            assert time.monotonic() < deadline
+            time.sleep(0.1)
+        assert report_jobs.status(job)["status"] == "done"
+        assert not paths[0].exists()
+        report_jobs.shutdown()
+
+    def test_report_summary(self, test_client):
+        """Summary should return daily counts from the rollup table."""
+        response = test_client.get(
+            "/report/summary", params={"workflow_code": "FULL"},
+        )
+        assert response.status_code == HTTPStatus.OK, response.text
+        rows = response.json()
+        assert rows
+        assert {row["workflow_code"] for row in rows} == {"FULL"}
+        today = datetime.now().date().isoformat()
+        today_rows = [row for row in rows if row["day"] == today]
+        assert sum(row["blocks"] for row in today_rows) > 0
+        assert sum(row["unblocks"] for row in today_rows) > 0
+        assert test_client.get(
+            "/report/summary", params={"date_from": "2999-01-01"},
+        ).json() == []
+
+    def test_check_partial_workflows(
+        self, test_client, test_session, monkeypatch,
+    ):
+        """Index and SQL paths should evaluate partial workflows alike."""
+        test_session.add(
+            models.Request(
+                id=100_001,
+                is_resident=False,
+                inn="ruleinn",
+                blocking=True,
+                from_system=0,
+                created_at=datetime(2023, 1, 1),
+                created_by="testuser",
+                start_at=datetime(2000, 1, 1),
+                end_at=datetime(2030, 1, 1),
+            ),
+        )
+        test_session.flush()
+        test_session.add_all(
+            [
+                models.RequestDetail(
+                    id=-100_001,
+                    request_id=100_001,
+                    request_end_at=datetime(2030, 1, 1),
+                    workflow_code="SUM",
+                    params={"max_sum": 1000},
+                ),
+                models.RequestDetail(
+                    id=-100_002,
+                    request_id=100_001,
+                    request_end_at=datetime(2030, 1, 1),
+                    workflow_code="OPER",
+                    params={"operation_sap_code": ["P1"]},
+                ),
+            ],
+        )
+        test_session.commit()
+        block_index.invalidate()
+        identifier_filter.invalidate()
+
+        check = {
+            **self.check_params,
+            "inn": "ruleinn", "ogrn": "", "sap_num": "",
+            "check_for_dt": "2023-05-26T16:59:25",
+        }
+        checks = [
+            check,
+            {**check, "amount": "999.99"},
+            {**check, "amount": "1000.01"},
+            {**check, "operation_sap_code": "P1"},
+            {**check, "operation_sap_code": "P2", "amount": 1},
+        ]
+        expected = [
+            {"blocking": False},
+            {"blocking": False},
+            {"blocking": True},
+            {"blocking": True},
+            {"blocking": False},
+        ]
+        from_index = [
+            test_client.post("/check", json=c).json() for c in checks
+        ]
+        monkeypatch.setattr(settings, "block_index_enabled", False)
+        from_sql = [test_client.post("/check", json=c).json() for c in checks]
+        assert from_index == from_sql == expected
+        assert test_client.post("/check/batch", json=checks).json() == expected
+
+        # Checks the index does not cover go to the database on their own.
+        monkeypatch.setattr(settings, "block_index_enabled", True)
+        monkeypatch.setattr(
+            block_index, "archived_before", datetime(2023, 6, 1),
+        )
+        later = {
+            **check, "amount": "1000.01", "check_for_dt": "2023-07-01T00:00:00",
+        }
+        assert test_client.post(
+            "/check/batch", json=checks + [later],
+        ).json() == expected + [{"blocking": True}]
+
+    def test_report_param_filters(self, test_client):
+        """Report should filter on params through the generated columns."""
+        response = test_client.post(
+            "/report", json={"inn": "ruleinn", "balance_unit": "BE1"},
+        )
+        assert response.text == ""
+        rows = [
+            json.loads(line)
+            for line in test_client.post(
+                "/report", json={"workflow_code": "DOC"},
+            ).text.splitlines()
+        ]
+        doc = [row for row in rows if row["params"].get("name_object")]
+        assert doc
+        response = test_client.post(
+            "/report",
+            json={"name_object": doc[0]["params"]["name_object"]},
+        )
+        names = {
+            json.loads(line)["params"]["name_object"]
+            for line in response.text.splitlines()
+        }
+        assert names == {doc[0]["params"]["name_object"]}
+
+    def test_check_bloom(self, test_client, monkeypatch):
+        """Never written counterparties should skip the database."""
+        unknown = {
+            **self.check_params,
+            "inn": "bloominn", "ogrn": "bloomogrn", "sap_num": "",
+        }
+        before = test_client.get("/check/bloom").json()
+        assert before["loaded"] is True
+        assert test_client.post("/check", json=unknown).json() == {
+            "blocking": False,
+        }
+        monkeypatch.setattr(settings, "block_index_enabled", False)
+        checks = [
+            unknown,
+            {
+                **self.check_params,
+                "inn": "ruleinn", "ogrn": "", "sap_num": "",
+                "amount": "1000.01",
+            },
+            unknown,
+        ]
+        assert test_client.post("/check/batch", json=checks).json() == [
+            {"blocking": False}, {"blocking": True}, {"blocking": False},
+        ]
+        after = test_client.get("/check/bloom").json()
+        assert after["checks"] == before["checks"] + 4
+        assert after["definite_misses"] == before["definite_misses"] + 3
+        assert after["estimated_fp_rate"] < settings.bloom_filter_fp_rate
+
+    def test_check_timeline(self, test_client, monkeypatch):
+        """Timeline should match point checks on both lookup paths."""
+        params = {
+            "inn": "ruleinn",
+            "amount": "1001",
+            "date_from": "1999-01-01T00:00:00",
+            "date_to": "2031-01-01T00:00:00",
+        }
+        expected = [
+            {
+                "start_at": "1999-01-01T00:00:00",
+                "end_at": "1999-12-31T23:59:59.999999",
+                "blocking": False,
+            },
+            {
+                "start_at": "2000-01-01T00:00:00",
+                "end_at": "2030-01-01T00:00:00",
+                "blocking": True,
+            },
+            {
+                "start_at": "2030-01-01T00:00:00.000001",
+                "end_at": "2031-01-01T00:00:00",
+                "blocking": False,
+            },
+        ]
+        response = test_client.get("/check/timeline", params=params)
+        assert response.status_code == HTTPStatus.OK, response.text
+        assert response.json() == expected
+        monkeypatch.setattr(settings, "block_index_enabled", False)
+        assert test_client.get(
+            "/check/timeline", params=params,
+        ).json() == expected
+        assert test_client.get(
+            "/check/timeline", params={**params, "amount": "10"},
+        ).json() == [
+            {
+                "start_at": "1999-01-01T00:00:00",
+                "end_at": "2031-01-01T00:00:00",
+                "blocking": False,
+            },
+        ]
+
+        response = test_client.get(
+            "/check/timeline",
+            params={**params, "date_to": "1998-01-01T00:00:00"},
+        )
+        assert response.status_code == HTTPStatus.UNPROCESSABLE_ENTITY
+        response = test_client.get(
+            "/check/timeline", params={**params, "inn": ""},
+        )
+        assert response.status_code == HTTPStatus.UNPROCESSABLE_ENTITY
+
+    def test_changes(self, test_client, test_session):
+        """The change feed should page through every request once."""
+        expected = [
+            row.id
+            for row in test_session.execute(
+                select(models.Request.id).order_by(
+                    models.Request.change_seq, models.Request.id,
+                ),
+            )
+        ]
+        seen = []
+        cursor = None
+        while True:
+            params = {"limit": 7}
+            if cursor:
+                params["since"] = cursor
+            response = test_client.get("/changes", params=params)
+            assert response.status_code == HTTPStatus.OK, response.text
+            page = response.json()
+            if not page["changes"]:
+                assert page["cursor"] == cursor
+                break
+            seen.extend(change["id"] for change in page["changes"])
+            cursor = page["cursor"]
+        assert seen == expected
+        changes = test_client.get("/changes").json()["changes"]
+        assert all(isinstance(change["details"], list) for change in changes)
+        assert any(change["details"] for change in changes)
+
+        response = test_client.get(
+            "/changes", params={"limit": 1000},
+            headers={"Accept-Encoding": "gzip"},
+        )
+        assert response.headers["content-encoding"] == "gzip"
+        assert len(response.json()["changes"]) == len(expected)
+
+        started = time.monotonic()
+        response = test_client.get(
+            "/changes", params={"since": cursor, "wait": 0.3},
+        )
+        assert response.json() == {"cursor": cursor, "changes": []}
+        assert time.monotonic() - started >= 0.3
+
+        response = test_client.get("/changes", params={"since": "%%%"})
+        assert response.status_code == HTTPStatus.UNPROCESSABLE_ENTITY